@@ -19,6 +19,10 @@ BuildRequires:  python3-setuptools
 BuildRequires:  systemd
 
 Requires:	python3-aiohttp
+# Faster json encoding of the answers when installed
+Recommends:	python3-orjson
+# Brotli pre-compression of the answers when installed
+Recommends:	python3-brotli
 
 BuildArch:      noarch
 BuildRoot:      %{_tmppath}/%{name}-%{version}-%{release}-buildroot
@@ -48,17 +52,18 @@ python3 setup.py build
 python3 setup.py install --single-version-externally-managed -O1 --root=$RPM_BUILD_ROOT --record=INSTALLED_FILES
 mkdir -p %{buildroot}%{_unitdir}/
 cp conf.d/systemd/redtesthelloapi.service %{buildroot}%{_unitdir}/
+cp conf.d/systemd/redtesthelloapi.socket %{buildroot}%{_unitdir}/
 mkdir -p %{buildroot}%{_libexecdir}/redtest/%{name}/
 cp -a redtest/. %{buildroot}%{_libexecdir}/redtest/%{name}/
 
 %post
-%systemd_post redtesthelloapi.service
+%systemd_post redtesthelloapi.socket redtesthelloapi.service
 
 %preun
-%systemd_preun redtesthelloapi.service
+%systemd_preun redtesthelloapi.socket redtesthelloapi.service
 
 %postun
-%systemd_postun_with_restart redtesthelloapi.service
+%systemd_postun_with_restart redtesthelloapi.socket redtesthelloapi.service
 
 %clean
 rm -rf $RPM_BUILD_ROOT
@@ -69,6 +74,7 @@ rm -rf $RPM_BUILD_ROOT
 %doc README.md
 %{_bindir}/redtesthelloworldd
 %{_unitdir}/redtesthelloapi.service
+%{_unitdir}/redtesthelloapi.socket
 %{python3_sitelib}/redtest_helloworld_api
 %{python3_sitelib}/redtest_helloworld_api-*.egg-info
 
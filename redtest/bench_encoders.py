@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the encoders available for the answers of the helloworld API
+
+The verbs list answer and a list of greetings are encoded with every \
+available encoder (the json ones and the binary media types), for several \
+sizes, to compare the payload sizes and the encoding and decoding times.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+# Imports
+import argparse
+import json
+import sys
+import timeit
+
+from redtest_helloworld_api.rtest_hello_serializer import load_json_encoder
+
+from test_constants import *
+
+# Encoders compared by the benchmark: the json ones, then the binary ones
+BENCH_ENCODERS = ["json", "orjson", "cbor", "msgpack"]
+
+
+def verbs_list_answer(nb_verbs: int) -> dict:
+    """
+    Build a verbs list answer like the API does, with a given number of verbs
+
+    :param nb_verbs: Number of verbs in the list
+    :type nb_verbs: int
+    :returns: dict -- The json answer
+    """
+    return {JSON_VERBS_LIST_KEY: [{JSON_VERB_KEY: "/api/%s/verb_%d" % (VERSION, index)}
+                                  for index in range(nb_verbs)]}
+
+
+def greetings_answer(nb_names: int) -> list:
+    """
+    Build a greetings answer like the API does, with a given number of names
+
+    :param nb_names: Number of names greeted
+    :type nb_names: int
+    :returns: list -- The answer
+    """
+    return [{JSON_MSG_KEY: "Hello name%d, welcome to RedTests!" % index} for index in range(nb_names)]
+
+
+# Answers compared by the benchmark, built from a size
+BENCH_PAYLOADS = {
+    "verbs_list": verbs_list_answer,
+    "greetings": greetings_answer,
+}
+
+
+def load_encoder(name: str) -> tuple:
+    """
+    Get the functions of an encoder
+
+    :param name: Name of the encoder (one of BENCH_ENCODERS)
+    :type name: str
+    :returns: tuple -- (function encoding to bytes, function decoding bytes)
+    :raises ImportError: When the encoder is not installed
+    """
+    if name == "cbor":
+        import cbor2
+        return cbor2.dumps, cbor2.loads
+    if name == "msgpack":
+        import msgpack
+        return msgpack.packb, msgpack.unpackb
+
+    return load_json_encoder(name)[1:]
+
+
+def time_call(function, *args) -> float:
+    """
+    Get the time of a call, the best of several runs
+
+    :param function: Function to time
+    :type function: callable
+    :returns: float -- The time of one call in microseconds
+    """
+    timer = timeit.Timer(lambda: function(*args))
+    number, _ = timer.autorange()
+
+    return min(timer.repeat(repeat=5, number=number)) / number * 1e6
+
+
+def bench_encoder(name: str, payload: str, size: int) -> dict:
+    """
+    Measure the encoding and the decoding of an answer with an encoder
+
+    :param name: Name of the encoder
+    :type name: str
+    :param payload: Name of the answer (one of BENCH_PAYLOADS)
+    :type payload: str
+    :param size: Number of verbs or of greetings in the answer
+    :type size: int
+    :returns: dict -- Results (size in bytes, encode and decode times in microseconds)
+    """
+    dumps, loads = load_encoder(name)
+    answer = BENCH_PAYLOADS[payload](size)
+    encoded = dumps(answer)
+
+    return {
+        "encoder": name,
+        "payload": payload,
+        "items": size,
+        "size": len(encoded),
+        "encode_us": round(time_call(dumps, answer), 3),
+        "decode_us": round(time_call(loads, encoded), 3),
+    }
+
+
+def available_encoders() -> list:
+    """
+    Get the encoders of BENCH_ENCODERS installed on this system
+
+    :returns: list -- The names of the encoders
+    """
+    encoders = []
+    for name in BENCH_ENCODERS:
+        try:
+            load_encoder(name)
+            encoders.append(name)
+        except ImportError:
+            print("# %s is not installed" % name)
+
+    return encoders
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark of the encoders of the answers")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 500],
+                        help="Numbers of verbs or greetings in the answers (default: %(default)s)")
+    parser.add_argument("--payloads", nargs="+", choices=list(BENCH_PAYLOADS), default=list(BENCH_PAYLOADS),
+                        help="Answers to encode (default: all)")
+    parser.add_argument("--json", help="Write the json results to this file")
+    args = parser.parse_args()
+
+    encoders = available_encoders()
+    results = [bench_encoder(name, payload, size)
+               for payload in args.payloads for size in args.sizes for name in encoders]
+
+    # Size of each answer relative to the json one
+    json_sizes = {(result["payload"], result["items"]): result["size"]
+                  for result in results if result["encoder"] == "json"}
+
+    print("%-8s %-10s %6s %8s %7s %12s %12s"
+          % ("encoder", "payload", "items", "bytes", "vs json", "encode (us)", "decode (us)"))
+    for result in results:
+        json_size = json_sizes.get((result["payload"], result["items"]))
+        print("%-8s %-10s %6d %8d %6.0f%% %12.3f %12.3f"
+              % (result["encoder"], result["payload"], result["items"], result["size"],
+                 100.0 * result["size"] / json_size if json_size else 100.0,
+                 result["encode_us"], result["decode_us"]))
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
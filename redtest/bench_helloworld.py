@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the verbs of the helloworld API
+
+The API is started with main_init_app() in a child process listening on a \
+local port (or an already running server is used with --url), then every \
+verb is driven by concurrent keep-alive clients. The requests per second, \
+the latency percentiles and the peak RSS of the server are reported as json \
+and as TAP/JUnit results, optionally compared to a baseline.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+# Imports
+import aiohttp
+from aiohttp.test_utils import unused_port
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+from test_constants import *
+
+# Verbs driven by the benchmark: (HTTP method, verb URL, json body)
+BENCH_VERBS = [
+    ("GET", "/version", None),
+    ("GET", "/help", None),
+    ("GET", "/api/" + VERSION + "/verbs/list", None),
+    ("POST", "/api/" + VERSION + "/hello", None),
+    ("POST", "/api/" + VERSION + "/goodbye", None),
+]
+
+
+def percentile(sorted_values: list, percent: float) -> float:
+    """
+    Get a percentile of a sorted list of values (nearest rank)
+
+    :param sorted_values: Values sorted in increasing order
+    :type sorted_values: list
+    :param percent: Percentile wanted (between 0 and 100)
+    :type percent: float
+    :returns: float -- The percentile, 0 if there is no value
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(percent / 100.0 * len(sorted_values))) - 1))
+
+    return sorted_values[rank]
+
+
+def process_peak_rss_kb(pid: int) -> int:
+    """
+    Get the peak resident set size of a process
+
+    :param pid: PID of the process
+    :type pid: int
+    :returns: int -- The peak RSS in kB, 0 if it is unknown
+    """
+    try:
+        with open("/proc/%d/status" % pid) as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return 0
+
+
+def run_server(port: int, env: dict):
+    """
+    Run the API in the current process (target of the server child process)
+
+    :param port: TCP port to listen on
+    :type port: int
+    :param env: Environment variables to set before starting the API
+    :type env: dict
+    """
+    os.environ.update(env)
+    # Imported here so that the settings are read with the environment above
+    from redtest_helloworld_api.rtest_hello_server import run_RTest_hello_API
+    import logging
+    logging.getLogger("aiohttp.access").disabled = True
+
+    run_RTest_hello_API(port=port)
+
+
+def start_server(env: dict = None) -> tuple:
+    """
+    Start the API with main_init_app() in a child process listening on an unused port
+
+    :param env: Environment variables of the API (settings)
+    :type env: dict
+    :returns: tuple -- (the server process, the URL of the server)
+    """
+    port = unused_port()
+    server = multiprocessing.get_context("fork").Process(target=run_server, args=(port, env or {}))
+    server.start()
+    url = "http://localhost:%d" % port
+
+    async def wait_ready():
+        async with aiohttp.ClientSession() as session:
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                try:
+                    async with session.get(url + "/version") as answer:
+                        if answer.status == 200:
+                            return
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.05)
+        raise RuntimeError("The API did not start")
+
+    asyncio.run(wait_ready())
+
+    return server, url
+
+
+def stop_server(server):
+    """
+    Stop the server child process with SIGTERM
+
+    :param server: The server process
+    :type server: multiprocessing.Process
+    """
+    os.kill(server.pid, signal.SIGTERM)
+    server.join(10)
+    if server.is_alive():
+        server.kill()
+        server.join()
+
+
+async def drive_verb(session: aiohttp.ClientSession, url: str, method: str, verb: str, body, clients: int,
+                     duration: float) -> dict:
+    """
+    Send requests to a verb from concurrent clients during a given time
+
+    :param session: Client session (keep-alive connection pool)
+    :type session: aiohttp.ClientSession
+    :param url: URL of the server
+    :type url: str
+    :param method: HTTP method of the verb
+    :type method: str
+    :param verb: Verb URL
+    :type verb: str
+    :param body: Json body to send (None for no body)
+    :param clients: Number of concurrent clients
+    :type clients: int
+    :param duration: Duration (in seconds) of the run
+    :type duration: float
+    :returns: dict -- Results of the verb (requests, errors, requests/s, latency percentiles in ms)
+    """
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async with session.request(method, url + verb, json=body) as answer:
+                    await answer.read()
+                    if answer.status >= 400:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(clients)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    return {
+        "method": method,
+        "verb": verb,
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run_benchmark(url: str, verbs: list, clients: int, duration: float) -> list:
+    """
+    Drive all the verbs, one after the other
+
+    :param url: URL of the server
+    :type url: str
+    :param verbs: Verbs to drive (HTTP method, verb URL, json body)
+    :type verbs: list
+    :param clients: Number of concurrent clients
+    :type clients: int
+    :param duration: Duration (in seconds) of the run of each verb
+    :type duration: float
+    :returns: list -- Results of each verb
+    """
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # Warm up the connections
+        await drive_verb(session, url, "GET", "/version", None, clients, min(duration, 0.5))
+
+        return [await drive_verb(session, url, method, verb, body, clients, duration)
+                for method, verb, body in verbs]
+
+
+def compare_to_baseline(results: list, baseline: dict, tolerance: float) -> None:
+    """
+    Compare the results to a baseline, adding a "regressions" list to each result
+
+    A verb regresses when its requests/s are below the baseline ones or its p99 latency is \
+    above the baseline one by more than the tolerance.
+
+    :param results: Results of each verb
+    :type results: list
+    :param baseline: Json results of a previous run
+    :type baseline: dict
+    :param tolerance: Tolerance (0.2 for 20%)
+    :type tolerance: float
+    """
+    baseline_verbs = {(result["method"], result["verb"]): result for result in baseline.get("verbs", [])}
+
+    for result in results:
+        result["regressions"] = []
+        reference = baseline_verbs.get((result["method"], result["verb"]))
+        if reference is None:
+            continue
+        if result["requests_per_second"] < reference["requests_per_second"] * (1 - tolerance):
+            result["regressions"].append("requests/s %.1f < baseline %.1f"
+                                         % (result["requests_per_second"], reference["requests_per_second"]))
+        if result["p99_ms"] > reference["p99_ms"] * (1 + tolerance):
+            result["regressions"].append("p99 %.3f ms > baseline %.3f ms" % (result["p99_ms"], reference["p99_ms"]))
+
+
+def result_failures(result: dict) -> list:
+    """
+    Get the reasons why a verb result is a failure
+
+    :param result: Result of a verb
+    :type result: dict
+    :returns: list -- The failure reasons (empty if the result is a success)
+    """
+    failures = list(result.get("regressions", []))
+    if result["errors"]:
+        failures.insert(0, "%d requests failed" % result["errors"])
+
+    return failures
+
+
+def result_summary(result: dict) -> str:
+    """
+    Get a one line summary of a verb result
+
+    :param result: Result of a verb
+    :type result: dict
+    :returns: str -- The summary
+    """
+    return "%s %s %.1f req/s p50 %.3f ms p95 %.3f ms p99 %.3f ms" % (
+        result["method"], result["verb"], result["requests_per_second"],
+        result["p50_ms"], result["p95_ms"], result["p99_ms"])
+
+
+def to_tap(results: list) -> str:
+    """
+    Format the results in the TAP format
+
+    :param results: Results of each verb
+    :type results: list
+    :returns: str -- The TAP report
+    """
+    lines = ["TAP version 13", "1..%d" % len(results)]
+    for number, result in enumerate(results, 1):
+        failures = result_failures(result)
+        lines.append("%s %d - %s" % ("not ok" if failures else "ok", number, result_summary(result)))
+        for failure in failures:
+            lines.append("# " + failure)
+
+    return "\n".join(lines) + "\n"
+
+
+def to_junit(results: list, suite_name: str) -> str:
+    """
+    Format the results as a JUnit XML report
+
+    :param results: Results of each verb
+    :type results: list
+    :param suite_name: Name of the test suite
+    :type suite_name: str
+    :returns: str -- The JUnit XML report
+    """
+    failed = sum(1 for result in results if result_failures(result))
+    lines = ['<?xml version="1.0" encoding="utf-8"?>',
+             '<testsuites><testsuite name=%s tests="%d" failures="%d" errors="0">'
+             % (quoteattr(suite_name), len(results), failed)]
+    for result in results:
+        lines.append('<testcase classname=%s name=%s>'
+                     % (quoteattr(suite_name), quoteattr(result["method"] + " " + result["verb"])))
+        failures = result_failures(result)
+        if failures:
+            lines.append('<failure message=%s/>' % quoteattr("; ".join(failures)))
+        lines.append("<system-out>%s</system-out>" % escape(result_summary(result)))
+        lines.append("</testcase>")
+    lines.append("</testsuite></testsuites>")
+
+    return "\n".join(lines) + "\n"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark of the verbs of the helloworld API")
+    parser.add_argument("--url", help="URL of a running server (default: start the API on a local port)")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent keep-alive clients (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=2.0,
+                        help="Duration in seconds of the run of each verb (default: %(default)s)")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Setting of the started API (for instance RTEST_HELLO_METRICS_ENABLED=0)")
+    parser.add_argument("--json", help="Write the json results to this file")
+    parser.add_argument("--tap", help="Write the TAP results to this file")
+    parser.add_argument("--junit", help="Write the JUnit XML results to this file")
+    parser.add_argument("--baseline", help="Json results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Tolerated regression against the baseline (default: %(default)s)")
+
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    env = dict(setting.split("=", 1) for setting in args.env)
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_server(env)
+
+    try:
+        results = asyncio.run(run_benchmark(url, BENCH_VERBS, args.clients, args.duration))
+    finally:
+        peak_rss_kb = process_peak_rss_kb(server.pid) if server is not None else 0
+        if server is not None:
+            stop_server(server)
+
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            compare_to_baseline(results, json.load(baseline_file), args.tolerance)
+
+    report = {
+        "clients": args.clients,
+        "duration": args.duration,
+        "settings": env,
+        "server_peak_rss_kb": peak_rss_kb,
+        "verbs": results,
+    }
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(report, json_file, indent=2)
+    if args.tap:
+        with open(args.tap, "w") as tap_file:
+            tap_file.write(to_tap(results))
+    if args.junit:
+        with open(args.junit, "w") as junit_file:
+            junit_file.write(to_junit(results, "bench_helloworld"))
+
+    for result in results:
+        print(result_summary(result))
+    if peak_rss_kb:
+        print("Server peak RSS: %d kB" % peak_rss_kb)
+
+    return 1 if any(result_failures(result) for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Soak test of the helloworld API
+
+A weighted mix of all the verbs is driven against the API (started with \
+main_init_app() in a child process, or an already running server given \
+with --url) for a long time, with pooled keep-alive connections. The RSS \
+and the open file descriptors of each server process and the p99 latency are \
+sampled at intervals, and the run fails when one of them trends upward beyond \
+its threshold. The results are reported as json and in the TAP format.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+# Imports
+import aiohttp
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from bench_helloworld import percentile, start_server, stop_server
+from redtest_helloworld_api.client import HelloClient, HelloClientError
+from test_constants import *
+
+# Verbs driven by the soak test: name -> (HTTP method, verb URL, json body, default weight).
+# The stream and ws verbs open their own connection, read one event or one
+# answer, then close it.
+SOAK_VERBS = {
+    "version": ("GET", "/version", None, 4),
+    "help": ("GET", "/help", None, 1),
+    "verbs_list": ("GET", "/api/" + VERSION + "/verbs/list", None, 2),
+    "hello": ("POST", "/api/" + VERSION + "/hello", None, 4),
+    "hello_name": ("POST", "/api/" + VERSION + "/hello", {JSON_NAME_KEY: "soak"}, 2),
+    "hello_names": ("POST", "/api/" + VERSION + "/hello", {JSON_NAMES_KEY: ["soak"] * 50}, 1),
+    "goodbye": ("POST", "/api/" + VERSION + "/goodbye", None, 2),
+    "goodbye_name": ("POST", "/api/" + VERSION + "/goodbye", {JSON_NAME_KEY: "soak"}, 1),
+    "batch": ("POST", "/api/" + VERSION + "/batch",
+              [{"method": "GET", "verb": "/version"}, {"method": "POST", "verb": "/api/" + VERSION + "/hello"}], 1),
+    "healthz": ("GET", "/healthz", None, 1),
+    "readyz": ("GET", "/readyz", None, 1),
+    "metrics": ("GET", "/metrics", None, 1),
+    "stream": ("GET", "/api/" + VERSION + "/hello/stream?interval=0.1", None, 1),
+    "ws": ("GET", "/ws", None, 1),
+}
+
+# Number of failed requests whose message is reported
+MAX_ERROR_MESSAGES = 10
+
+
+def parse_mix(mix: str) -> dict:
+    """
+    Parse the weights of the verbs of the mix ("hello=4,version=1,...")
+
+    :param mix: Weights of the verbs, empty for the default weights
+    :type mix: str
+    :returns: dict -- The weight of each verb name (verbs missing from the mix are not driven)
+    :raises ValueError: When a verb name or a weight is invalid
+    """
+    if not mix:
+        return {name: verb[3] for name, verb in SOAK_VERBS.items()}
+
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SOAK_VERBS:
+            raise ValueError("Unknown verb %r (known verbs: %s)" % (name, ", ".join(SOAK_VERBS)))
+        weights[name] = float(weight) if weight else 1.0
+
+    return weights
+
+
+def process_usage(pid: int) -> tuple:
+    """
+    Get the resident set size and the number of open file descriptors of a process
+
+    :param pid: PID of the process
+    :type pid: int
+    :returns: tuple -- (RSS in kB, open file descriptors), 0 when unknown
+    """
+    rss_kb = 0
+    try:
+        with open("/proc/%d/status" % pid) as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    rss_kb = int(line.split()[1])
+                    break
+        fds = len(os.listdir("/proc/%d/fd" % pid))
+    except OSError:
+        return rss_kb, 0
+
+    return rss_kb, fds
+
+
+def server_processes(pid: int) -> list:
+    """
+    Get the processes of a server: the process itself and its children (the \
+    workers forked by redtesthelloworldd --workers)
+
+    :param pid: PID of the server
+    :type pid: int
+    :returns: list -- The PIDs, the server first
+    """
+    pids = [pid]
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open("/proc/%s/stat" % name) as stat:
+                # The parent PID follows the state, after the command name
+                # which may hold spaces
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            pids.append(int(name))
+
+    return pids
+
+
+def metrics_usage(metrics: str) -> tuple:
+    """
+    Get the resident set size and the number of open file descriptors of the \
+    server from its Prometheus metrics
+
+    :param metrics: Answer of the metrics verb
+    :type metrics: str
+    :returns: tuple -- (RSS in kB, open file descriptors), 0 when unknown
+    """
+    rss_kb = fds = 0
+    for line in metrics.splitlines():
+        if line.startswith("process_resident_memory_bytes "):
+            rss_kb = int(float(line.split()[1])) // 1024
+        elif line.startswith("process_open_fds "):
+            fds = int(float(line.split()[1]))
+
+    return rss_kb, fds
+
+
+def trend(values: list, warmup: int) -> tuple:
+    """
+    Get the trend of sampled values: the median of the first third of the \
+    samples and the median of the last third, the warm-up samples excepted
+
+    :param values: Sampled values, in time order
+    :type values: list
+    :param warmup: Number of first samples to ignore
+    :type warmup: int
+    :returns: tuple -- (start value, end value)
+    """
+    values = values[warmup:]
+    if not values:
+        return 0, 0
+    third = max(1, len(values) // 3)
+
+    return statistics.median(values[:third]), statistics.median(values[-third:])
+
+
+class Soak:
+    """
+    Run of the soak test: the clients drive the verbs while a sampler records \
+    the usage of the server and the latency of each interval
+    """
+
+    def __init__(self, url: str, weights: dict, clients: int, pid: int = None):
+        """
+        :param url: URL of the server
+        :type url: str
+        :param weights: Weight of each verb name
+        :type weights: dict
+        :param clients: Number of concurrent clients
+        :type clients: int
+        :param pid: PID of the server, whose workers are sampled too (None to \
+        read its usage from the metrics verb, which needs a single server process)
+        :type pid: int
+        """
+        self.url = url.rstrip("/")
+        self.names = list(weights)
+        self.weights = [weights[name] for name in self.names]
+        self.clients = clients
+        self.pid = pid
+        self.client = HelloClient(self.url, max_connections=clients, retries=1)
+        # Latencies of the current interval and counters of the whole run
+        self.latencies = []
+        self.requests = 0
+        self.failed = 0
+        # Messages of the first failed requests
+        self.errors = []
+        self.samples = []
+
+    async def call(self, session: aiohttp.ClientSession, name: str):
+        """
+        Coroutine calling a verb of the mix
+
+        :param session: Session used by the stream and ws verbs
+        :type session: aiohttp.ClientSession
+        :param name: Name of the verb in SOAK_VERBS
+        :type name: str
+        """
+        method, verb, body, _ = SOAK_VERBS[name]
+        if name == "stream":
+            async with session.get(self.url + verb) as answer:
+                answer.raise_for_status()
+                async for line in answer.content:
+                    if line.startswith(b"data:"):
+                        break
+        elif name == "ws":
+            async with session.ws_connect(self.url + verb) as websocket:
+                await websocket.send_json({"id": 1, "method": "GET", "verb": "/version"})
+                await websocket.receive_json()
+        elif name == "metrics":
+            # Not json, read through the session of the stream and ws verbs
+            async with session.get(self.url + verb) as answer:
+                answer.raise_for_status()
+                await answer.read()
+        else:
+            await self.client.call(method, verb, body)
+
+    async def drive(self, session: aiohttp.ClientSession, deadline: float):
+        """
+        Coroutine of a client: call random verbs of the mix until the deadline
+
+        :param session: Session used by the stream and ws verbs
+        :type session: aiohttp.ClientSession
+        :param deadline: End of the run (time.monotonic() time)
+        :type deadline: float
+        """
+        while time.monotonic() < deadline:
+            name = random.choices(self.names, self.weights)[0]
+            start = time.perf_counter()
+            try:
+                await self.call(session, name)
+            except (HelloClientError, aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+                self.failed += 1
+                if len(self.errors) < MAX_ERROR_MESSAGES:
+                    self.errors.append("%s: %r" % (name, error))
+            self.latencies.append(time.perf_counter() - start)
+            self.requests += 1
+
+    async def usage(self, session: aiohttp.ClientSession) -> dict:
+        """
+        Coroutine getting the RSS and the open file descriptors of each \
+        process of the server. Each worker is sampled on its own: the metrics \
+        verb is answered by whichever worker gets the connection, so it is \
+        used only without PID.
+
+        :param session: Session used to call the metrics verb
+        :type session: aiohttp.ClientSession
+        :returns: dict -- (RSS in kB, open file descriptors) of each process, \
+        by name ("server" from the metrics verb, else the PID)
+        """
+        if self.pid is not None:
+            return {str(pid): process_usage(pid) for pid in server_processes(self.pid)}
+
+        try:
+            async with session.get(self.url + "/metrics") as answer:
+                return {"server": metrics_usage(await answer.text())}
+        except aiohttp.ClientError:
+            return {"server": (0, 0)}
+
+    async def sample(self, session: aiohttp.ClientSession, interval: float, deadline: float):
+        """
+        Coroutine recording the usage of the server and the latency at each interval
+
+        :param session: Session used to call the metrics verb
+        :type session: aiohttp.ClientSession
+        :param interval: Time (in seconds) between two samples
+        :type interval: float
+        :param deadline: End of the run (time.monotonic() time)
+        :type deadline: float
+        """
+        start = time.monotonic()
+        while time.monotonic() + interval <= deadline + interval / 2:
+            await asyncio.sleep(interval)
+            latencies, self.latencies = self.latencies, []
+            latencies.sort()
+            usage = await self.usage(session)
+            self.samples.append({
+                "time": round(time.monotonic() - start, 3),
+                "requests": len(latencies),
+                "processes": {name: {"rss_kb": rss_kb, "open_fds": fds} for name, (rss_kb, fds) in usage.items()},
+                "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            })
+
+    async def run(self, duration: float, interval: float):
+        """
+        Coroutine running the soak test
+
+        :param duration: Duration (in seconds) of the run
+        :type duration: float
+        :param interval: Time (in seconds) between two samples
+        :type interval: float
+        """
+        deadline = time.monotonic() + duration
+        async with self.client, aiohttp.ClientSession() as session:
+            await asyncio.gather(self.sample(session, interval, deadline),
+                                 *[self.drive(session, deadline) for _ in range(self.clients)])
+
+
+def check_trends(samples: list, warmup: int, rss_growth: float, fd_growth: int, p99_growth: float) -> list:
+    """
+    Check the trends of the sampled values: the RSS and the open file \
+    descriptors of each process separately (a worker restarted with another \
+    PID starts its own series), and the p99 latency of the whole server
+
+    :param samples: Samples of the run
+    :type samples: list
+    :param warmup: Number of first samples to ignore
+    :type warmup: int
+    :param rss_growth: Tolerated relative growth of the RSS (0.2 for 20%)
+    :type rss_growth: float
+    :param fd_growth: Tolerated growth of the number of open file descriptors
+    :type fd_growth: int
+    :param p99_growth: Tolerated relative growth of the p99 latency
+    :type p99_growth: float
+    :returns: list -- The results of the checks: (name, summary, failure or None)
+    """
+    # Series of each sampled value, by key, label and unit
+    series = []
+    names = []
+    for sample in samples:
+        names.extend(name for name in sample["processes"] if name not in names)
+    for name in names:
+        process = "server" if name == "server" else "process " + name
+        for key, label in (("rss_kb", "%s RSS" % process), ("open_fds", "%s open fds" % process)):
+            series.append((key, label, " kB" if key == "rss_kb" else "",
+                           [sample["processes"][name][key] for sample in samples if name in sample["processes"]]))
+    series.append(("p99_ms", "p99 latency", " ms", [sample["p99_ms"] for sample in samples]))
+
+    results = []
+    for key, label, unit, values in series:
+        first, last = trend(values, warmup)
+        summary = "%s %g%s -> %g%s" % (label, first, unit, last, unit)
+        if key == "open_fds":
+            limit = first + fd_growth
+        else:
+            limit = first * (1 + (rss_growth if key == "rss_kb" else p99_growth))
+        failure = None
+        if last > limit:
+            failure = "%s trends upward beyond %g%s" % (label, limit, unit)
+        results.append((key, summary, failure))
+
+    return results
+
+
+def to_tap(requests: int, failed: int, errors: list, checks: list) -> str:
+    """
+    Format the results in the TAP format
+
+    :param requests: Number of requests sent
+    :type requests: int
+    :param failed: Number of failed requests
+    :type failed: int
+    :param errors: Messages of the first failed requests
+    :type errors: list
+    :param checks: Results of check_trends
+    :type checks: list
+    :returns: str -- The TAP report
+    """
+    lines = ["TAP version 13", "1..%d" % (len(checks) + 1)]
+    lines.append("%s 1 - %d requests, %d failed" % ("not ok" if failed else "ok", requests, failed))
+    for error in errors:
+        lines.append("# " + error)
+    for number, (_, summary, failure) in enumerate(checks, 2):
+        lines.append("%s %d - %s" % ("not ok" if failure else "ok", number, summary))
+        if failure:
+            lines.append("# " + failure)
+
+    return "\n".join(lines) + "\n"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Soak test of the helloworld API")
+    parser.add_argument("--url", help="URL of a running server (default: start the API on a local port)")
+    parser.add_argument("--pid", type=int,
+                        help="PID of the running server, its workers being sampled too (default: read its usage "
+                             "from the metrics verb, which needs a server started with --workers 1)")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent clients (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=600.0,
+                        help="Duration in seconds of the run (default: %(default)s)")
+    parser.add_argument("--interval", type=float, default=10.0,
+                        help="Time in seconds between two samples (default: %(default)s)")
+    parser.add_argument("--warmup", type=int, default=1,
+                        help="Number of first samples ignored by the trends (default: %(default)s)")
+    parser.add_argument("--mix", default="",
+                        help="Weights of the verbs, for instance hello=4,version=1 (verbs: %s)"
+                             % ", ".join(SOAK_VERBS))
+    parser.add_argument("--rss-growth", type=float, default=0.2,
+                        help="Tolerated relative growth of the server RSS (default: %(default)s)")
+    parser.add_argument("--fd-growth", type=int, default=8,
+                        help="Tolerated growth of the open file descriptors of the server (default: %(default)s)")
+    parser.add_argument("--p99-growth", type=float, default=1.0,
+                        help="Tolerated relative growth of the p99 latency (default: %(default)s)")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Setting of the started API (for instance RTEST_HELLO_GREETING_POOL_WORKERS=1)")
+    parser.add_argument("--json", help="Write the json results to this file")
+    parser.add_argument("--tap", help="Write the TAP results to this file")
+
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    env = dict(setting.split("=", 1) for setting in args.env)
+    weights = parse_mix(args.mix)
+
+    server = None
+    url = args.url
+    pid = args.pid
+    if url is None:
+        server, url = start_server(env)
+        pid = server.pid
+
+    soak = Soak(url, weights, args.clients, pid)
+    try:
+        asyncio.run(soak.run(args.duration, args.interval))
+    finally:
+        if server is not None:
+            stop_server(server)
+
+    checks = check_trends(soak.samples, args.warmup, args.rss_growth, args.fd_growth, args.p99_growth)
+
+    report = {
+        "clients": args.clients,
+        "duration": args.duration,
+        "interval": args.interval,
+        "mix": weights,
+        "settings": env,
+        "requests": soak.requests,
+        "failed": soak.failed,
+        "errors": soak.errors,
+        "samples": soak.samples,
+        "failures": [failure for _, _, failure in checks if failure],
+    }
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(report, json_file, indent=2)
+    tap = to_tap(soak.requests, soak.failed, soak.errors, checks)
+    if args.tap:
+        with open(args.tap, "w") as tap_file:
+            tap_file.write(tap)
+
+    print(tap, end="")
+
+    return 1 if soak.failed or report["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -29,6 +29,10 @@ JSON_VERSION_KEY = "version"
 JSON_VERBS_LIST_KEY = "verbs_list"
 JSON_VERB_KEY = "verb"
 JSON_MSG_KEY = "message"
+JSON_STATUS_KEY = "status"
+JSON_RESULT_KEY = "result"
+JSON_NAME_KEY = "name"
+JSON_NAMES_KEY = "names"
 
 # Software version
 VERSION = 'v1'
\ No newline at end of file
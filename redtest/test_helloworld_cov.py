@@ -22,12 +22,43 @@ Test case for helloworld API
     limitations under the License.*
 """
 
-from aiohttp.test_utils import AioHTTPTestCase
+from aiohttp import WSCloseCode, WSMsgType
+from aiohttp.test_utils import AioHTTPTestCase, TestClient, TestServer, unused_port
 from aiohttp.web import Application
 import asyncio
+import concurrent.futures
+import glob
+import json
+import os
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
 from typing import Any
+import unittest
+import unittest.mock
+import urllib.request
 
-from redtest_helloworld_api.rtest_hello_api_main import main_init_app
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+from redtest_helloworld_api.rtest_hello_api_main import (ADMISSION_KEY, GREETING_POOL_KEY, MEMORY_SNAPSHOTS_KEY,
+                                                        SETTINGS_KEY, STATE_KEY, VERB_CACHE_KEY, main_init_app,
+                                                        api_verbs, stop_RTest_hello_API, version)
+from redtest_helloworld_api.rtest_hello_admission import TokenBuckets
+from redtest_helloworld_api.rtest_hello_access_log import AccessLogWriter
+from redtest_helloworld_api.rtest_hello_systemd import listen_backlog
+from redtest_helloworld_api.rtest_hello_sse import OPEN_EVENT_STREAMS_KEY, close_event_streams
+from redtest_helloworld_api.rtest_hello_tasks import BACKGROUND_TASKS_KEY, start_background_task
+from redtest_helloworld_api.rtest_hello_verb_cache import CachedAnswer
+from redtest_helloworld_api.rtest_hello_serializer import CBOR_MIME_TYPE, decode_body
+from redtest_helloworld_api.client import HelloClient, HelloClientError, SyncHelloClient
 
 from test_constants import *
 
@@ -165,6 +196,346 @@ class TestRedtestHelloAPI(AioHTTPTestCase):
 
         await asyncio.sleep(0.5)
 
+    async def test_personalized_greetings(self):
+        """
+        Test that the hello and goodbye verbs greet the names given in the body
+        """
+        hello_verb = "/api/" + VERSION + "/hello"
+
+        hello_answer = await self.send_and_check("POST", hello_verb, 200, {JSON_NAME_KEY: "Alice"})
+        self.assertTrue(hello_answer[JSON_MSG_KEY].startswith("Hello Alice"))
+        goodbye_answer = await self.send_and_check("POST", "/api/" + VERSION + "/goodbye", 200,
+                                                   {JSON_NAMES_KEY: ["Alice", "Bob"]})
+        self.assertEqual(goodbye_answer, [{JSON_MSG_KEY: "Goodbye Alice"}, {JSON_MSG_KEY: "Goodbye Bob"}])
+
+        # Check that a big list is greeted in the worker processes and streamed
+        names = ["name%d" % index for index in range(5000)]
+        async with self.client.post(hello_verb, json={JSON_NAMES_KEY: names}) as answer:
+            self.assertEqual(answer.status, 200)
+            self.assertEqual(answer.headers["Transfer-Encoding"], "chunked")
+            greetings = await answer.json()
+        self.assertEqual(len(greetings), 5000)
+        self.assertTrue(greetings[4999][JSON_MSG_KEY].startswith("Hello name4999,"))
+
+        # Check that it is not streamed when the verb is called in-process
+        batch_answer = await self.send_and_check("POST", "/api/" + VERSION + "/batch", 200,
+                                                 [{"verb": hello_verb, "body": {JSON_NAMES_KEY: names}}])
+        self.assertEqual(batch_answer[0][JSON_RESULT_KEY], greetings)
+
+        # Check the refused bodies
+        await self.send_and_check("POST", hello_verb, 400, {JSON_NAMES_KEY: [1, 2]})
+        await self.send_and_check("POST", hello_verb, 413, {JSON_NAMES_KEY: [""] * 100001})
+
+        await asyncio.sleep(0.5)
+
+    async def test_verb_cache(self):
+        """
+        Test that the greetings are cached and that the identical concurrent requests are coalesced
+        """
+        hello_verb = "/api/" + VERSION + "/hello"
+        verb_cache = self.app[VERB_CACHE_KEY]
+
+        # Five identical calls at the same time: the greetings are made once
+        calls = [{"method": "POST", "verb": hello_verb, "body": {JSON_NAMES_KEY: ["Alice", "Bob"]}}] * 5
+        batch_answer = await self.send_and_check("POST", "/api/" + VERSION + "/batch", 200, calls)
+        self.assertEqual(len({json.dumps(result[JSON_RESULT_KEY]) for result in batch_answer}), 1)
+        self.assertEqual((verb_cache.misses, verb_cache.coalesced, verb_cache.hits), (1, 4, 0))
+
+        # The same body written differently is served from the cache
+        async with self.client.post(hello_verb, data='{ "names" : ["Alice","Bob"] }') as answer:
+            self.assertEqual(answer.status, 200)
+            self.assertEqual(len(await answer.json()), 2)
+        self.assertEqual(verb_cache.hits, 1)
+
+        # The errors are not cached
+        await self.send_and_check("POST", hello_verb, 400, {JSON_NAMES_KEY: "Alice"})
+        await self.send_and_check("POST", hello_verb, 400, {JSON_NAMES_KEY: "Alice"})
+        self.assertEqual(verb_cache.misses, 3)
+
+        # The streamed greetings bypass the cache: the identical requests are not coalesced
+        names = ["name%d" % index for index in range(self.app[GREETING_POOL_KEY].chunk_names + 1)]
+        answers = await asyncio.gather(*[self.send_and_check("POST", hello_verb, 200, {JSON_NAMES_KEY: names})
+                                         for _ in range(3)])
+        self.assertEqual([len(answer) for answer in answers], [len(names)] * 3)
+        self.assertEqual((verb_cache.misses, verb_cache.coalesced), (3, 4))
+
+        metrics = await self.send_and_check("GET", "/metrics", 200)
+        self.assertIn('rtest_hello_verb_cache_requests_total{result="coalesced"} 4', metrics)
+        self.assertIn("rtest_hello_verb_cache_entries 1", metrics)
+
+        # Check the expiry and the eviction of the least recently used answers
+        verb_cache.configure(2, 0.2, 1000)
+        answer = CachedAnswer(200, {}, b"{}")
+        for key in ("a", "b", "c"):
+            verb_cache.put(key, answer, verb_cache.ttl)
+        self.assertIsNone(verb_cache.get("a"))
+        self.assertIs(verb_cache.get("b"), answer)
+        await asyncio.sleep(0.3)
+        self.assertIsNone(verb_cache.get("c"))
+
+        await asyncio.sleep(0.5)
+
+    @unittest.skipIf(cbor2 is None, "cbor2 is not installed")
+    async def test_binary_encoding(self):
+        """
+        Test that the answers are encoded in CBOR when the client accepts it, and that CBOR bodies are read
+        """
+        cbor_headers = {"Accept": "application/cbor"}
+
+        # The static answers are pre-encoded, with their own entity tag
+        async with self.client.get("/version", headers=cbor_headers) as answer:
+            self.assertEqual(answer.content_type, "application/cbor")
+            self.assertEqual(cbor2.loads(await answer.read()), {JSON_VERSION_KEY: VERSION})
+            self.assertIn("Accept", answer.headers["Vary"])
+            cbor_etag = answer.headers["ETag"]
+        async with self.client.get("/version", headers={"Accept": "application/cbor", "If-None-Match": cbor_etag}) as answer:
+            self.assertEqual(answer.status, 304)
+        async with self.client.get("/version") as answer:
+            self.assertNotEqual(answer.headers["ETag"], cbor_etag)
+        async with self.client.get("/api/" + VERSION + "/verbs/list", headers=cbor_headers) as answer:
+            verbs = [verb[JSON_VERB_KEY] for verb in cbor2.loads(await answer.read())[JSON_VERBS_LIST_KEY]]
+            self.assertIn("/version", verbs)
+
+        # Json stays the default, and is preferred when the client accepts both
+        for accept, content_type in (("*/*", "application/json"), ("text/html", "application/json"),
+                                     ("application/json;q=0.5, application/cbor", "application/cbor"),
+                                     ("application/json, application/*", "application/json")):
+            async with self.client.post("/api/" + VERSION + "/hello", headers={"Accept": accept}) as answer:
+                self.assertEqual(answer.content_type, content_type, accept)
+
+        # The bodies can be sent in CBOR too, and the big lists are streamed in CBOR
+        cbor_headers["Content-Type"] = "application/cbor"
+        async with self.client.post("/api/" + VERSION + "/hello", headers=cbor_headers,
+                                    data=cbor2.dumps({JSON_NAME_KEY: "Alice"})) as answer:
+            self.assertTrue(cbor2.loads(await answer.read())[JSON_MSG_KEY].startswith("Hello Alice"))
+        for nb_names in (3, 2500):
+            names = ["name%d" % index for index in range(nb_names)]
+            async with self.client.post("/api/" + VERSION + "/goodbye", headers=cbor_headers,
+                                        data=cbor2.dumps({JSON_NAMES_KEY: names})) as answer:
+                greetings = cbor2.loads(await answer.read())
+            self.assertEqual(len(greetings), nb_names)
+            self.assertEqual(greetings[-1][JSON_MSG_KEY], "Goodbye name%d" % (nb_names - 1))
+        async with self.client.post("/api/" + VERSION + "/hello", headers=cbor_headers, data=b"\xff") as answer:
+            self.assertEqual(answer.status, 400)
+
+        await asyncio.sleep(0.5)
+
+    @unittest.skipIf(cbor2 is None, "cbor2 is not installed")
+    async def test_binary_decoding(self):
+        """
+        Test that the CBOR request bodies are decoded to json values only, and that the invalid ones are refused
+        """
+        valid_bodies = {
+            # Indefinite length array, text string and map
+            b"\x9f\x01\x02\xff": [1, 2],
+            b"\x7f\x61a\x61b\xff": "ab",
+            b"\xbf\x61a\x01\xff": {"a": 1},
+            # Nested arrays below the depth limit
+            b"\x81" * 200 + b"\x00": json.loads("[" * 200 + "0" + "]" * 200),
+        }
+        for body, value in valid_bodies.items():
+            self.assertEqual(decode_body(body, CBOR_MIME_TYPE), value)
+
+        invalid_bodies = [
+            # Truncated array, text string and indefinite length array
+            b"\x82\x01", b"\x63ab", b"\x9f\x01",
+            # Lengths bigger than the body
+            b"\x9b\x00\x00\x00\x00\xff\xff\xff\xff", b"\x5b\x00\xff\xff\xff\xff\xff\xff\xff",
+            # Date, big number and unknown tags
+            b"\xc1\x1a\x51\x4b\x67\xb0", b"\xc2\x41\x01", b"\xd9\x03\xe8\x01",
+            # Integer and array map keys
+            b"\xa1\x01\x02", b"\xa1\x82\x01\x02\xf5",
+            # Byte string, undefined, extra data
+            b"\x41a", b"\xf7", b"\x01\x02",
+            # Nested arrays beyond the depth limit
+            b"\x81" * 100000 + b"\x00",
+        ]
+        for body in invalid_bodies:
+            with self.assertRaises(ValueError, msg=body[:16]):
+                decode_body(body, CBOR_MIME_TYPE)
+
+        async with self.client.post("/api/" + VERSION + "/hello", headers={"Content-Type": "application/cbor"},
+                                    data=b"\xa1\x64name\xc1\x00") as answer:
+            self.assertEqual(answer.status, 400)
+
+        await asyncio.sleep(0.5)
+
+    async def test_hello_stream(self):
+        """
+        Test that the hello event stream sends events at the interval chosen by the client
+        """
+        stream_verb = "/api/" + VERSION + "/hello/stream"
+
+        async def read_events(answer, count):
+            # Read the first events (or comments) of a stream
+            events = []
+            block = b""
+            while len(events) < count:
+                line = await answer.content.readline()
+                if not line:
+                    break
+                if line == b"\n":
+                    events.append(block.decode())
+                    block = b""
+                else:
+                    block += line
+            return events
+
+        async with self.client.get(stream_verb + "?interval=0.1") as answer:
+            self.assertEqual(answer.status, 200)
+            self.assertEqual(answer.content_type, "text/event-stream")
+            events = await read_events(answer, 4)
+            self.assertEqual(events[0], "retry: 100\n")
+            for index, event in enumerate(events[1:]):
+                self.assertEqual(event.split("\n")[:2], ["id: %d" % (index + 1), "event: hello"])
+                self.assertIn(JSON_MSG_KEY, event)
+
+        # Check the heartbeats sent between two events
+        self.app[SETTINGS_KEY]["SSE_HEARTBEAT"] = 0.1
+        async with self.client.get(stream_verb + "?interval=60") as answer:
+            events = await read_events(answer, 4)
+            self.assertTrue(events[1].startswith("id: 1\n"))
+            self.assertEqual(events[2:], [": heartbeat\n", ": heartbeat\n"])
+
+            # Check that the stream ends with a close event at shutdown, once it has ended
+            await close_event_streams(self.app)
+            self.assertFalse(self.app[OPEN_EVENT_STREAMS_KEY])
+            events = await read_events(answer, 10)
+            self.assertEqual(events[-1], "event: close\ndata: {}\n")
+
+        # Check that the events of a slow client are dropped instead of being buffered
+        self.app[SETTINGS_KEY]["SSE_MAX_BUFFER"] = -1
+        async with self.client.get(stream_verb + "?interval=0.1") as answer:
+            await read_events(answer, 1)
+            await asyncio.sleep(0.35)
+            stream = next(iter(self.app[OPEN_EVENT_STREAMS_KEY]))
+            self.assertEqual(stream.sent, 0)
+            self.assertGreaterEqual(stream.dropped, 3)
+
+        await self.send_and_check("GET", stream_verb + "?interval=0", 400)
+
+        await asyncio.sleep(0.5)
+
+    async def test_health_verbs(self):
+        """
+        Test the liveness and readiness verbs
+        """
+        self.assertEqual((await self.send_and_check("GET", "/healthz", 200))[JSON_STATUS_KEY], "alive")
+        self.assertEqual((await self.send_and_check("GET", "/readyz", 200))[JSON_STATUS_KEY], "ready")
+
+        # Check that the API is not ready any more once it stops
+        self.app[STATE_KEY].stop_requested_at = time.monotonic()
+        self.assertEqual((await self.send_and_check("GET", "/readyz", 503))[JSON_STATUS_KEY], "stopping")
+        await self.send_and_check("GET", "/healthz", 200)
+
+        await asyncio.sleep(0.5)
+
+    async def test_app_settings(self):
+        """
+        Test that each application keeps its own settings and state
+        """
+        batch_verb = "/api/" + VERSION + "/batch"
+        calls = [{"method": "GET", "verb": "/version"}] * 2
+
+        # Build a second application with other settings
+        with unittest.mock.patch.dict(os.environ, RTEST_HELLO_BATCH_MAX_ITEMS="1"):
+            other_app = main_init_app()
+        other_app.freeze()
+        self.addAsyncCleanup(other_app.cleanup)
+        self.assertEqual(other_app[SETTINGS_KEY]["BATCH_MAX_ITEMS"], 1)
+        self.assertIsNot(other_app[VERB_CACHE_KEY], self.app[VERB_CACHE_KEY])
+        self.assertFalse(other_app[STATE_KEY].started)
+
+        # The settings of the running application are unchanged
+        self.assertEqual(len(await self.send_and_check("POST", batch_verb, 200, calls)), 2)
+        self.assertTrue(self.app[STATE_KEY].started)
+
+        await asyncio.sleep(0.5)
+
+    async def test_stop_one_app(self):
+        """
+        Test that stopping an application leaves the streams and the tasks of the others running
+        """
+        stream_verb = "/api/" + VERSION + "/hello/stream?interval=0.1"
+
+        # Serve a second application, each one with an event stream and a background task
+        other_client = TestClient(TestServer(main_init_app()))
+        await other_client.start_server()
+        self.addAsyncCleanup(other_client.close)
+        other_app = other_client.app
+        task = start_background_task(self.app, asyncio.sleep(60))
+        other_task = start_background_task(other_app, asyncio.sleep(60))
+
+        async with self.client.get(stream_verb) as answer, other_client.get(stream_verb) as other_answer:
+            await answer.content.readuntil(b"\n\n")
+            await other_answer.content.readuntil(b"\n\n")
+            self.assertEqual(len(self.app[OPEN_EVENT_STREAMS_KEY]), 1)
+            self.assertEqual(len(other_app[OPEN_EVENT_STREAMS_KEY]), 1)
+
+            # Stop the second application only
+            await stop_RTest_hello_API(other_app)
+            self.assertFalse(other_app[OPEN_EVENT_STREAMS_KEY])
+            self.assertTrue(other_task.cancelled())
+            self.assertEqual(len(self.app[OPEN_EVENT_STREAMS_KEY]), 1)
+            self.assertIn(task, self.app[BACKGROUND_TASKS_KEY])
+            self.assertFalse(task.done())
+
+            # The stream of the first application still sends its events
+            self.assertTrue((await answer.content.readuntil(b"\n\n")).startswith(b"id: "))
+
+        task.cancel()
+
+        await asyncio.sleep(0.5)
+
+    async def test_client(self):
+        """
+        Test the asynchronous client: typed calls, fan-out, retries and latency
+        """
+        async with HelloClient(str(self.server.make_url("")), backoff=0.01) as client:
+            self.assertEqual(await client.version(), VERSION)
+            self.assertIn("/help", await client.verbs_list())
+            self.assertIn("RedTests", await client.hello())
+            self.assertTrue((await client.hello(name="Alice")).startswith("Hello Alice"))
+            self.assertEqual(await client.goodbye(names=["Alice", "Bob"]), ["Goodbye Alice", "Goodbye Bob"])
+
+            answers = await client.fan_out([("GET", "/version")] * 20, concurrency=5)
+            self.assertEqual(answers, [{JSON_VERSION_KEY: VERSION}] * 20)
+
+            # Check that a call refused by the rate limit is retried after the Retry-After delay
+            self.app[ADMISSION_KEY].buckets = TokenBuckets(2, 1, 10)
+            start = time.monotonic()
+            await client.hello()
+            await client.hello()
+            self.assertGreaterEqual(time.monotonic() - start, 0.9)
+
+            # Check that the errors are not retried
+            with self.assertRaises(HelloClientError) as error:
+                await client.call("GET", "/api/" + VERSION + "/hello")
+            self.assertEqual(error.exception.status, 405)
+
+            # Check that the POST calls are retried only when declared idempotent, and that the Retry-After
+            # delay (1 s) is clamped to the maximum backoff
+            api_admission = self.app[ADMISSION_KEY]
+            max_in_flight = api_admission.max_in_flight
+            api_admission.max_in_flight = 0
+            with self.assertRaises(HelloClientError) as error:
+                await client.call("POST", "/api/" + VERSION + "/hello")
+            self.assertEqual((error.exception.status, api_admission.rejected_overload), (503, 1))
+            client.max_backoff = 0.05
+            start = time.monotonic()
+            with self.assertRaises(HelloClientError) as error:
+                await client.call("POST", "/api/" + VERSION + "/hello", idempotent=True)
+            self.assertEqual((error.exception.status, api_admission.rejected_overload), (503, 5))
+            self.assertLess(time.monotonic() - start, 0.5)
+            api_admission.max_in_flight = max_in_flight
+
+            latency = client.latency.summary()
+            self.assertEqual(latency["/version"]["count"], 21)
+            self.assertEqual(latency["/api/" + VERSION + "/hello"]["count"], 4)
+            self.assertLessEqual(latency["/version"]["p50"], latency["/version"]["max"])
+
+        await asyncio.sleep(0.5)
+
     async def test_friendly_api(self):
         """
         Test that the API is friendly when saying goodbye
@@ -175,3 +546,763 @@ class TestRedtestHelloAPI(AioHTTPTestCase):
         self.assertTrue("friend" in goodbye_answer[JSON_MSG_KEY])
 
         await asyncio.sleep(0.5)
+
+    async def test_verbs_list_cache_invalidation(self):
+        """
+        Test that the cached verbs list follows the changes of the verb table
+        """
+        verbs_list_url = "/api/" + VERSION + "/verbs/list"
+        new_verb_url = "/api/" + VERSION + "/new_verb"
+        await self.send_and_check("GET", verbs_list_url, 200)
+
+        # Declare a new verb once the list is cached
+        api_verbs.add("GET", new_verb_url, version)
+        self.addCleanup(api_verbs.remove, "GET", new_verb_url)
+
+        verbs_answer = await self.send_and_check("GET", verbs_list_url, 200)
+
+        # Accumulate all the verb in a list
+        verb_list = [dict_item[JSON_VERB_KEY] for dict_item in verbs_answer[JSON_VERBS_LIST_KEY]]
+
+        # Check that the new verb table is used
+        self.assertIn(new_verb_url, verb_list)
+        self.assertEqual(len(verb_list), len(set(verb_list)))
+
+        await asyncio.sleep(0.5)
+
+    async def test_batch_verb(self):
+        """
+        Test that the batch verb runs all the verb calls and returns their results in order
+        """
+        calls = [
+            {"method": "POST", "verb": "/api/" + VERSION + "/hello"},
+            {"verb": "/version"},
+            {"method": "GET", "verb": "/api/" + VERSION + "/goodbye"},
+            {"verb": "/api/" + VERSION + "/unknown"},
+            {"method": "POST", "verb": "/api/" + VERSION + "/goodbye", "body": None},
+        ]
+        batch_answer = await self.send_and_check("POST", "/api/" + VERSION + "/batch", 200, calls)
+
+        # Check the status and the result of each call
+        self.assertEqual([result[JSON_STATUS_KEY] for result in batch_answer], [200, 200, 405, 404, 200])
+        self.assertTrue("Hello" in batch_answer[0][JSON_RESULT_KEY][JSON_MSG_KEY])
+        self.assertEqual(VERSION, batch_answer[1][JSON_RESULT_KEY][JSON_VERSION_KEY])
+        self.assertTrue("Goodbye" in batch_answer[4][JSON_RESULT_KEY][JSON_MSG_KEY])
+
+        # Check that the size of the batch is limited
+        await self.send_and_check("POST", "/api/" + VERSION + "/batch", 413, [{"verb": "/version"}] * 1000)
+        # Check that the batch verb can't be called from a batch
+        batch_answer = await self.send_and_check("POST", "/api/" + VERSION + "/batch", 200,
+                                                 [{"verb": "/api/" + VERSION + "/batch", "body": []}])
+        self.assertEqual(batch_answer[0][JSON_STATUS_KEY], 400)
+
+        await asyncio.sleep(0.5)
+
+    async def test_websocket_transport(self):
+        """
+        Test that the verbs can be called on a websocket and that the shutdown closes it
+        """
+        async with self.client.ws_connect("/ws") as ws:
+            # Pipeline several calls on the websocket
+            await ws.send_json({"id": 1, "verb": "/version"})
+            await ws.send_json({"id": "two", "method": "POST", "verb": "/api/" + VERSION + "/hello"})
+            await ws.send_json({"id": 3, "verb": "/api/" + VERSION + "/unknown"})
+            await ws.send_str("not json")
+
+            answers = {}
+            for _ in range(4):
+                answer = await ws.receive_json(timeout=5)
+                answers[answer["id"]] = answer
+
+            # Check the answer of each call
+            self.assertEqual(answers[1][JSON_STATUS_KEY], 200)
+            self.assertEqual(VERSION, answers[1][JSON_RESULT_KEY][JSON_VERSION_KEY])
+            self.assertTrue("Hello" in answers["two"][JSON_RESULT_KEY][JSON_MSG_KEY])
+            self.assertEqual(answers[3][JSON_STATUS_KEY], 404)
+            self.assertEqual(answers[None][JSON_STATUS_KEY], 400)
+
+            # Check that the websocket is closed when the API is stopped
+            await stop_RTest_hello_API(self.app)
+            close_msg = await ws.receive(timeout=5)
+            self.assertEqual(close_msg.type, WSMsgType.CLOSE)
+            self.assertEqual(close_msg.data, WSCloseCode.GOING_AWAY)
+
+        await asyncio.sleep(0.5)
+
+    async def test_metrics_verb(self):
+        """
+        Test that the metrics of the verbs are recorded and exported in the Prometheus format
+        """
+        await self.send_and_check("GET", "/version", 200)
+        await self.send_and_check("GET", "/version", 200)
+        await self.send_and_check("GET", "/api/" + VERSION + "/goodbye", 405)
+
+        metrics = await self.send_and_check("GET", "/metrics", 200)
+
+        # Check the counters of the version verb
+        self.assertIn('rtest_hello_requests_total{verb="/version"} 2', metrics)
+        self.assertIn('rtest_hello_responses_total{verb="/version",code="2xx"} 2', metrics)
+        self.assertIn('rtest_hello_request_duration_seconds_count{verb="/version"} 2', metrics)
+        self.assertIn('rtest_hello_request_duration_seconds_bucket{verb="/version",le="+Inf"} 2', metrics)
+        # Check the status class of the refused request
+        self.assertIn('rtest_hello_responses_total{verb="/api/' + VERSION + '/goodbye",code="4xx"} 1', metrics)
+        # Check that the metrics request itself is in flight
+        self.assertIn("rtest_hello_requests_in_flight 1", metrics)
+        # Check the metrics of the process
+        self.assertIn("process_resident_memory_bytes ", metrics)
+        self.assertIn("process_open_fds ", metrics)
+
+        await asyncio.sleep(0.5)
+
+    async def test_conditional_requests(self):
+        """
+        Test that the static verbs send an ETag and answer 304 when the client already has the answer
+        """
+        for http_method, verb in (("GET", "/version"), ("GET", "/help"), ("POST", "/api/" + VERSION + "/hello")):
+            async with self.client.request(http_method, verb) as answer:
+                self.assertEqual(answer.status, 200)
+                etag = answer.headers["ETag"]
+                self.assertIn("Cache-Control", answer.headers)
+
+            # Check that the same entity tag gives a 304 without body
+            async with self.client.request(http_method, verb, headers={"If-None-Match": etag}) as answer:
+                self.assertEqual(answer.status, 304)
+                self.assertEqual(answer.headers["ETag"], etag)
+                self.assertEqual(await answer.read(), b"")
+
+            # Check that another entity tag gives the full answer
+            async with self.client.request(http_method, verb, headers={"If-None-Match": '"other"'}) as answer:
+                self.assertEqual(answer.status, 200)
+                self.assertNotEqual(await answer.read(), b"")
+
+        await asyncio.sleep(0.5)
+
+    async def test_compression(self):
+        """
+        Test that the answers are compressed according to the Accept-Encoding header
+        """
+        # Check that the verbs list is sent pre-compressed
+        async with self.client.get("/help", headers={"Accept-Encoding": "gzip"}) as answer:
+            self.assertEqual(answer.headers["Content-Encoding"], "gzip")
+            self.assertEqual(answer.headers["Vary"], "Accept, Accept-Encoding")
+            gzip_etag = answer.headers["ETag"]
+            self.assertIn(JSON_VERBS_LIST_KEY, await answer.json())
+
+        # Check that it is not compressed for a client not accepting it
+        async with self.client.get("/help", headers={"Accept-Encoding": "gzip;q=0, identity"}) as answer:
+            self.assertNotIn("Content-Encoding", answer.headers)
+            self.assertNotEqual(answer.headers["ETag"], gzip_etag)
+
+        # Check that a big dynamic answer is compressed
+        calls = [{"verb": "/api/" + VERSION + "/verbs/list"}] * 10
+        async with self.client.post("/api/" + VERSION + "/batch", json=calls,
+                                    headers={"Accept-Encoding": "deflate"}) as answer:
+            self.assertEqual(answer.headers["Content-Encoding"], "deflate")
+            self.assertEqual(len(await answer.json()), 10)
+
+        await asyncio.sleep(0.5)
+
+    async def test_admission_control(self):
+        """
+        Test that the requests are rejected when the event loop lags or when a client sends too many requests
+        """
+        admission = self.app[ADMISSION_KEY]
+        hello_verb = "/api/" + VERSION + "/hello"
+
+        # Block the event loop longer than the maximum lag: the verbs are rejected, except the exempt ones
+        await asyncio.sleep(2 * admission.sampler.interval)
+        time.sleep(admission.max_loop_lag + 0.1)
+        async with self.client.post(hello_verb) as answer:
+            self.assertEqual(answer.status, 503)
+            self.assertIn("Retry-After", answer.headers)
+        await self.send_and_check("GET", "/version", 200)
+
+        # Once the lag is measured again, the verbs are accepted
+        await asyncio.sleep(2 * admission.sampler.interval)
+        await self.send_and_check("POST", hello_verb, 200)
+
+        # Limit the rate of the client: the burst is accepted, then the client must wait
+        admission.buckets = TokenBuckets(1, 2, 10)
+        await self.send_and_check("POST", hello_verb, 200)
+        await self.send_and_check("POST", hello_verb, 200)
+        async with self.client.post(hello_verb) as answer:
+            self.assertEqual(answer.status, 429)
+            self.assertEqual(answer.headers["Retry-After"], "1")
+
+        metrics = await self.send_and_check("GET", "/metrics", 200)
+        self.assertIn('rtest_hello_requests_rejected_total{reason="overload"} 1', metrics)
+        self.assertIn('rtest_hello_requests_rejected_total{reason="rate_limit"} 1', metrics)
+
+        await asyncio.sleep(0.5)
+
+    async def test_debug_profile(self):
+        """
+        Test that the CPU of the running API can be profiled with a debug token
+        """
+        profile_verb = "/debug/profile?seconds=0.5"
+
+        # Check that the debug verbs are disabled without debug token, and protected with one
+        await self.send_and_check("POST", profile_verb, 404)
+        self.app[SETTINGS_KEY]["DEBUG_TOKEN"] = "secret"
+        await self.send_and_check("POST", profile_verb, 401)
+        headers = {"Authorization": "Bearer secret"}
+
+        async def profile(query):
+            # Call some verbs while the profile runs: their handlers must be in the report
+            profile_task = asyncio.create_task(self.client.post(profile_verb + query, headers=headers))
+            for _ in range(20):
+                await self.send_and_check("GET", "/version", 200)
+                await asyncio.sleep(0.01)
+            async with await profile_task as answer:
+                self.assertEqual(answer.status, 200)
+                return await answer.read()
+
+        # Check the deterministic profile
+        self.assertIn(b"version", await profile(""))
+        # Check the collapsed stacks of the sampling profile
+        collapsed = await profile("&mode=sampling")
+        for line in collapsed.decode().splitlines():
+            stack, count = line.rsplit(" ", 1)
+            self.assertGreater(int(count), 0)
+        self.assertIn("run_forever", collapsed.decode())
+
+        # Check the refused parameters
+        async with self.client.post(profile_verb + "&mode=sampling&format=pstats", headers=headers) as answer:
+            self.assertEqual(answer.status, 400)
+        async with self.client.post("/debug/profile?seconds=-1", headers=headers) as answer:
+            self.assertEqual(answer.status, 400)
+
+        await asyncio.sleep(0.5)
+
+    async def test_debug_memory(self):
+        """
+        Test that a leak in a verb handler can be found with the memory snapshots
+        """
+        self.app[SETTINGS_KEY]["DEBUG_TOKEN"] = "secret"
+        headers = {"Authorization": "Bearer secret"}
+        leaked = []
+
+        async def leaking_handler(request):
+            leaked.append([object() for _ in range(1000)])
+            return await version(request)
+
+        async def debug_call(http_method, verb, status_wanted=200):
+            async with self.client.request(http_method, verb, headers=headers) as answer:
+                self.assertEqual(answer.status, status_wanted)
+                return await answer.json()
+
+        status = await debug_call("GET", "/debug/memory")
+        self.assertGreater(status["rss_kb"], 0)
+        self.assertGreater(status["tasks"], 0)
+        self.assertEqual(len(status["gc_counts"]), 3)
+        self.assertFalse(status["tracing"])
+        await debug_call("POST", "/debug/memory/snapshot?name=before", 409)
+
+        # The verb added to the registry is reached through the batch verb
+        api_verbs.add("GET", "/test/leak", leaking_handler)
+        try:
+            self.assertTrue((await debug_call("POST", "/debug/memory/tracemalloc/start"))["tracing"])
+            await debug_call("POST", "/debug/memory/snapshot?name=before")
+            self.assertEqual(list(self.app[MEMORY_SNAPSHOTS_KEY]), ["before"])
+            await self.send_and_check("POST", "/api/" + VERSION + "/batch", 200, [{"verb": "/test/leak"}] * 20)
+
+            # Check that the leaking line is the top allocation site
+            diff = await debug_call("GET", "/debug/memory/diff?from=before&top=5")
+            self.assertEqual(len(diff["differences"]), 5)
+            self.assertEqual(os.path.basename(diff["differences"][0]["file"]), "test_helloworld_cov.py")
+            self.assertGreater(diff["differences"][0]["count_diff"], 0)
+            await debug_call("GET", "/debug/memory/diff?from=unknown", 404)
+        finally:
+            await debug_call("POST", "/debug/memory/tracemalloc/stop")
+            api_verbs.remove("GET", "/test/leak")
+
+        await asyncio.sleep(0.5)
+
+
+# Script serving the API with an additional verb answering after one second
+SLOW_VERB_SERVER = """
+import asyncio
+import sys
+from aiohttp import web
+from redtest_helloworld_api.rtest_hello_api_main import api_verbs
+from redtest_helloworld_api.rtest_hello_server import run_RTest_hello_API
+
+async def slow_handler(request):
+    await asyncio.sleep(1)
+    return web.json_response({"slow": True})
+
+api_verbs.add("GET", "/test/slow", slow_handler)
+run_RTest_hello_API(port=int(sys.argv[1]))
+"""
+
+# Maximum time (in seconds) from the start of the daemon to its first answer
+STARTUP_BUDGET = 3.0
+
+
+def daemon_command() -> list:
+    """
+    Get the command line running the redtesthelloworldd daemon: the installed one \
+    if any, else the one of the source tree
+
+    :returns: list -- The command line to run the daemon
+    """
+    daemon_path = shutil.which("redtesthelloworldd")
+    if daemon_path is None:
+        daemon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "redtesthelloworldd")
+
+    return [sys.executable, daemon_path]
+
+
+class TestRedtestHelloDaemon(unittest.TestCase):
+    """
+    Test class made in order to run the tests on the redtesthelloworldd daemon itself
+    """
+
+    def start_daemon(self, *args: str, command: list = None, ready_check=None, **popen_args) -> subprocess.Popen:
+        """
+        Start the daemon on an unused port and wait for it to answer to the version verb
+
+        :param args: Additional arguments of the daemon command line
+        :type args: str
+        :param command: Command to run instead of the daemon (it gets the port as last argument)
+        :type command: list
+        :param ready_check: Function raising OSError until the daemon is ready (default: get_version)
+        :type ready_check: callable
+        :param popen_args: Additional arguments of subprocess.Popen
+        :returns: subprocess.Popen -- The daemon process
+        """
+        if not hasattr(self, "port"):
+            self.port = unused_port()
+        if command is None:
+            command = daemon_command() + list(args) + ["--port"]
+        daemon = subprocess.Popen(command + [str(self.port)],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **popen_args)
+        self.addCleanup(daemon.kill)
+
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                (ready_check or self.get_version)()
+                return daemon
+            except OSError:
+                time.sleep(0.1)
+
+        self.fail("The daemon did not start")
+
+    def get_version(self) -> bytes:
+        """
+        Send a request to the version verb of the daemon
+
+        :returns: bytes -- The body of the answer
+        """
+        return self.get_verb("/version")
+
+    def get_verb(self, verb: str, timeout: float = 2) -> bytes:
+        """
+        Send a GET request to a verb of the daemon
+
+        :param verb: Verb URL
+        :type verb: str
+        :param timeout: Timeout (in seconds) of the request
+        :type timeout: float
+        :returns: bytes -- The body of the answer
+        """
+        with urllib.request.urlopen("http://localhost:%d%s" % (self.port, verb), timeout=timeout) as answer:
+            return answer.read()
+
+    def worker_pids(self, daemon: subprocess.Popen) -> list:
+        """
+        Get the PIDs of the worker processes of the daemon
+
+        :param daemon: The daemon process
+        :type daemon: subprocess.Popen
+        :returns: list -- The PIDs of the workers
+        """
+        with open("/proc/%d/task/%d/children" % (daemon.pid, daemon.pid)) as children:
+            return [int(pid) for pid in children.read().split()]
+
+    def test_workers_restart_and_stop(self):
+        """
+        Test that the crashed workers are restarted and that SIGTERM stops them all
+        """
+        daemon = self.start_daemon("--workers", "2")
+        workers = self.worker_pids(daemon)
+        self.assertEqual(len(workers), 2)
+
+        # Kill a worker and check that it is replaced
+        os.kill(workers[0], signal.SIGKILL)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            new_workers = self.worker_pids(daemon)
+            if len(new_workers) == 2 and workers[0] not in new_workers:
+                break
+            time.sleep(0.1)
+        self.assertEqual(len(new_workers), 2)
+        self.assertNotIn(workers[0], new_workers)
+        self.assertIn(b"version", self.get_version())
+
+        # Check that SIGTERM stops cleanly the daemon
+        daemon.send_signal(signal.SIGTERM)
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+    def test_shutdown_drains_requests(self):
+        """
+        Test that the requests started before SIGTERM end normally and that the new ones are refused
+        """
+        # Serve the API with an additional slow verb
+        daemon = self.start_daemon(command=[sys.executable, "-c", SLOW_VERB_SERVER])
+
+        # Start slow requests, then ask the API to stop while they are in flight
+        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+            slow_requests = [executor.submit(self.get_verb, "/test/slow", 10) for _ in range(5)]
+            time.sleep(0.3)
+            daemon.send_signal(signal.SIGTERM)
+            time.sleep(0.3)
+
+            # Check that the new connections are refused
+            with self.assertRaises(OSError):
+                self.get_version()
+
+            # Check that all the requests started before SIGTERM got their answer
+            for slow_request in slow_requests:
+                self.assertIn(b"slow", slow_request.result(timeout=10))
+
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+    def test_shutdown_drains_greetings(self):
+        """
+        Test that the big lists of names greeted by the worker processes when SIGTERM is received are fully sent
+        """
+        env = dict(os.environ, RTEST_HELLO_GREETING_POOL_WORKERS="2", RTEST_HELLO_GREETING_CHUNK_NAMES="200")
+        daemon = self.start_daemon("--workers", "1", env=env)
+        names = ["name%d" % index for index in range(60000)]
+
+        def greet_names():
+            greeting_request = urllib.request.Request("http://localhost:%d/api/%s/hello" % (self.port, VERSION),
+                                                      data=json.dumps({JSON_NAMES_KEY: names}).encode(),
+                                                      headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(greeting_request, timeout=30) as answer:
+                return json.loads(answer.read())
+
+        # Ask the API to stop while the greetings are streamed
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            greetings = [executor.submit(greet_names) for _ in range(8)]
+            time.sleep(0.3)
+            daemon.send_signal(signal.SIGTERM)
+
+            for greeting in greetings:
+                messages = greeting.result(timeout=30)
+                self.assertEqual(len(messages), len(names))
+                self.assertTrue(messages[-1][JSON_MSG_KEY].startswith("Hello name59999"))
+
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+    def test_shutdown_closes_event_streams(self):
+        """
+        Test that SIGTERM ends the event streams with a close event, without waiting for the drain timeout
+        """
+        daemon = self.start_daemon("--workers", "1")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            stream = executor.submit(self.get_verb, "/api/" + VERSION + "/hello/stream?interval=0.1", 10)
+            time.sleep(0.5)
+            start = time.monotonic()
+            daemon.send_signal(signal.SIGTERM)
+
+            events = stream.result(timeout=10)
+            self.assertIn(b"event: hello", events)
+            self.assertTrue(events.endswith(b"event: close\ndata: {}\n\n"))
+
+        self.assertEqual(daemon.wait(timeout=10), 0)
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_systemd_notifications(self):
+        """
+        Test that the daemon notifies systemd when it is ready, while its event loop runs and when it stops
+        """
+        notify_path = os.path.join(tempfile.mkdtemp(), "notify")
+        self.addCleanup(shutil.rmtree, os.path.dirname(notify_path))
+        notify_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        notify_socket.bind(notify_path)
+        notify_socket.settimeout(5)
+        self.addCleanup(notify_socket.close)
+
+        env = dict(os.environ, NOTIFY_SOCKET=notify_path, WATCHDOG_USEC="200000")
+        daemon = self.start_daemon("--workers", "1", env=env)
+        notifications = [notify_socket.recv(256) for _ in range(3)]
+        self.assertEqual(notifications[0], b"READY=1")
+        self.assertEqual(notifications[1:], [b"WATCHDOG=1", b"WATCHDOG=1"])
+
+        daemon.send_signal(signal.SIGTERM)
+        while notify_socket.recv(256) != b"STOPPING=1":
+            pass
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+    def test_systemd_workers_watchdog(self):
+        """
+        Test that only the supervisor notifies systemd, and that it restarts a worker which stops pinging
+        """
+        notify_path = os.path.join(tempfile.mkdtemp(), "notify")
+        self.addCleanup(shutil.rmtree, os.path.dirname(notify_path))
+        notify_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        notify_socket.setsockopt(socket.SOL_SOCKET, socket.SO_PASSCRED, 1)
+        notify_socket.bind(notify_path)
+        notify_socket.settimeout(5)
+        self.addCleanup(notify_socket.close)
+
+        def notification():
+            # The notification with the PID of its sender
+            state, ancillary, _, _ = notify_socket.recvmsg(256, socket.CMSG_SPACE(12))
+            sender_pid = struct.unpack("3i", ancillary[0][2])[0]
+            return state, sender_pid
+
+        env = dict(os.environ, NOTIFY_SOCKET=notify_path, WATCHDOG_USEC="200000")
+        daemon = self.start_daemon("--workers", "2", env=env)
+        self.assertEqual(notification(), (b"READY=1", daemon.pid))
+        self.assertEqual([notification() for _ in range(3)], [(b"WATCHDOG=1", daemon.pid)] * 3)
+
+        # Freeze a worker: it is killed and restarted, then the pings go on
+        workers = self.worker_pids(daemon)
+        os.kill(workers[0], signal.SIGSTOP)
+        deadline = time.monotonic() + 10
+        while workers[0] in self.worker_pids(daemon) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self.assertNotIn(workers[0], self.worker_pids(daemon))
+        while len(self.worker_pids(daemon)) < 2 and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self.assertIn(workers[1], self.worker_pids(daemon))
+        self.assertEqual(len(self.worker_pids(daemon)), 2)
+        while notify_socket.recv(256) != b"WATCHDOG=1":
+            pass
+
+        daemon.send_signal(signal.SIGTERM)
+        states = []
+        while b"STOPPING=1" not in states:
+            state, sender_pid = notification()
+            self.assertEqual(sender_pid, daemon.pid)
+            states.append(state)
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+    def test_sync_client(self):
+        """
+        Test the synchronous client on the daemon
+        """
+        daemon = self.start_daemon("--workers", "2")
+
+        with SyncHelloClient("http://localhost:%d" % self.port) as client:
+            self.assertEqual(client.version(), VERSION)
+            self.assertIn("friend", client.goodbye())
+            self.assertEqual(len(client.fan_out([("POST", "/api/" + VERSION + "/hello")] * 10)), 10)
+            self.assertEqual(client.latency.summary()["/api/" + VERSION + "/hello"]["count"], 10)
+
+        daemon.send_signal(signal.SIGTERM)
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+    def test_startup_budget(self):
+        """
+        Test that the daemon answers to its first request within the startup budget
+        """
+        start = time.monotonic()
+        daemon = self.start_daemon("--workers", "1")
+        self.assertLess(time.monotonic() - start, STARTUP_BUDGET)
+
+        daemon.send_signal(signal.SIGTERM)
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+    def test_startup_report(self):
+        """
+        Test that the startup report gives the duration of each startup step, then stops the daemon
+        """
+        report = subprocess.run(daemon_command() + ["--startup-report", "--port", str(unused_port())],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=10, check=True)
+        steps = [line.rsplit(None, 2)[0] for line in report.stdout.decode().splitlines()]
+        self.assertEqual(steps[-4:], ["imports", "app build", "bind", "total"])
+
+    def test_connection_tuning(self):
+        """
+        Test the limit of connections and the keep-alive timeout, with the uvloop event loop if installed
+        """
+        env = dict(os.environ, RTEST_HELLO_EVENT_LOOP="uvloop", RTEST_HELLO_SLOW_CALLBACK_DURATION="0.5",
+                   RTEST_HELLO_MAX_CONNECTIONS="2", RTEST_HELLO_KEEPALIVE_TIMEOUT="1",
+                   RTEST_HELLO_LISTEN_BACKLOG="1024")
+        daemon = self.start_daemon("--workers", "1", env=env)
+
+        def keep_alive_request(connection):
+            connection.sendall(b"GET /version HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            return connection.recv(4096)
+
+        # Keep two connections open: the third one is refused
+        connections = []
+        for expected_status in (b"200 OK", b"200 OK", b"503 Service Unavailable"):
+            connection = socket.create_connection(("localhost", self.port), timeout=5)
+            self.addCleanup(connection.close)
+            connections.append(connection)
+            self.assertIn(expected_status, keep_alive_request(connection))
+
+        # Check that the idle connections are closed after the keep-alive timeout
+        time.sleep(1.5)
+        self.assertEqual(connections[0].recv(4096), b"")
+        self.assertIn(b"version", self.get_version())
+
+        daemon.send_signal(signal.SIGTERM)
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+    def test_soak(self):
+        """
+        Test a short soak run of the mix of verbs against the daemon, with its usage read from the metrics verb \
+        and then from /proc for each of its processes
+        """
+        daemon = self.start_daemon("--workers", "1")
+        tap_path = os.path.join(tempfile.mkdtemp(), "soak.tap")
+        self.addCleanup(shutil.rmtree, os.path.dirname(tap_path))
+
+        soak_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "soak_helloworld.py")
+        soak = subprocess.run([sys.executable, soak_path, "--url", "http://localhost:%d" % self.port,
+                               "--duration", "3", "--interval", "0.5", "--clients", "4",
+                               "--p99-growth", "10", "--tap", tap_path],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=60)
+        self.assertEqual(soak.returncode, 0, soak.stderr.decode())
+
+        with open(tap_path) as tap_file:
+            tap = tap_file.read().splitlines()
+        self.assertEqual(tap[1], "1..4")
+        self.assertTrue(all(line.startswith("ok ") for line in tap[2:]), tap)
+        self.assertIn("server open fds", tap[4])
+
+        daemon.send_signal(signal.SIGTERM)
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+        # With the PID of the daemon, the supervisor and each worker get their own series
+        daemon = self.start_daemon("--workers", "2")
+        soak = subprocess.run([sys.executable, soak_path, "--url", "http://localhost:%d" % self.port,
+                               "--pid", str(daemon.pid), "--duration", "2", "--interval", "0.5",
+                               "--clients", "4", "--p99-growth", "10", "--tap", tap_path],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=60)
+        self.assertEqual(soak.returncode, 0, soak.stderr.decode())
+
+        with open(tap_path) as tap_file:
+            tap = tap_file.read().splitlines()
+        self.assertEqual(tap[1], "1..8")
+        self.assertIn("process %d RSS" % daemon.pid, tap[3])
+
+        daemon.send_signal(signal.SIGTERM)
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+    def test_socket_activation(self):
+        """
+        Test that the daemon serves the listening socket passed by systemd instead of binding its port
+        """
+        # Open the listening socket like systemd does
+        listen_socket = socket.socket()
+        listen_socket.bind(("localhost", 0))
+        listen_socket.listen(16)
+        self.addCleanup(listen_socket.close)
+        self.port = listen_socket.getsockname()[1]
+
+        # Pass it as file descriptor 3, with LISTEN_PID set to the PID of the daemon
+        command = ["sh", "-c", 'LISTEN_PID=$$ exec "$0" "$@"'] + daemon_command() + ["--workers", "2", "--port"]
+        env = dict(os.environ, LISTEN_FDS="1")
+        daemon = self.start_daemon(command=command, env=env, close_fds=False,
+                                   preexec_fn=lambda: os.dup2(listen_socket.fileno(), 3))
+
+        self.assertIn(b"version", self.get_version())
+        # The socket keeps the backlog given by systemd
+        self.assertEqual(listen_backlog(listen_socket, 0), 16)
+
+        daemon.send_signal(signal.SIGTERM)
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+    def test_unix_socket(self):
+        """
+        Test that the daemon can serve the API on a Unix domain socket only, with a rate limit per peer process
+        """
+        socket_path = os.path.join(tempfile.mkdtemp(), "redtesthelloapi.sock")
+        self.addCleanup(shutil.rmtree, os.path.dirname(socket_path))
+
+        def get_unix_version():
+            with socket.socket(socket.AF_UNIX) as unix_socket:
+                unix_socket.settimeout(2)
+                unix_socket.connect(socket_path)
+                unix_socket.sendall(b"GET /version HTTP/1.0\r\n\r\n")
+                return unix_socket.makefile("rb").read()
+
+        hello_request = "POST /api/%s/hello HTTP/1.0\r\n\r\n" % VERSION
+        env = dict(os.environ, RTEST_HELLO_ADMISSION_RATE_LIMIT="0.1", RTEST_HELLO_ADMISSION_RATE_BURST="1")
+        daemon = self.start_daemon("--workers", "1", "--no-tcp", "--unix", socket_path,
+                                   ready_check=get_unix_version, env=env)
+
+        self.assertIn(b"200 OK", get_unix_version())
+        # Check that the TCP port is not bound
+        with self.assertRaises(OSError):
+            self.get_version()
+
+        # Check that each local client process gets its own rate limit
+        def post_unix_hello():
+            with socket.socket(socket.AF_UNIX) as unix_socket:
+                unix_socket.settimeout(2)
+                unix_socket.connect(socket_path)
+                unix_socket.sendall(hello_request.encode())
+                return unix_socket.makefile("rb").readline()
+
+        self.assertIn(b"200", post_unix_hello())
+        self.assertIn(b"429", post_unix_hello())
+        other_client = subprocess.run([sys.executable, "-c",
+                                       "import socket, sys\n"
+                                       "client = socket.socket(socket.AF_UNIX)\n"
+                                       "client.connect(sys.argv[1])\n"
+                                       "client.sendall(sys.argv[2].encode())\n"
+                                       "print(client.makefile('rb').readline().decode())",
+                                       socket_path, hello_request],
+                                      capture_output=True, text=True, timeout=10)
+        self.assertIn("200", other_client.stdout)
+
+        daemon.send_signal(signal.SIGTERM)
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+    def test_access_log(self):
+        """
+        Test that the workers write the access log in json lines to a rotating file
+        """
+        log_path = os.path.join(tempfile.mkdtemp(), "access.log")
+        self.addCleanup(shutil.rmtree, os.path.dirname(log_path))
+        env = dict(os.environ, RTEST_HELLO_ACCESS_LOG_PATH=log_path, RTEST_HELLO_ACCESS_LOG_FORMAT="json",
+                   RTEST_HELLO_ACCESS_LOG_MAX_BYTES="4000", RTEST_HELLO_ACCESS_LOG_BACKUP_COUNT="20")
+        daemon = self.start_daemon("--workers", "2", env=env)
+
+        for _ in range(50):
+            self.get_version()
+        daemon.send_signal(signal.SIGTERM)
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+        # Check that the log was rotated and that no request is missing (50 + the ready check)
+        log_files = glob.glob(log_path) + glob.glob(log_path + ".[0-9]*")
+        self.assertGreater(len(log_files), 1)
+        records = []
+        for log_file in log_files:
+            with open(log_file) as log:
+                records.extend(json.loads(line) for line in log)
+        self.assertEqual(len(records), 51)
+        self.assertEqual({(record["method"], record["path"], record["status"]) for record in records},
+                         {("GET", "/version", 200)})
+
+    def test_access_log_overflow(self):
+        """
+        Test that the access log records are dropped and counted when the queue is full
+        """
+        log_path = os.path.join(tempfile.mkdtemp(), "access.log")
+        self.addCleanup(shutil.rmtree, os.path.dirname(log_path))
+        writer = AccessLogWriter(log_path, queue_size=10)
+
+        # The writer thread is not started: the queue overflows
+        record = (time.time(), "127.0.0.1", "GET", "/version", "1.1", 200, 20, "-", "test", 0.001)
+        for _ in range(15):
+            writer.put(record)
+        self.assertEqual(writer.dropped, 5)
+
+        # Once started, the queued records are written
+        writer.start()
+        writer.close()
+        with open(log_path) as log:
+            lines = log.readlines()
+        self.assertEqual(len(lines), 10)
+        self.assertIn('"GET /version HTTP/1.1" 200 20 "-" "test"', lines[0])
@@ -0,0 +1,420 @@
+"""
+File containing the clients of the Redtest Helloworld API: an asynchronous \
+client and a synchronous one, each keeping a pool of keep-alive \
+connections, retrying the failed calls and recording their latency.
+
+Example:
+
+.. code-block:: python
+
+    async with HelloClient("http://localhost:8080") as client:
+        print(await client.hello(name="Alice"))
+
+    with SyncHelloClient("http://localhost:8080") as client:
+        print(client.version())
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+import aiohttp
+import asyncio
+import collections
+import random
+import time
+
+# Import constants
+from redtest_helloworld_api.rtest_hello_shared_constants import (
+    DEFAULT_PORT, JSON_ERROR_KEY, JSON_MSG_KEY, JSON_NAMES_KEY, JSON_NAME_KEY, JSON_VERBS_LIST_KEY,
+    JSON_VERB_KEY, JSON_VERSION_KEY, VERSION)
+
+# Status of the answers retried: the API is overloaded or restarting
+RETRY_STATUSES = frozenset((429, 502, 503, 504))
+# HTTP methods whose calls are retried by default (RFC 9110 idempotent methods)
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+# Number of latencies kept per verb to compute the percentiles
+LATENCY_SAMPLES = 10000
+
+
+class HelloClientError(Exception):
+    """
+    Error answered by the API (after the retries)
+    """
+
+    def __init__(self, status, message):
+        """
+        :param status: HTTP status of the answer
+        :type status: int
+        :param message: Error message of the answer
+        :type message: str
+        """
+        super().__init__("%d: %s" % (status, message))
+        self.status = status
+        self.message = message
+
+
+class LatencyStats:
+    """
+    Latencies of the calls measured by the client, per verb (the last \
+    LATENCY_SAMPLES calls of each verb are kept for the percentiles)
+    """
+
+    def __init__(self, samples=LATENCY_SAMPLES):
+        """
+        :param samples: Number of latencies kept per verb
+        :type samples: int
+        """
+        self._samples = samples
+        self._latencies = {}
+        self._counts = collections.Counter()
+
+    def record(self, verb, seconds):
+        """
+        Record the latency of a call
+
+        :param verb: Path of the verb
+        :type verb: str
+        :param seconds: Latency of the call, in seconds
+        :type seconds: float
+        """
+        latencies = self._latencies.get(verb)
+        if latencies is None:
+            latencies = self._latencies[verb] = collections.deque(maxlen=self._samples)
+        latencies.append(seconds)
+        self._counts[verb] += 1
+
+    def summary(self):
+        """
+        Get the statistics of the latencies of each verb
+
+        :returns: dict -- For each verb: "count" (number of calls), "mean", \
+        "p50", "p95", "p99" and "max" (in seconds, on the kept latencies)
+        """
+        summary = {}
+        for verb, latencies in self._latencies.items():
+            ordered = sorted(latencies)
+            last = len(ordered) - 1
+            summary[verb] = {
+                             "count": self._counts[verb],
+                             "mean": sum(ordered) / len(ordered),
+                             "p50": ordered[int(last * 0.50)],
+                             "p95": ordered[int(last * 0.95)],
+                             "p99": ordered[int(last * 0.99)],
+                             "max": ordered[last]
+                            }
+
+        return summary
+
+
+class HelloClient:
+    """
+    Asynchronous client of the API. Its calls share a pool of keep-alive \
+    connections (opened on the first call), are retried with an exponential \
+    backoff when the API is unreachable or overloaded, and their latency is \
+    recorded in latency.
+
+    Only the idempotent calls are retried: the ones with an idempotent HTTP \
+    method, and the POST calls declared idempotent by their caller (the \
+    greetings are, the debug verbs are not). The other calls are retried \
+    only when the connection to the API could not be opened, as the API \
+    did not get them.
+    """
+
+    def __init__(self, base_url="http://localhost:%d" % DEFAULT_PORT, unix_path=None,
+                 max_connections=100, timeout=10.0, retries=3, backoff=0.05, max_backoff=2.0):
+        """
+        :param base_url: URL of the API
+        :type base_url: str
+        :param unix_path: Path of the Unix domain socket of the API (None to \
+        connect with TCP)
+        :type unix_path: str
+        :param max_connections: Maximum number of connections open at the \
+        same time
+        :type max_connections: int
+        :param timeout: Timeout (in seconds) of each try of a call
+        :type timeout: float
+        :param retries: Number of retries of a failed call
+        :type retries: int
+        :param backoff: Delay (in seconds) before the first retry, doubled \
+        for each next one
+        :type backoff: float
+        :param max_backoff: Maximum delay (in seconds) between two tries
+        :type max_backoff: float
+        """
+        self.base_url = base_url.rstrip("/")
+        self.unix_path = unix_path
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.latency = LatencyStats()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_session(self):
+        """
+        Get the session of the client, created on the first call (in the \
+        running event loop)
+
+        :returns: aiohttp.ClientSession -- The session
+        """
+        if self._session is None or self._session.closed:
+            if self.unix_path is not None:
+                connector = aiohttp.UnixConnector(self.unix_path, limit=self.max_connections)
+            else:
+                connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        return self._session
+
+    async def close(self):
+        """
+        Close the connections of the client
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _retry_delay(self, attempt, retry_after=None):
+        """
+        Get the delay before retrying a call: exponential backoff with jitter, \
+        at least the Retry-After delay given by the API, at most max_backoff
+
+        :param attempt: Number of the failed try (0 for the first one)
+        :type attempt: int
+        :param retry_after: Value of the Retry-After header, if any
+        :type retry_after: str
+        :returns: float -- The delay in seconds
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        if retry_after is not None and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.max_backoff))
+
+        return delay
+
+    async def call(self, method, verb, body=None, idempotent=None):
+        """
+        Coroutine calling a verb of the API
+
+        :param method: HTTP method of the verb
+        :type method: str
+        :param verb: Path of the verb
+        :type verb: str
+        :param body: Json body of the call (None for no body)
+        :param idempotent: Retry the call when the API is overloaded or does \
+        not answer (default: only for the IDEMPOTENT_METHODS)
+        :type idempotent: bool
+        :returns: The decoded json answer
+        :raises HelloClientError: When the API answers an error
+        :raises aiohttp.ClientError: When the API is unreachable after the \
+        retries
+        """
+        session = self._get_session()
+        url = self.base_url + verb
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        retries = self.retries if idempotent else 0
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            retry_after = None
+            try:
+                async with session.request(method, url, json=body) as answer:
+                    if answer.status < 400:
+                        data = await answer.json(content_type=None)
+                        self.latency.record(verb, time.perf_counter() - start)
+                        return data
+                    if answer.status not in RETRY_STATUSES or attempt >= retries:
+                        # The errors of aiohttp itself (404, 405, ...) are not json
+                        if "json" in answer.content_type:
+                            message = (await answer.json()).get(JSON_ERROR_KEY, "")
+                        else:
+                            message = await answer.text()
+                        raise HelloClientError(answer.status, message)
+                    retry_after = answer.headers.get("Retry-After")
+            except aiohttp.ClientConnectorError:
+                # The call did not reach the API: it can always be retried
+                if attempt >= self.retries:
+                    raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= retries:
+                    raise
+
+            await asyncio.sleep(self._retry_delay(attempt, retry_after))
+            attempt += 1
+
+    async def version(self):
+        """
+        Coroutine getting the version of the API
+
+        :returns: str -- The version
+        """
+        return (await self.call("GET", "/version"))[JSON_VERSION_KEY]
+
+    async def verbs_list(self):
+        """
+        Coroutine getting the verbs of the API
+
+        :returns: list -- The paths of the verbs
+        """
+        answer = await self.call("GET", "/api/" + VERSION + "/verbs/list")
+
+        return [verb[JSON_VERB_KEY] for verb in answer[JSON_VERBS_LIST_KEY]]
+
+    async def _greet(self, verb, name, names):
+        """
+        Coroutine calling a greeting verb
+        """
+        # The greetings have no side effect, they can be retried
+        if names is not None:
+            answer = await self.call("POST", verb, {JSON_NAMES_KEY: list(names)}, idempotent=True)
+            return [greeting[JSON_MSG_KEY] for greeting in answer]
+
+        body = {JSON_NAME_KEY: name} if name is not None else None
+
+        return (await self.call("POST", verb, body, idempotent=True))[JSON_MSG_KEY]
+
+    async def hello(self, name=None, names=None):
+        """
+        Coroutine saying hello to the API
+
+        :param name: Name to greet (None for the default message)
+        :type name: str
+        :param names: Names to greet (the API answers a list of messages)
+        :type names: list
+        :returns: str -- The message (list of str when names is given)
+        """
+        return await self._greet("/api/" + VERSION + "/hello", name, names)
+
+    async def goodbye(self, name=None, names=None):
+        """
+        Coroutine saying goodbye to the API
+
+        :param name: Name to greet (None for the default message)
+        :type name: str
+        :param names: Names to greet (the API answers a list of messages)
+        :type names: list
+        :returns: str -- The message (list of str when names is given)
+        """
+        return await self._greet("/api/" + VERSION + "/goodbye", name, names)
+
+    async def fan_out(self, calls, concurrency=None, return_exceptions=False):
+        """
+        Coroutine running several calls at the same time on the pooled \
+        connections
+
+        :param calls: The calls, (method, verb), (method, verb, body) or \
+        (method, verb, body, idempotent) tuples
+        :type calls: iterable
+        :param concurrency: Maximum number of calls running at the same time \
+        (default: the maximum number of connections)
+        :type concurrency: int
+        :param return_exceptions: Give the errors in the results instead of \
+        raising the first one
+        :type return_exceptions: bool
+        :returns: list -- The decoded answers, in the order of the calls
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.max_connections)
+
+        async def limited_call(call):
+            async with semaphore:
+                return await self.call(*call)
+
+        return await asyncio.gather(*[limited_call(call) for call in calls],
+                                    return_exceptions=return_exceptions)
+
+
+class SyncHelloClient:
+    """
+    Synchronous client of the API: a HelloClient run in a private event \
+    loop, with the same calls, connection pooling, retries and latency \
+    recording.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Same parameters as HelloClient
+        """
+        self._loop = asyncio.new_event_loop()
+        self._client = HelloClient(*args, **kwargs)
+        self.latency = self._client.latency
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self, coro):
+        """
+        Run a coroutine of the asynchronous client in the private event loop
+        """
+        return self._loop.run_until_complete(coro)
+
+    def close(self):
+        """
+        Close the connections of the client and its event loop
+        """
+        if not self._loop.is_closed():
+            self._run(self._client.close())
+            self._loop.close()
+
+    def call(self, method, verb, body=None, idempotent=None):
+        """
+        Call a verb of the API, see HelloClient.call
+        """
+        return self._run(self._client.call(method, verb, body, idempotent))
+
+    def version(self):
+        """
+        Get the version of the API, see HelloClient.version
+        """
+        return self._run(self._client.version())
+
+    def verbs_list(self):
+        """
+        Get the verbs of the API, see HelloClient.verbs_list
+        """
+        return self._run(self._client.verbs_list())
+
+    def hello(self, name=None, names=None):
+        """
+        Say hello to the API, see HelloClient.hello
+        """
+        return self._run(self._client.hello(name, names))
+
+    def goodbye(self, name=None, names=None):
+        """
+        Say goodbye to the API, see HelloClient.goodbye
+        """
+        return self._run(self._client.goodbye(name, names))
+
+    def fan_out(self, calls, concurrency=None, return_exceptions=False):
+        """
+        Run several calls at the same time, see HelloClient.fan_out
+        """
+        return self._run(self._client.fan_out(calls, concurrency, return_exceptions))
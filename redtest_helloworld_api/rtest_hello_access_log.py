@@ -0,0 +1,319 @@
+"""
+File containing the access logger writing the access log in batches, in a \
+background thread, to a rotating file.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import hdrs
+from aiohttp.abc import AbstractAccessLogger
+import fcntl
+import logging
+import os
+import queue
+import threading
+import time
+
+from redtest_helloworld_api.rtest_hello_serializer import json_dumps
+from redtest_helloworld_api.rtest_hello_metrics import METRIC_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# Formats of the access log lines
+ACCESS_LOG_FORMATS = ("text", "json")
+# Marker asking the writer thread to stop
+_STOP = object()
+
+
+class AccessLogWriter:
+    """
+    Writer of the access log. The records are put on a bounded queue by the \
+    event loop thread, and formatted and written in batches by a background \
+    thread. When the queue is full, the records are dropped (and counted) \
+    instead of waiting for the disk.
+
+    The file is rotated when it is too big. Several processes can write the \
+    same file: the lines of a batch are written with a single append, the \
+    rotation is done by a single process under a lock (flock on the \
+    path + ".lock" file), and the other processes reopen the rotated file.
+    """
+
+    def __init__(self, path, output_format="text", max_bytes=0, backup_count=0,
+                 queue_size=10000, batch_size=256):
+        """
+        :param path: Path of the access log
+        :type path: str
+        :param output_format: "text" (combined log format) or "json" (json lines)
+        :type output_format: str
+        :param max_bytes: Size above which the file is rotated (0 for no \
+        rotation)
+        :type max_bytes: int
+        :param backup_count: Number of rotated files kept
+        :type backup_count: int
+        :param queue_size: Maximum number of records waiting to be written
+        :type queue_size: int
+        :param batch_size: Maximum number of records written at once
+        :type batch_size: int
+        """
+        if output_format not in ACCESS_LOG_FORMATS:
+            raise ValueError("Unknown access log format %s" % output_format)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.format_record = self.format_json if output_format == "json" else self.format_text
+        self.queue = queue.Queue(queue_size)
+        # Number of records written and dropped
+        self.written = 0
+        self.dropped = 0
+        self._file = None
+        self._lock_file = None
+        self._thread = None
+        # Date of the last second formatted in the text format
+        self._last_second = None
+        self._last_date = None
+
+    def start(self):
+        """
+        Open the access log and start the writer thread
+        """
+        self._open()
+        if self.max_bytes:
+            self._lock_file = open(self.path + ".lock", "ab")
+        self._thread = threading.Thread(target=self._run, name="access-log", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """
+        Write the remaining records, stop the writer thread and close the \
+        access log (blocking)
+        """
+        if self._thread is not None:
+            # The stop marker must not be dropped
+            self.queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def put(self, record):
+        """
+        Queue a record without waiting (the record is dropped if the queue is \
+        full)
+
+        :param record: The record: (time, remote, method, path, version, \
+        status, size, referer, user agent, duration)
+        :type record: tuple
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def format_text(self, record):
+        """
+        Format a record in the combined log format, followed by the duration
+
+        :param record: The record
+        :type record: tuple
+        :returns: str -- The line
+        """
+        (timestamp, remote, method, path, version, status, size, referer,
+         user_agent, duration) = record
+        second = int(timestamp)
+        if second != self._last_second:
+            self._last_second = second
+            self._last_date = time.strftime("%d/%b/%Y:%H:%M:%S +0000", time.gmtime(second))
+
+        return '%s - - [%s] "%s %s HTTP/%s" %d %d "%s" "%s" %.6f\n' % (
+                remote or "-", self._last_date, method, path, version, status,
+                size, referer, user_agent, duration)
+
+    def format_json(self, record):
+        """
+        Format a record as a json line
+
+        :param record: The record
+        :type record: tuple
+        :returns: str -- The line
+        """
+        (timestamp, remote, method, path, version, status, size, referer,
+         user_agent, duration) = record
+
+        return json_dumps({
+                           "time": timestamp,
+                           "remote": remote,
+                           "method": method,
+                           "path": path,
+                           "version": version,
+                           "status": status,
+                           "size": size,
+                           "referer": referer,
+                           "user_agent": user_agent,
+                           "duration": duration
+                          }).decode() + "\n"
+
+    def _open(self):
+        """
+        Open the access log in append mode
+        """
+        self._file = open(self.path, "ab")
+
+    def _path_inode(self):
+        """
+        Get the inode of the file at the path of the access log
+
+        :returns: int -- The inode, None when there is no file
+        """
+        try:
+            return os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return None
+
+    def _rotate_if_needed(self):
+        """
+        Rotate the access log when it is too big, or reopen it when another \
+        process rotated it
+        """
+        file_stat = os.fstat(self._file.fileno())
+        if self._path_inode() == file_stat.st_ino:
+            if not self.max_bytes or file_stat.st_size < self.max_bytes:
+                return
+            # The processes seeing the file too big at the same time rotate
+            # it one after the other: the first one shifts the files, the
+            # next ones find that the path changed and only reopen it
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                if self._path_inode() == file_stat.st_ino:
+                    self._shift_files()
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+        self._file.close()
+        self._open()
+
+    def _shift_files(self):
+        """
+        Shift the rotated files, the oldest one being dropped (called under \
+        the rotation lock)
+        """
+        for index in range(self.backup_count - 1, 0, -1):
+            source = "%s.%d" % (self.path, index)
+            if os.path.exists(source):
+                os.replace(source, "%s.%d" % (self.path, index + 1))
+        if self.backup_count > 0:
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+
+    def _write(self, records):
+        """
+        Format and write a batch of records
+
+        :param records: The records
+        :type records: list
+        """
+        data = "".join([self.format_record(record) for record in records]).encode()
+        try:
+            self._rotate_if_needed()
+            self._file.write(data)
+            self._file.flush()
+            self.written += len(records)
+        except OSError:
+            logger.exception("Cannot write the access log %s", self.path)
+            self.dropped += len(records)
+
+    def _run(self):
+        """
+        Loop of the writer thread: wait for a record, then write it with all \
+        the records already queued (up to the batch size)
+        """
+        while True:
+            records = [self.queue.get()]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = records[-1] is _STOP
+            if stop:
+                records.pop()
+            if records:
+                self._write(records)
+            if stop:
+                return
+
+    def to_prometheus_lines(self):
+        """
+        Export the counters of the access log in the Prometheus text format
+
+        :returns: list -- The lines to append to the metrics export
+        """
+        written_name = METRIC_PREFIX + "access_log_written_total"
+        dropped_name = METRIC_PREFIX + "access_log_dropped_total"
+
+        return [
+                "# HELP %s Number of access log records written." % written_name,
+                "# TYPE %s counter" % written_name,
+                "%s %d" % (written_name, self.written),
+                "# HELP %s Number of access log records dropped." % dropped_name,
+                "# TYPE %s counter" % dropped_name,
+                "%s %d" % (dropped_name, self.dropped)
+               ]
+
+
+class QueueAccessLogger(AbstractAccessLogger):
+    """
+    Access logger of aiohttp giving a compact record of each request to the \
+    access log writer, the formatting and the writing being done by its \
+    background thread. The writer is given to the runner as its access_log, \
+    which aiohttp passes to the logger.
+    """
+
+    def log(self, request, response, time_taken):
+        """
+        Record a request (called by aiohttp at the end of each request)
+
+        :param request: The request
+        :type request: aiohttp.web.BaseRequest
+        :param response: The response
+        :type response: aiohttp.web.StreamResponse
+        :param time_taken: Time taken by the request, in seconds
+        :type time_taken: float
+        """
+        headers = request.headers
+        self.logger.put((time.time(), request.remote, request.method, request.path_qs,
+                    "%d.%d" % request.version, response.status, response.body_length,
+                    headers.get(hdrs.REFERER, "-"), headers.get(hdrs.USER_AGENT, "-"),
+                    time_taken))
+
+    @property
+    def enabled(self):
+        return self.logger is not None
+
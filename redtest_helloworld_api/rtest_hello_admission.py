@@ -0,0 +1,265 @@
+"""
+File containing the admission control of the requests: load shedding based \
+on the event loop lag and on the requests in flight, and rate limiting per \
+client.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import hdrs, web
+import asyncio
+from collections import OrderedDict
+import math
+import socket
+import struct
+from time import monotonic
+
+# Import constants
+from redtest_helloworld_api.rtest_hello_shared_constants import JSON_ERROR_KEY
+from redtest_helloworld_api.rtest_hello_serializer import JSON_MIME_TYPE, json_dumps
+from redtest_helloworld_api.rtest_hello_metrics import METRIC_PREFIX
+
+
+class LoopLagSampler:
+    """
+    Measure of the event loop lag: a task sleeps for a fixed interval and \
+    measures how late it wakes up.
+    """
+
+    def __init__(self, interval):
+        """
+        :param interval: Interval (in seconds) between two measures
+        :type interval: float
+        """
+        self.interval = interval
+        # Last lag measured (in seconds)
+        self.lag = 0.0
+        # Time (monotonic) at which the sampler should wake up next
+        self._next_wakeup = None
+
+    async def run(self):
+        """
+        Coroutine measuring the lag forever (run as a background task)
+        """
+        while True:
+            self._next_wakeup = monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, monotonic() - self._next_wakeup)
+
+    def current_lag(self):
+        """
+        Get the current lag: the last measure, or the delay of the pending \
+        measure if it is already bigger (the loop being blocked)
+
+        :returns: float -- The lag in seconds
+        """
+        if self._next_wakeup is None:
+            return self.lag
+
+        return max(self.lag, monotonic() - self._next_wakeup)
+
+
+class TokenBuckets:
+    """
+    Token buckets limiting the rate of the requests of each client. The least \
+    recently seen clients are forgotten when there are too many of them.
+    """
+
+    def __init__(self, rate, burst, max_clients):
+        """
+        :param rate: Requests per second allowed per client
+        :type rate: float
+        :param burst: Maximum number of requests a client can send at once
+        :type burst: int
+        :param max_clients: Maximum number of clients tracked
+        :type max_clients: int
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # Client -> [tokens, time of the last update]
+        self._buckets = OrderedDict()
+
+    def take(self, client):
+        """
+        Take a token from the bucket of a client
+
+        :param client: Identifier of the client
+        :type client: str
+        :returns: float -- 0 if a token was available, else the time (in \
+        seconds) to wait for the next one
+        """
+        now = monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = [float(self.burst), now]
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+
+        return (1.0 - bucket[0]) / self.rate
+
+
+def rejection_response(status, message, retry_after):
+    """
+    Create the response of a rejected request
+
+    :param status: HTTP status (503 or 429)
+    :type status: int
+    :param message: Error message
+    :type message: str
+    :param retry_after: Time (in seconds) after which the client can retry
+    :type retry_after: int
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    return web.Response(body=json_dumps({JSON_ERROR_KEY: message}), status=status,
+                        content_type=JSON_MIME_TYPE,
+                        headers={hdrs.RETRY_AFTER: str(retry_after)})
+
+
+def client_key(request):
+    """
+    Get the identifier of the client of a request for the rate limit: its \
+    address, or for the peers of a Unix domain socket (which all have the \
+    same empty address) the UID and the PID of the peer process, given by \
+    SO_PEERCRED. Each local client process then gets its own bucket.
+
+    :param request: The request
+    :type request: aiohttp.web.Request
+    :returns: str -- The identifier of the client, None when it is unknown
+    """
+    remote = request.remote
+    if remote:
+        return remote
+
+    transport = request.transport
+    peer_socket = transport.get_extra_info("socket") if transport is not None else None
+    if peer_socket is None or peer_socket.family != socket.AF_UNIX or not hasattr(socket, "SO_PEERCRED"):
+        return remote
+    try:
+        # struct ucred: pid, uid, gid
+        pid, uid, _ = struct.unpack("3i", peer_socket.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                                 struct.calcsize("3i")))
+    except OSError:
+        return remote
+
+    return "unix:%d:%d" % (uid, pid)
+
+
+class AdmissionControl:
+    """
+    Admission control of the requests: a request is rejected with 503 when \
+    the event loop lag or the number of requests in flight is above its \
+    threshold, and with 429 when its client exceeds its rate limit (see \
+    client_key). The exempt verbs are never rejected.
+    """
+
+    def __init__(self, max_loop_lag, max_in_flight, retry_after, exempt_verbs,
+                 lag_sample_interval, rate_limit=0.0, rate_burst=1, max_clients=1):
+        """
+        :param max_loop_lag: Event loop lag (in seconds) above which the \
+        requests are rejected
+        :type max_loop_lag: float
+        :param max_in_flight: Number of requests in flight above which the \
+        requests are rejected
+        :type max_in_flight: int
+        :param retry_after: Value (in seconds) of the Retry-After header
+        :type retry_after: int
+        :param exempt_verbs: Paths of the verbs never rejected
+        :type exempt_verbs: iterable
+        :param lag_sample_interval: Interval (in seconds) of the lag measures
+        :type lag_sample_interval: float
+        :param rate_limit: Requests per second allowed per client (0 for no \
+        limit)
+        :type rate_limit: float
+        :param rate_burst: Burst size of the rate limit
+        :type rate_burst: int
+        :param max_clients: Maximum number of clients tracked by the rate limit
+        :type max_clients: int
+        """
+        self.max_loop_lag = max_loop_lag
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.exempt_verbs = frozenset(exempt_verbs)
+        self.sampler = LoopLagSampler(lag_sample_interval)
+        self.buckets = TokenBuckets(rate_limit, rate_burst, max_clients) if rate_limit > 0 else None
+        self.in_flight = 0
+        # Number of requests rejected, by reason
+        self.rejected_overload = 0
+        self.rejected_rate = 0
+
+    def middleware(self):
+        """
+        Create the aiohttp middleware rejecting the requests
+
+        :returns: coroutine function -- The middleware
+        """
+        @web.middleware
+        async def admission_middleware(request, handler):
+            if request.path in self.exempt_verbs:
+                return await handler(request)
+
+            if self.in_flight >= self.max_in_flight or self.sampler.current_lag() > self.max_loop_lag:
+                self.rejected_overload += 1
+                return rejection_response(503, "The API is overloaded", self.retry_after)
+
+            if self.buckets is not None:
+                wait = self.buckets.take(client_key(request))
+                if wait:
+                    self.rejected_rate += 1
+                    return rejection_response(429, "Too many requests", max(1, int(math.ceil(wait))))
+
+            self.in_flight += 1
+            try:
+                return await handler(request)
+            finally:
+                self.in_flight -= 1
+
+        return admission_middleware
+
+    def to_prometheus_lines(self):
+        """
+        Export the state of the admission control in the Prometheus text format
+
+        :returns: list -- The lines to append to the metrics export
+        """
+        rejected_name = METRIC_PREFIX + "requests_rejected_total"
+        lag_name = METRIC_PREFIX + "event_loop_lag_seconds"
+
+        return [
+                "# HELP %s Number of requests rejected by the admission control." % rejected_name,
+                "# TYPE %s counter" % rejected_name,
+                '%s{reason="overload"} %d' % (rejected_name, self.rejected_overload),
+                '%s{reason="rate_limit"} %d' % (rejected_name, self.rejected_rate),
+                "# HELP %s Last event loop lag measured." % lag_name,
+                "# TYPE %s gauge" % lag_name,
+                "%s %g" % (lag_name, self.sampler.lag)
+               ]
@@ -25,21 +25,120 @@ Main file used to run the Redtest Helloworld API.
 # Import web utilities from the Asynchrone IO HTTP
 from aiohttp import web
 import asyncio
-import os
+import collections
+import functools
+import logging
 import signal
-import sys
+import time
 
 # Import constants
-from redtest_helloworld_api.rtest_hello_shared_constants import *
+from redtest_helloworld_api.rtest_hello_shared_constants import (
+    GOODBYE_MSG, GOODBYE_NAME_MSG, HELLO_MSG, HELLO_NAME_MSG, JSON_MSG_KEY, JSON_NAMES_KEY, JSON_STATUS_KEY,
+    JSON_VERBS_LIST_KEY, JSON_VERB_KEY, JSON_VERSION_KEY, VERSION)
+from redtest_helloworld_api.rtest_hello_response_cache import ResponseCache
+from redtest_helloworld_api.rtest_hello_verb_registry import VerbRegistry
+from redtest_helloworld_api.rtest_hello_dispatch import error_response, run_batch
+from redtest_helloworld_api.rtest_hello_settings import get_setting
+from redtest_helloworld_api.rtest_hello_websocket import OPEN_WEBSOCKETS_KEY, close_websockets, serve_websocket
+from redtest_helloworld_api.rtest_hello_metrics import PROMETHEUS_CONTENT_TYPE, VerbMetrics, process_prometheus_lines
+from redtest_helloworld_api.rtest_hello_tasks import BACKGROUND_TASKS_KEY, cancel_background_tasks, start_background_task
+from redtest_helloworld_api.rtest_hello_admission import AdmissionControl
+from redtest_helloworld_api.rtest_hello_greetings import GreetingPool, greeting_response, streams_greetings
+from redtest_helloworld_api.rtest_hello_systemd import sd_notify, watchdog_interval, watchdog_pings
+from redtest_helloworld_api.rtest_hello_verb_cache import VerbCache, app_cached
+from redtest_helloworld_api.rtest_hello_sse import OPEN_EVENT_STREAMS_KEY, EventStream, close_event_streams
+from redtest_helloworld_api.rtest_hello_access_log import AccessLogWriter
+from redtest_helloworld_api.rtest_hello_compression import compression_middleware
+from redtest_helloworld_api.rtest_hello_serializer import JSON_MIME_TYPE, json_loads, json_response, set_json_encoder
+
+logger = logging.getLogger(__name__)
+
+# Registry where all the verbs of the API are declared
+api_verbs = VerbRegistry()
+# Keys of the static answers in the response cache
+VERSION_ANSWER = "version"
+VERBS_LIST_ANSWER = "verbs_list"
+HELLO_ANSWER = "hello"
+GOODBYE_ANSWER = "goodbye"
+# Settings read by the verb handlers, stored on the application by main_init_app
+HANDLER_SETTINGS = (
+    "BATCH_MAX_ITEMS", "BATCH_MAX_CONCURRENCY", "WS_MAX_PENDING_CALLS", "WS_HEARTBEAT", "GREETING_MAX_NAMES",
+    "COMPRESSION_ENABLED", "SSE_DEFAULT_INTERVAL", "SSE_MIN_INTERVAL", "SSE_MAX_INTERVAL", "SSE_HEARTBEAT",
+    "SSE_MAX_BUFFER", "SSE_MAX_STREAMS", "DEBUG_TOKEN", "DEBUG_PROFILE_MAX_SECONDS", "DEBUG_PROFILE_SAMPLE_INTERVAL",
+    "DEBUG_PROFILE_TOP", "DEBUG_TRACEMALLOC_FRAMES", "DEBUG_MEMORY_MAX_SNAPSHOTS", "DEBUG_MEMORY_TOP",
+)
+
+
+class ApiState:
+    """
+    State of a running application
+    """
+
+    __slots__ = ("started", "stop_requested_at")
+
+    def __init__(self):
+        # True once the application is started
+        self.started = False
+        # Time (time.monotonic) of the stop request, None while the API is running
+        self.stop_requested_at = None
+
+
+# Keys of the settings, the state and the helpers of an application, stored
+# on the application by main_init_app so that the applications of a process
+# do not share them. The metrics and the admission control are stored only
+# when they are enabled, and the access log writer only when the access log
+# is written by the API.
+SETTINGS_KEY = web.AppKey("settings", dict)
+STATE_KEY = web.AppKey("state", ApiState)
+# List of the available verbs of an application, kept up to date from the
+# registry
+AVAILABLE_VERBS_KEY = web.AppKey("available_verbs", list)
+RESPONSE_CACHE_KEY = web.AppKey("response_cache", ResponseCache)
+VERB_CACHE_KEY = web.AppKey("verb_cache", VerbCache)
+GREETING_POOL_KEY = web.AppKey("greeting_pool", GreetingPool)
+METRICS_KEY = web.AppKey("metrics", VerbMetrics)
+ADMISSION_KEY = web.AppKey("admission", AdmissionControl)
+ACCESS_LOG_KEY = web.AppKey("access_log", AccessLogWriter)
+# Memory snapshots taken by the debug verbs, by name, from the oldest to the
+# newest one
+MEMORY_SNAPSHOTS_KEY = web.AppKey("memory_snapshots", collections.OrderedDict)
+
+
+def build_static_answers(available_verbs):
+    """
+    Build the json answers of the verbs that only depend on the constants \
+    and on the list of available verbs.
+
+    :param available_verbs: Paths of the available verbs of the application
+    :type available_verbs: list
+    :returns: dict -- Dictionary associating a response cache key to the \
+    json answer
+    """
+    # Build the list of verbs once
+    verbs = [{JSON_VERB_KEY: verb} for verb in available_verbs]
+
+    return {
+            VERSION_ANSWER: {JSON_VERSION_KEY: VERSION},
+            VERBS_LIST_ANSWER: {JSON_VERBS_LIST_KEY: verbs},
+            HELLO_ANSWER: {JSON_MSG_KEY: HELLO_MSG},
+            GOODBYE_ANSWER: {JSON_MSG_KEY: GOODBYE_MSG}
+           }
 
-# Create the list of available verbs in the API
-available_verbs = []
-# List of all the task's coroutine names to handle at the end
-tasks_coro_to_handle = [
-    "_service_task"  # Task from asyncio_server from engineio
-    ]
+
+def update_available_verbs(app):
+    """
+    Update the list of available verbs of an application from the registry \
+    and drop its static answers, built from this list. Called each time the \
+    verb table changes.
+
+    :param app: The application
+    :type app: aiohttp.web.Application
+    """
+    app[AVAILABLE_VERBS_KEY][:] = api_verbs.paths()
+    app[RESPONSE_CACHE_KEY].invalidate()
 
 
+@api_verbs.verb("GET", "/version")
 async def version(request):
     """
     Verb handler that gives the version of the API.
@@ -51,17 +150,12 @@ async def version(request):
     response by aiohttp
     """
 
-    # Set the json answer with the right version
-    json_answer = {
-                   JSON_VERSION_KEY: VERSION
-                  }
-
-    # Prepare the answer to send
-    answer = web.json_response(json_answer)
-
-    return answer
+    # Send the pre-serialized answer
+    return request.app[RESPONSE_CACHE_KEY].response(VERSION_ANSWER, request)
 
 
+@api_verbs.verb("GET", "/help")
+@api_verbs.verb("GET", "/api/" + VERSION + "/verbs/list")
 async def verbs_list(request):
     """
     Verb handler that gives the list of verbs in this API.
@@ -73,47 +167,134 @@ async def verbs_list(request):
     response by aiohttp
     """
 
-    # Set the json answer
-    json_answer = {}
+    # Send the pre-serialized answer
+    return request.app[RESPONSE_CACHE_KEY].response(VERBS_LIST_ANSWER, request)
 
-    # Add an empty list in the json dictionnary
-    json_answer[JSON_VERBS_LIST_KEY] = []
-    # Get all the verbs allowed in this API
-    verbs_list = available_verbs
 
-    # Add all the events to the dict object
-    for verb in verbs_list:
-        json_answer[JSON_VERBS_LIST_KEY].append({JSON_VERB_KEY: verb})
+def streamed_greetings(request, body):
+    """
+    Tell whether a greeting request is answered with a stream: it can be \
+    neither cached nor shared by the coalesced requests (bypass predicate of \
+    the verb cache)
+
+    :param request: A hello or goodbye request
+    :type request: aiohttp.web.Request
+    :param body: The decoded body of the request
+    :returns: bool -- True if the greetings are streamed
+    """
+    names = body.get(JSON_NAMES_KEY) if isinstance(body, dict) else None
+
+    return isinstance(names, list) and streams_greetings(request, names, request.app[GREETING_POOL_KEY])
+
+
+@app_cached(VERB_CACHE_KEY, bypass=streamed_greetings)
+async def hello_greetings(request):
+    """
+    Say hello to the names given in the body of a request. The answers are \
+    cached, and the identical requests received at the same time share the \
+    same greeting work, except when the greetings are streamed.
+
+    :param request: A hello request with a body
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.StreamResponse -- The greetings
+    """
+    settings = request.app[SETTINGS_KEY]
+    return await greeting_response(request, HELLO_NAME_MSG, request.app[GREETING_POOL_KEY],
+                                   settings["GREETING_MAX_NAMES"], settings["COMPRESSION_ENABLED"])
+
+
+@app_cached(VERB_CACHE_KEY, bypass=streamed_greetings)
+async def goodbye_greetings(request):
+    """
+    Say goodbye to the names given in the body of a request (cached like \
+    hello_greetings)
 
-    # Prepare the answer to send
-    answer = web.json_response(json_answer)
+    :param request: A goodbye request with a body
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.StreamResponse -- The greetings
+    """
+    settings = request.app[SETTINGS_KEY]
+    return await greeting_response(request, GOODBYE_NAME_MSG, request.app[GREETING_POOL_KEY],
+                                   settings["GREETING_MAX_NAMES"], settings["COMPRESSION_ENABLED"])
 
-    return answer
 
+@api_verbs.verb("POST", "/api/" + VERSION + "/hello")
 async def hello_handler(request):
     """
-    Verb handler that says hello to the client
+    Verb handler that says hello to the client. The client can give its name \
+    in the body ({"name": ...}), or a list of names ({"names": [...]}) to get \
+    a json array of messages.
 
     :param request: A request used for receiving request’s information by web \
     handler
     :type request: aiohttp.web.Request
-    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    :returns:  aiohttp.web.StreamResponse -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    if request.body_exists:
+        return await hello_greetings(request)
+
+    # Send the pre-serialized answer
+    return request.app[RESPONSE_CACHE_KEY].response(HELLO_ANSWER, request)
+
+
+@api_verbs.verb("GET", "/api/" + VERSION + "/hello/stream", in_process=False)
+async def hello_stream_handler(request):
+    """
+    Verb handler that sends the hello message as Server-Sent Events, every \
+    interval seconds (query parameter interval), until the client leaves.
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.StreamResponse -- Response class used to send HTTP \
     response by aiohttp
     """
+    settings = request.app[SETTINGS_KEY]
+    try:
+        interval = float(request.query.get("interval", settings["SSE_DEFAULT_INTERVAL"]))
+    except ValueError:
+        interval = 0
+    if not settings["SSE_MIN_INTERVAL"] <= interval <= settings["SSE_MAX_INTERVAL"]:
+        return error_response(400, "The interval must be between %g and %g seconds"
+                              % (settings["SSE_MIN_INTERVAL"], settings["SSE_MAX_INTERVAL"]))
+    if len(request.app[OPEN_EVENT_STREAMS_KEY]) >= settings["SSE_MAX_STREAMS"]:
+        return error_response(503, "Too many event streams")
 
-    # Set the json answer with the right version
-    json_answer = {
-                   JSON_MSG_KEY: HELLO_MSG
-                  }
+    # The events carry the pre-serialized hello answer
+    stream = EventStream(request, "hello", request.app[RESPONSE_CACHE_KEY].get(HELLO_ANSWER).body,
+                         interval, settings["SSE_HEARTBEAT"], settings["SSE_MAX_BUFFER"])
 
-    # Prepare the answer to send
-    answer = web.json_response(json_answer)
+    return await stream.serve()
 
-    return answer
 
+@api_verbs.verb("POST", "/api/" + VERSION + "/goodbye")
 async def goodbye_handler(request):
     """
-    Verb handler that says goodbye to the client
+    Verb handler that says goodbye to the client. The client can give its name \
+    in the body ({"name": ...}), or a list of names ({"names": [...]}) to get \
+    a json array of messages.
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.StreamResponse -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    if request.body_exists:
+        return await goodbye_greetings(request)
+
+    # Send the pre-serialized answer
+    return request.app[RESPONSE_CACHE_KEY].response(GOODBYE_ANSWER, request)
+
+
+@api_verbs.verb("POST", "/api/" + VERSION + "/batch", in_process=False)
+async def batch_handler(request):
+    """
+    Verb handler that runs several verbs in a single HTTP request.
+    The body is a json array of calls {"method": ..., "verb": ..., "body": ...}, \
+    the answer is a json array with the result {"status": ..., "result": ...} \
+    of each call, in the same order.
 
     :param request: A request used for receiving request’s information by web \
     handler
@@ -121,16 +302,404 @@ async def goodbye_handler(request):
     :returns:  aiohttp.web.Response -- Response class used to send HTTP \
     response by aiohttp
     """
+    try:
+        calls = json_loads(await request.read())
+    except ValueError:
+        return error_response(400, "The body must be a json array of verb calls")
+
+    if not isinstance(calls, list):
+        return error_response(400, "The body must be a json array of verb calls")
+    settings = request.app[SETTINGS_KEY]
+    if len(calls) > settings["BATCH_MAX_ITEMS"]:
+        return error_response(413, "Too many verb calls (maximum %d)" % settings["BATCH_MAX_ITEMS"])
 
-    # Set the json answer with the right version
-    json_answer = {
-                   JSON_MSG_KEY: GOODBYE_MSG
-                  }
+    # Run the calls and send all their results at once
+    body = await run_batch(api_verbs, request, calls, settings["BATCH_MAX_CONCURRENCY"])
 
-    # Prepare the answer to send
-    answer = web.json_response(json_answer)
+    return web.Response(body=body, content_type=JSON_MIME_TYPE)
+
+
+@api_verbs.verb("GET", "/ws", in_process=False)
+async def websocket_handler(request):
+    """
+    Verb handler that opens a websocket on which the client can call the verbs \
+    without an HTTP request per call.
+    The client sends json frames {"id": ..., "method": ..., "verb": ..., "body": ...} \
+    and receives a frame {"id": ..., "status": ..., "result": ...} for each call \
+    as soon as it ends.
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.WebSocketResponse -- The websocket, once closed
+    """
+    settings = request.app[SETTINGS_KEY]
+    return await serve_websocket(request, api_verbs, settings["WS_MAX_PENDING_CALLS"], settings["WS_HEARTBEAT"])
+
+
+@api_verbs.verb("GET", "/metrics", in_process=False)
+async def metrics_handler(request):
+    """
+    Verb handler that gives the metrics of the verbs in the Prometheus text format
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    api_metrics = request.app.get(METRICS_KEY)
+    if api_metrics is None:
+        return error_response(404, "The metrics are disabled")
+
+    extra_lines = process_prometheus_lines()
+    extra_lines.extend(request.app[VERB_CACHE_KEY].to_prometheus_lines())
+    api_admission = request.app.get(ADMISSION_KEY)
+    if api_admission is not None:
+        extra_lines.extend(api_admission.to_prometheus_lines())
+    access_log_writer = request.app.get(ACCESS_LOG_KEY)
+    if access_log_writer is not None:
+        extra_lines.extend(access_log_writer.to_prometheus_lines())
+
+    return web.Response(text=api_metrics.to_prometheus(extra_lines),
+                        headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+
+@api_verbs.verb("GET", "/healthz")
+async def healthz_handler(request):
+    """
+    Verb handler that tells that the API is alive (liveness probe): it \
+    answers as long as the event loop runs.
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    return json_response({JSON_STATUS_KEY: "alive"})
+
+
+@api_verbs.verb("GET", "/readyz")
+async def readyz_handler(request):
+    """
+    Verb handler that tells if the API can take new requests (readiness \
+    probe): it answers 503 while the API starts or stops, and while its \
+    event loop lags too much.
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    state = request.app[STATE_KEY]
+    if not state.started:
+        return json_response({JSON_STATUS_KEY: "starting"}, status=503)
+    if state.stop_requested_at is not None:
+        return json_response({JSON_STATUS_KEY: "stopping"}, status=503)
+    api_admission = request.app.get(ADMISSION_KEY)
+    if api_admission is not None and api_admission.sampler.current_lag() > api_admission.max_loop_lag:
+        return json_response({JSON_STATUS_KEY: "overloaded"}, status=503)
+
+    return json_response({JSON_STATUS_KEY: "ready"})
+
+
+def check_debug_request(request):
+    """
+    Check that a request can use the debug verbs
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.Response -- The error response to send, None if \
+    the request can use the debug verbs
+    """
+    debug_token = request.app[SETTINGS_KEY]["DEBUG_TOKEN"]
+    if not debug_token:
+        return error_response(404, "The debug verbs are disabled")
+
+    # The debug tools are only imported when they are used
+    from redtest_helloworld_api.rtest_hello_debug import debug_token_valid
+
+    if not debug_token_valid(request, debug_token):
+        return error_response(401, "A valid debug token is needed")
+
+    return None
+
+
+@api_verbs.verb("POST", "/debug/profile", in_process=False)
+async def debug_profile_handler(request):
+    """
+    Verb handler that profiles the CPU usage of the API during some seconds \
+    (query parameter seconds) and sends the report.
+    The mode query parameter selects the profiler: "cprofile" (deterministic, \
+    report in the "text" or binary "pstats" format) or "sampling" (low \
+    overhead, report in the "collapsed" stacks or "text" format).
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    error = check_debug_request(request)
+    if error is not None:
+        return error
+    from redtest_helloworld_api import rtest_hello_debug
+
+    # Check the parameters of the profile
+    mode = request.query.get("mode", "cprofile")
+    if mode not in rtest_hello_debug.PROFILE_FORMATS:
+        return error_response(400, "The mode must be one of: " + ", ".join(rtest_hello_debug.PROFILE_FORMATS))
+    output_format = request.query.get("format", rtest_hello_debug.PROFILE_FORMATS[mode][0])
+    if output_format not in rtest_hello_debug.PROFILE_FORMATS[mode]:
+        return error_response(400, "Format %s is not available in mode %s" % (output_format, mode))
+    try:
+        seconds = float(request.query.get("seconds", "5"))
+    except ValueError:
+        seconds = 0
+    settings = request.app[SETTINGS_KEY]
+    max_seconds = settings["DEBUG_PROFILE_MAX_SECONDS"]
+    if not 0 < seconds <= max_seconds:
+        return error_response(400, "The duration must be between 0 and %g seconds" % max_seconds)
+
+    report = await rtest_hello_debug.profile_cpu(seconds, mode, output_format,
+                                                 settings["DEBUG_PROFILE_SAMPLE_INTERVAL"],
+                                                 settings["DEBUG_PROFILE_TOP"])
+    if report is None:
+        return error_response(409, "A profile is already running")
+
+    if output_format == "pstats":
+        return web.Response(body=report, content_type="application/octet-stream")
+
+    return web.Response(body=report, content_type="text/plain")
+
+
+def query_int(request, name, default):
+    """
+    Read an integer query parameter of a request
+
+    :param request: The request
+    :type request: aiohttp.web.Request
+    :param name: Name of the query parameter
+    :type name: str
+    :param default: Value when the parameter is missing
+    :type default: int
+    :returns: int -- The value, None if it is not a positive integer
+    """
+    try:
+        value = int(request.query.get(name, default))
+    except ValueError:
+        return None
+
+    return value if value > 0 else None
+
+
+@api_verbs.verb("GET", "/debug/memory", in_process=False)
+async def debug_memory_handler(request):
+    """
+    Verb handler that gives the state of the memory of the API: RSS, garbage \
+    collector counts, number of asyncio tasks and tracemalloc state.
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    error = check_debug_request(request)
+    if error is not None:
+        return error
+    from redtest_helloworld_api import rtest_hello_debug
+
+    return json_response(rtest_hello_debug.memory_status(request.app[MEMORY_SNAPSHOTS_KEY]))
+
+
+@api_verbs.verb("POST", "/debug/memory/tracemalloc/start", in_process=False)
+async def debug_tracemalloc_start_handler(request):
+    """
+    Verb handler that starts tracing the memory allocations (the query \
+    parameter frames gives the number of frames recorded per allocation).
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    error = check_debug_request(request)
+    if error is not None:
+        return error
+    from redtest_helloworld_api import rtest_hello_debug
+
+    frames = query_int(request, "frames", request.app[SETTINGS_KEY]["DEBUG_TRACEMALLOC_FRAMES"])
+    if frames is None:
+        return error_response(400, "The number of frames must be a positive integer")
+
+    rtest_hello_debug.start_memory_tracing(frames)
+
+    return json_response(rtest_hello_debug.memory_status(request.app[MEMORY_SNAPSHOTS_KEY]))
+
+
+@api_verbs.verb("POST", "/debug/memory/tracemalloc/stop", in_process=False)
+async def debug_tracemalloc_stop_handler(request):
+    """
+    Verb handler that stops tracing the memory allocations and drops the \
+    snapshots.
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    error = check_debug_request(request)
+    if error is not None:
+        return error
+    from redtest_helloworld_api import rtest_hello_debug
+
+    rtest_hello_debug.stop_memory_tracing(request.app[MEMORY_SNAPSHOTS_KEY])
+
+    return json_response(rtest_hello_debug.memory_status(request.app[MEMORY_SNAPSHOTS_KEY]))
+
+
+@api_verbs.verb("POST", "/debug/memory/snapshot", in_process=False)
+async def debug_memory_snapshot_handler(request):
+    """
+    Verb handler that takes a snapshot of the traced allocations and keeps it \
+    under a name (query parameter name).
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    error = check_debug_request(request)
+    if error is not None:
+        return error
+    from redtest_helloworld_api import rtest_hello_debug
+
+    name = request.query.get("name")
+    if not name:
+        return error_response(400, "The snapshot needs a name")
+    if not rtest_hello_debug.memory_tracing():
+        return error_response(409, "The memory allocations are not traced")
+
+    # Take the snapshot out of the event loop
+    loop = asyncio.get_running_loop()
+    snapshot = await loop.run_in_executor(None, rtest_hello_debug.take_memory_snapshot)
+    rtest_hello_debug.store_memory_snapshot(request.app[MEMORY_SNAPSHOTS_KEY], name, snapshot,
+                                            request.app[SETTINGS_KEY]["DEBUG_MEMORY_MAX_SNAPSHOTS"])
+
+    return json_response({"name": name, "traces": len(snapshot.traces)})
+
+
+@api_verbs.verb("GET", "/debug/memory/diff", in_process=False)
+async def debug_memory_diff_handler(request):
+    """
+    Verb handler that compares two snapshots (query parameters from and to, \
+    a new snapshot being taken when to is missing) and gives the top \
+    allocation sites (query parameter top) that grew the most, by file and \
+    line.
+
+    :param request: A request used for receiving request’s information by web \
+    handler
+    :type request: aiohttp.web.Request
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    error = check_debug_request(request)
+    if error is not None:
+        return error
+    from redtest_helloworld_api import rtest_hello_debug
+
+    top = query_int(request, "top", request.app[SETTINGS_KEY]["DEBUG_MEMORY_TOP"])
+    if top is None:
+        return error_response(400, "The number of allocation sites must be a positive integer")
+
+    snapshots = request.app[MEMORY_SNAPSHOTS_KEY]
+    old_name = request.query.get("from")
+    new_name = request.query.get("to")
+    for name in (old_name, new_name):
+        if name is not None and name not in snapshots:
+            return error_response(404, "Unknown snapshot %s" % name)
+    if old_name is None:
+        return error_response(400, "The reference snapshot (from) is missing")
+
+    # Take the new snapshot and compare them out of the event loop
+    loop = asyncio.get_running_loop()
+    if new_name is None:
+        new_snapshot = await loop.run_in_executor(None, rtest_hello_debug.take_memory_snapshot)
+    else:
+        new_snapshot = snapshots[new_name]
+    differences = await loop.run_in_executor(None, rtest_hello_debug.memory_snapshot_diff,
+                                             snapshots[old_name], new_snapshot, top)
+
+    return json_response({"from": old_name, "to": new_name, "differences": differences})
+
+
+async def start_API(app):
+    """
+    Mark the API as started and send the watchdog pings asked by systemd, \
+    once the event loop of the application runs
+
+    :param app: The application
+    :type app: aiohttp.web.Application
+    """
+    app[STATE_KEY].started = True
+    interval = watchdog_interval()
+    if interval is not None:
+        start_background_task(app, watchdog_pings(interval))
+
+
+async def start_admission_sampler(app):
+    """
+    Start the measure of the event loop lag used by the admission control, \
+    once the event loop of the application runs
+
+    :param app: The application
+    :type app: aiohttp.web.Application
+    """
+    start_background_task(app, app[ADMISSION_KEY].sampler.run())
+
+
+async def stop_access_log(app):
+    """
+    Write the last records of the access log and close it, once the server \
+    is drained
+
+    :param app: The application
+    :type app: aiohttp.web.Application
+    """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, app[ACCESS_LOG_KEY].close)
+
+
+async def stop_greeting_pool(app):
+    """
+    Stop the greeting worker processes when the application is cleaned up
+
+    :param app: The application
+    :type app: aiohttp.web.Application
+    """
+    app[GREETING_POOL_KEY].shutdown()
+
+
+async def stop_verbs_listener(listener, app):
+    """
+    Stop updating the list of available verbs and the static answers of the \
+    application when the verb table changes, once the application is \
+    cleaned up
+
+    :param listener: The listener registered for the application
+    :type listener: callable
+    :param app: The application
+    :type app: aiohttp.web.Application
+    """
+    api_verbs.remove_listener(listener)
 
-    return answer
 
 def main_init_app():
     """
@@ -143,58 +712,134 @@ def main_init_app():
     web.run_app
     """
 
-    global available_verbs
+    # Read the settings
+    settings = {name: get_setting(name) for name in HANDLER_SETTINGS}
+    set_json_encoder(get_setting("JSON_ENCODER"))
+    available_verbs = api_verbs.paths()
+    response_cache = ResponseCache(functools.partial(build_static_answers, available_verbs),
+                                   get_setting("CACHE_MAX_AGE"), settings["COMPRESSION_ENABLED"])
+    verb_cache = VerbCache(get_setting("VERB_CACHE_MAX_ENTRIES"), get_setting("VERB_CACHE_TTL"),
+                           get_setting("VERB_CACHE_MAX_BODY"))
+    greeting_pool = GreetingPool(get_setting("GREETING_POOL_WORKERS"), get_setting("GREETING_CHUNK_NAMES"))
+
+    # Record the metrics of all the verbs
+    middlewares = []
+    if get_setting("METRICS_ENABLED"):
+        api_metrics = VerbMetrics(available_verbs, get_setting("METRICS_LATENCY_BUCKETS"))
+        middlewares.append(api_metrics.middleware())
+    else:
+        api_metrics = None
+
+    # Reject the requests when the API is overloaded, before any work is done
+    # for them (the rejections are still counted by the metrics)
+    if get_setting("ADMISSION_ENABLED"):
+        api_admission = AdmissionControl(get_setting("ADMISSION_MAX_LOOP_LAG"),
+                                         get_setting("ADMISSION_MAX_IN_FLIGHT"),
+                                         get_setting("ADMISSION_RETRY_AFTER"),
+                                         get_setting("ADMISSION_EXEMPT_VERBS"),
+                                         get_setting("ADMISSION_LAG_SAMPLE_INTERVAL"),
+                                         get_setting("ADMISSION_RATE_LIMIT"),
+                                         get_setting("ADMISSION_RATE_BURST"),
+                                         get_setting("ADMISSION_MAX_CLIENTS"))
+        middlewares.append(api_admission.middleware())
+    else:
+        api_admission = None
+
+    # Compress the big dynamic answers (the static ones are pre-compressed)
+    if settings["COMPRESSION_ENABLED"]:
+        middlewares.append(compression_middleware(get_setting("COMPRESSION_MIN_SIZE")))
+
+    # Write the access log in a background thread (the server gives the
+    # writer to the QueueAccessLogger when it is started)
+    access_log_path = get_setting("ACCESS_LOG_PATH")
+    if access_log_path:
+        access_log_writer = AccessLogWriter(access_log_path,
+                                            get_setting("ACCESS_LOG_FORMAT"),
+                                            get_setting("ACCESS_LOG_MAX_BYTES"),
+                                            get_setting("ACCESS_LOG_BACKUP_COUNT"),
+                                            get_setting("ACCESS_LOG_QUEUE_SIZE"),
+                                            get_setting("ACCESS_LOG_BATCH_SIZE"))
+        access_log_writer.start()
+    else:
+        access_log_writer = None
 
     # Create asynchrone application instance (aiohttp)
-    app = web.Application()
-
-    # Create the application mapping
-    app.add_routes([
-                    web.get("/help", verbs_list),
-                    web.get("/version", version),
-                    web.get(("/api/" + VERSION + "/verbs/list"), verbs_list),
-                    web.post(("/api/" + VERSION + "/hello"), hello_handler),
-                    web.post(("/api/" + VERSION + "/goodbye"), goodbye_handler),
-                    ])
-
-    # Set the available verbs
-    available_verbs = [
-                        ("/help"),
-                        ("/version"),
-                        ("/api/" + VERSION + "/verbs/list"),
-                        ("/api/" + VERSION + "/hello"),
-                        ("/api/" + VERSION + "/goodbye")
-                      ]
+    app = web.Application(middlewares=middlewares)
+
+    # Store the settings, the state and the helpers of the application
+    app[SETTINGS_KEY] = settings
+    app[STATE_KEY] = ApiState()
+    app[AVAILABLE_VERBS_KEY] = available_verbs
+    app[BACKGROUND_TASKS_KEY] = set()
+    app[OPEN_WEBSOCKETS_KEY] = set()
+    app[OPEN_EVENT_STREAMS_KEY] = set()
+    app[RESPONSE_CACHE_KEY] = response_cache
+    app[VERB_CACHE_KEY] = verb_cache
+    app[GREETING_POOL_KEY] = greeting_pool
+    app[MEMORY_SNAPSHOTS_KEY] = collections.OrderedDict()
+    if api_metrics is not None:
+        app[METRICS_KEY] = api_metrics
+    if api_admission is not None:
+        app[ADMISSION_KEY] = api_admission
+    if access_log_writer is not None:
+        app[ACCESS_LOG_KEY] = access_log_writer
+
+    # Create the application mapping from the declared verbs
+    app.add_routes(api_verbs.routes())
+
+    # Mark the API as started and send the watchdog pings
+    app.on_startup.append(start_API)
+    app.on_cleanup.append(cancel_background_tasks)
+
+    # Close the websockets and the event streams when the server shuts down
+    app.on_shutdown.append(close_websockets)
+    app.on_shutdown.append(close_event_streams)
+
+    # Stop the greeting worker processes with the application
+    app.on_cleanup.append(stop_greeting_pool)
+
+    # Close the access log once the last requests are logged
+    if access_log_writer is not None:
+        app.on_cleanup.append(stop_access_log)
+
+    # Measure the event loop lag while the application runs
+    if api_admission is not None:
+        app.on_startup.append(start_admission_sampler)
+
+    # Serialize the static answers once, and again when the verb table changes
+    response_cache.build()
+    verbs_listener = functools.partial(update_available_verbs, app)
+    api_verbs.add_listener(verbs_listener)
+    app.on_cleanup.append(functools.partial(stop_verbs_listener, verbs_listener))
 
     loop = asyncio.get_event_loop()
     for sig in (signal.SIGTERM, signal.SIGINT):
-        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(stop_handler1()))
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(stop_handler1(app)))
 
     return app
 
 
-async def stop_RTest_hello_API():
+async def stop_RTest_hello_API(app):
     """
     Coroutine called to stop cleanly the API.
-    It ends the background task, the timer used for the cookies manager \
-    and all the tasks needed to be stopped properly.
+    It closes the websockets and the event streams of the application and ends all its background \
+    tasks registered with start_background_task. The greeting worker processes are stopped when \
+    the application is cleaned up, once the requests in flight are drained.
+
+    :param app: The application to stop
+    :type app: aiohttp.web.Application
     """
-    # Stop the other tasks badly managed elsewhere
-    # Get all the tasks running (according to python version)
-    if sys.version_info >= (3, 7):
-        all_tasks = asyncio.all_tasks()
-    else:
-        all_tasks = asyncio.Task.all_tasks()
+    # Close the websockets, telling the clients that the server is going away
+    await close_websockets(app)
+
+    # Close the event streams, the clients getting a close event
+    await close_event_streams(app)
 
-    for task in all_tasks:
-        # Get the name of each coroutine
-        coroname = task._coro.__name__
-        # Check if it is a task to stop
-        if(coroname in tasks_coro_to_handle):
-            task.cancel()
+    # Stop the background tasks
+    await cancel_background_tasks(app)
 
 
-async def stop_handler1():
+async def stop_handler1(app):
     """
     This code comes from https://github.com/aio-libs/aiohttp/issues/3593
     on_cleanup / on_shutdown are called after active tasks on the event
@@ -202,21 +847,27 @@ async def stop_handler1():
 
     This function runs asynchronously. While this code
     runs, asyncio is running as if SIGTERM/SIGINT were
-    never caught
+    never caught. The next signals are ignored, the API being
+    already stopping.
+
+    :param app: The application to stop
+    :type app: aiohttp.web.Application
     """
-    await stop_RTest_hello_API()
+    state = app[STATE_KEY]
+    if state.stop_requested_at is not None:
+        return
+    state.stop_requested_at = time.monotonic()
+    logger.info("Stopping the API")
+    sd_notify("STOPPING=1")
 
-    # Now send TERM to asyncio and handle it in stop_handler2
-    loop = asyncio.get_event_loop()
-    loop.remove_signal_handler(signal.SIGINT)
-    sig = signal.SIGTERM
-    loop.remove_signal_handler(sig)
-    loop.add_signal_handler(sig, stop_handler2)
-    os.kill(os.getpid(), sig)
+    await stop_RTest_hello_API(app)
+
+    # Now leave the event loop in stop_handler2, the server is then drained
+    # by its runner
+    loop = asyncio.get_running_loop()
+    loop.call_soon(stop_handler2)
 
 
 def stop_handler2():
-    # This function must run synchronously
-    loop = asyncio.get_event_loop()
-    loop.remove_signal_handler(signal.SIGTERM)
+    # This function must run synchronously: the exception stops the event loop
     raise web.GracefulExit()
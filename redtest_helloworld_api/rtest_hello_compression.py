@@ -0,0 +1,148 @@
+"""
+File containing the negotiation and the compression of the answers \
+(Accept-Encoding / Content-Encoding).
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import hdrs, web
+from functools import lru_cache
+import zlib
+
+# Encoding of the uncompressed answers
+IDENTITY = "identity"
+
+
+def _gzip_compress(body):
+    # zlib writes the gzip format itself (with a null mtime), without loading
+    # the gzip module
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+def _deflate_compress(body):
+    return zlib.compress(body, 9)
+
+
+# Table of the supported content codings, built by content_codings
+_content_codings = None
+
+
+def content_codings():
+    """
+    Get the supported content codings with their compression function, by \
+    order of preference when the client accepts several of them with the \
+    same quality. The table is built on the first call, so that brotli is \
+    not imported when the program starts.
+
+    :returns: dict -- The compression functions, by content coding
+    """
+    global _content_codings
+
+    if _content_codings is None:
+        table = {}
+        # Brotli is used only when it is installed
+        try:
+            import brotli
+            table["br"] = brotli.compress
+        except ImportError:
+            pass
+        table["gzip"] = _gzip_compress
+        table["deflate"] = _deflate_compress
+        _content_codings = table
+
+    return _content_codings
+
+
+def compress(body, coding):
+    """
+    Compress a body with a content coding
+
+    :param body: The body to compress
+    :type body: bytes
+    :param coding: Content coding (one of content_codings())
+    :type coding: str
+    :returns: bytes -- The compressed body
+    """
+    return content_codings()[coding](body)
+
+
+@lru_cache(maxsize=256)
+def negotiate_encoding(accept_encoding):
+    """
+    Choose the content coding of an answer from the Accept-Encoding header of \
+    the request. The clients send the same header values again and again, \
+    so the results are cached.
+
+    :param accept_encoding: Value of the Accept-Encoding header
+    :type accept_encoding: str
+    :returns: str -- The best supported content coding, IDENTITY if none
+    """
+    qualities = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+
+    best_coding = IDENTITY
+    best_quality = 0.0
+    for coding in content_codings():
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best_coding = coding
+            best_quality = quality
+
+    return best_coding
+
+
+def compression_middleware(min_size):
+    """
+    Create the aiohttp middleware compressing the dynamic answers bigger than \
+    a given size (the answers already encoded, like the cached ones, are left \
+    untouched)
+
+    :param min_size: Minimum size (in bytes) of the answers to compress
+    :type min_size: int
+    :returns: coroutine function -- The middleware
+    """
+    @web.middleware
+    async def middleware(request, handler):
+        response = await handler(request)
+
+        if (isinstance(response, web.Response)
+                and hdrs.CONTENT_ENCODING not in response.headers
+                and isinstance(response.body, bytes)
+                and len(response.body) >= min_size):
+            # aiohttp negotiates the coding and compresses the body when it is sent
+            response.enable_compression()
+
+        return response
+
+    return middleware
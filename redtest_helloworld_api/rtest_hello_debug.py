@@ -0,0 +1,388 @@
+"""
+File containing the diagnostic tools of the running API, used by the debug \
+verbs.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import hdrs
+import asyncio
+import collections
+import gc
+import hmac
+import io
+import os
+import sys
+import threading
+import time
+
+
+# Output formats of the profiles for each profiler (the first one is used by
+# default): text report, binary pstats (readable by pstats.Stats and
+# snakeviz) and collapsed stacks (readable by flamegraph.pl and speedscope).
+# The profilers are only imported when a profile is asked.
+PROFILE_FORMATS = {
+                   "cprofile": ("text", "pstats"),
+                   "sampling": ("collapsed", "text")
+                  }
+
+# Only one profile can run at a time
+_profile_running = False
+
+
+def debug_token_valid(request, token):
+    """
+    Check the debug token given by a request in its Authorization header \
+    ("Bearer <token>")
+
+    :param request: The request to check
+    :type request: aiohttp.web.Request
+    :param token: Expected debug token (the check fails when it is empty)
+    :type token: str
+    :returns: bool -- True if the request can use the debug verbs
+    """
+    if not token:
+        return False
+
+    authorization = request.headers.get(hdrs.AUTHORIZATION, "")
+    scheme, _, given_token = authorization.partition(" ")
+    if scheme.lower() != "bearer":
+        return False
+
+    return hmac.compare_digest(given_token.strip().encode(), token.encode())
+
+
+def frame_name(frame):
+    """
+    Get the name of the function of a stack frame, as shown in the profiles
+
+    :param frame: The stack frame
+    :type frame: frame
+    :returns: str -- "function (file:line)"
+    """
+    code = frame.f_code
+
+    return "%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class StackSampler:
+    """
+    Sampling profiler: a thread records the stack of the profiled thread at a \
+    fixed interval. Its overhead does not depend on the number of calls made \
+    by the profiled code.
+    """
+
+    def __init__(self, thread_id, interval):
+        """
+        :param thread_id: Identifier of the profiled thread
+        :type thread_id: int
+        :param interval: Interval (in seconds) between two samples
+        :type interval: float
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        # Number of samples of each stack, the stack being a tuple of frame
+        # names from the outermost to the innermost one
+        self.stacks = collections.Counter()
+        self.samples = 0
+
+    def run(self, seconds):
+        """
+        Record the stacks during a given time (blocking, run in a thread)
+
+        :param seconds: Duration of the profile
+        :type seconds: float
+        """
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+            del frame
+            time.sleep(self.interval)
+
+    def collapsed(self):
+        """
+        Get the samples in the collapsed stacks format: one line per stack, \
+        with its frames separated by ";" and its number of samples
+
+        :returns: str -- The collapsed stacks
+        """
+        return "".join("%s %d\n" % (";".join(stack), count)
+                       for stack, count in self.stacks.most_common())
+
+    def text(self, top):
+        """
+        Get a text report of the functions found the most often in the samples
+
+        :param top: Number of functions listed
+        :type top: int
+        :returns: str -- The report
+        """
+        own_samples = collections.Counter()
+        total_samples = collections.Counter()
+        for stack, count in self.stacks.items():
+            own_samples[stack[-1]] += count
+            for name in set(stack):
+                total_samples[name] += count
+
+        lines = ["%d samples every %g s" % (self.samples, self.interval), "",
+                 "%8s %8s  %s" % ("own", "total", "function")]
+        for name, count in total_samples.most_common(top):
+            lines.append("%8d %8d  %s" % (own_samples[name], count, name))
+
+        return "\n".join(lines) + "\n"
+
+
+def cprofile_report(profiler, output_format, top):
+    """
+    Build the report of a deterministic profile (blocking, run in an executor)
+
+    :param profiler: The profiler, once disabled
+    :type profiler: cProfile.Profile
+    :param output_format: "text" or "pstats"
+    :type output_format: str
+    :param top: Number of functions listed in the text report
+    :type top: int
+    :returns: bytes -- The report
+    """
+    import marshal
+    import pstats
+
+    if output_format == "pstats":
+        profiler.create_stats()
+        return marshal.dumps(profiler.stats)
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+
+    return stream.getvalue().encode()
+
+
+async def profile_cpu(seconds, mode, output_format, sample_interval, top):
+    """
+    Coroutine profiling the event loop thread during a given time. The event \
+    loop keeps running during the profile, and the report is built in an \
+    executor.
+
+    :param seconds: Duration of the profile
+    :type seconds: float
+    :param mode: "cprofile" (deterministic) or "sampling"
+    :type mode: str
+    :param output_format: "text", "pstats" ("cprofile" only) or "collapsed" \
+    ("sampling" only)
+    :type output_format: str
+    :param sample_interval: Interval (in seconds) between two stack samples
+    :type sample_interval: float
+    :param top: Number of functions listed in the text reports
+    :type top: int
+    :returns: bytes -- The report, None if a profile is already running
+    """
+    global _profile_running
+
+    if _profile_running:
+        return None
+
+    _profile_running = True
+    try:
+        return await _run_profile(seconds, mode, output_format, sample_interval, top)
+    finally:
+        _profile_running = False
+
+
+async def _run_profile(seconds, mode, output_format, sample_interval, top):
+    """
+    Coroutine running a profile, see profile_cpu
+    """
+    loop = asyncio.get_running_loop()
+    if mode == "sampling":
+        sampler = StackSampler(threading.get_ident(), sample_interval)
+        await loop.run_in_executor(None, sampler.run, seconds)
+        if output_format == "collapsed":
+            return await loop.run_in_executor(None, lambda: sampler.collapsed().encode())
+        return await loop.run_in_executor(None, lambda: sampler.text(top).encode())
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+
+    return await loop.run_in_executor(None, cprofile_report, profiler, output_format, top)
+
+
+def process_memory():
+    """
+    Get the memory used by the process, from /proc/self/status
+
+    :returns: dict -- The resident set size ("rss_kb") and its peak \
+    ("peak_rss_kb") in kB, 0 when they are unknown
+    """
+    memory = {"rss_kb": 0, "peak_rss_kb": 0}
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    memory["rss_kb"] = int(line.split()[1])
+                elif line.startswith("VmHWM:"):
+                    memory["peak_rss_kb"] = int(line.split()[1])
+    except OSError:
+        pass
+
+    return memory
+
+
+def memory_status(snapshots):
+    """
+    Get the state of the memory of the process: RSS, garbage collector, \
+    asyncio tasks and tracemalloc. Called in the event loop, whose tasks are \
+    counted: only the counters that do not walk the heap are read.
+
+    :param snapshots: Memory snapshots of the application, by name
+    :type snapshots: collections.OrderedDict
+    :returns: dict -- The json payload of the state
+    """
+    import tracemalloc
+
+    status = process_memory()
+    status["gc_counts"] = list(gc.get_count())
+    status["gc_collections"] = [generation["collections"] for generation in gc.get_stats()]
+    status["tasks"] = len(asyncio.all_tasks())
+    status["tracing"] = tracemalloc.is_tracing()
+    if status["tracing"]:
+        status["traced_kb"], status["traced_peak_kb"] = [size // 1024 for size in tracemalloc.get_traced_memory()]
+    status["snapshots"] = list(snapshots)
+
+    return status
+
+
+def memory_tracing():
+    """
+    Check if the memory allocations are traced
+
+    :returns: bool -- True if tracemalloc is tracing
+    """
+    import tracemalloc
+
+    return tracemalloc.is_tracing()
+
+
+def start_memory_tracing(frames):
+    """
+    Start tracing the memory allocations with tracemalloc
+
+    :param frames: Number of frames recorded per allocation
+    :type frames: int
+    """
+    import tracemalloc
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_memory_tracing(snapshots):
+    """
+    Stop tracing the memory allocations and drop all the snapshots
+
+    :param snapshots: Memory snapshots of the application, by name
+    :type snapshots: collections.OrderedDict
+    """
+    import tracemalloc
+
+    tracemalloc.stop()
+    snapshots.clear()
+
+
+def take_memory_snapshot():
+    """
+    Take a snapshot of the traced allocations, without the ones of the \
+    import machinery and of tracemalloc itself (blocking, run in an executor)
+
+    :returns: tracemalloc.Snapshot -- The snapshot
+    """
+    import tracemalloc
+
+    snapshot = tracemalloc.take_snapshot()
+
+    return snapshot.filter_traces((
+                                   tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                                   tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                                   tracemalloc.Filter(False, tracemalloc.__file__),
+                                   tracemalloc.Filter(False, "<unknown>")
+                                  ))
+
+
+def store_memory_snapshot(snapshots, name, snapshot, max_snapshots):
+    """
+    Keep a snapshot under a name, dropping the oldest snapshots when there \
+    are too many of them
+
+    :param snapshots: Memory snapshots of the application, by name, from \
+    the oldest to the newest one
+    :type snapshots: collections.OrderedDict
+    :param name: Name of the snapshot (replaces a snapshot of the same name)
+    :type name: str
+    :param snapshot: The snapshot
+    :type snapshot: tracemalloc.Snapshot
+    :param max_snapshots: Maximum number of snapshots kept
+    :type max_snapshots: int
+    """
+    snapshots.pop(name, None)
+    snapshots[name] = snapshot
+    while len(snapshots) > max_snapshots:
+        snapshots.popitem(last=False)
+
+
+def memory_snapshot_diff(old_snapshot, new_snapshot, top):
+    """
+    Compare two snapshots, grouping the allocations by file and line \
+    (blocking, run in an executor)
+
+    :param old_snapshot: The reference snapshot
+    :type old_snapshot: tracemalloc.Snapshot
+    :param new_snapshot: The snapshot compared to the reference one
+    :type new_snapshot: tracemalloc.Snapshot
+    :param top: Number of allocation sites listed (the biggest differences)
+    :type top: int
+    :returns: list -- The json payload of each allocation site
+    """
+    differences = new_snapshot.compare_to(old_snapshot, "lineno")
+
+    return [{
+             "file": difference.traceback[0].filename,
+             "line": difference.traceback[0].lineno,
+             "size_diff": difference.size_diff,
+             "size": difference.size,
+             "count_diff": difference.count_diff,
+             "count": difference.count
+            } for difference in differences[:top]]
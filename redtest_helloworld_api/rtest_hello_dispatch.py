@@ -0,0 +1,281 @@
+"""
+File containing the functions calling the verb handlers in-process, without \
+an HTTP request per verb call (used by the batch verb and the websocket \
+transport).
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import web
+import asyncio
+import logging
+from multidict import CIMultiDict, CIMultiDictProxy, MultiDict, MultiDictProxy
+
+# Import constants
+from redtest_helloworld_api.rtest_hello_shared_constants import (
+    JSON_BODY_KEY, JSON_ERROR_KEY, JSON_ID_KEY, JSON_METHOD_KEY, JSON_RESULT_KEY, JSON_STATUS_KEY,
+    JSON_VERB_KEY)
+from redtest_helloworld_api.rtest_hello_serializer import JSON_MIME_TYPE, json_dumps, json_response
+
+logger = logging.getLogger(__name__)
+
+# Headers and query of the requests made in-process
+EMPTY_HEADERS = CIMultiDictProxy(CIMultiDict())
+EMPTY_QUERY = MultiDictProxy(MultiDict())
+# Marker of a verb call result encoded without identifier
+NO_CALL_ID = object()
+
+
+class VerbCallRequest:
+    """
+    Lightweight request given to a verb handler called in-process. It \
+    provides the part of the aiohttp.web.Request interface used by the verb \
+    handlers, the body being an already decoded json value.
+    """
+
+    def __init__(self, parent, method, path, body=None):
+        """
+        :param parent: The HTTP request that triggered the verb call
+        :type parent: aiohttp.web.Request
+        :param method: HTTP method of the verb
+        :type method: str
+        :param path: URL path of the verb
+        :type path: str
+        :param body: Decoded json body of the call (None when there is no body)
+        """
+        self.parent = parent
+        self.app = parent.app
+        self.remote = parent.remote
+        self.method = method
+        self.path = path
+        self.headers = EMPTY_HEADERS
+        self.content_type = JSON_MIME_TYPE
+        self.query = EMPTY_QUERY
+        self.match_info = {}
+        self._body = body
+
+    @property
+    def body_exists(self):
+        return self._body is not None
+
+    @property
+    def can_read_body(self):
+        return self._body is not None
+
+    async def json(self, *, loads=None):
+        return self._body
+
+    async def text(self):
+        return (await self.read()).decode("utf-8")
+
+    async def read(self):
+        return json_dumps(self._body) if self._body is not None else b""
+
+
+class VerbCallResult:
+    """
+    Result of a verb called in-process: the HTTP status and the body of the \
+    answer
+    """
+
+    __slots__ = ("status", "content_type", "body")
+
+    def __init__(self, status, content_type, body):
+        """
+        :param status: HTTP status of the answer
+        :type status: int
+        :param content_type: Content type of the answer body
+        :type content_type: str
+        :param body: Body of the answer
+        :type body: bytes
+        """
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+
+    def to_json(self, call_id=NO_CALL_ID):
+        """
+        Encode the result as a json object {"status": ..., "result": ...}. \
+        A json answer body is embedded as is, without being decoded.
+
+        :param call_id: Identifier of the call, added as "id" if given
+        :returns: bytes -- The encoded json object
+        """
+        if "json" in self.content_type and self.body:
+            result = self.body
+        else:
+            result = json_dumps(self.body.decode("utf-8", "replace"))
+
+        if call_id is NO_CALL_ID:
+            id_field = b""
+        else:
+            id_field = b'"%s":%s,' % (JSON_ID_KEY.encode(), json_dumps(call_id))
+
+        return b'{%s"%s":%d,"%s":%s}' % (id_field, JSON_STATUS_KEY.encode(), self.status,
+                                         JSON_RESULT_KEY.encode(), result)
+
+
+def error_result(status, message):
+    """
+    Create the result of a verb call that failed before reaching its handler
+
+    :param status: HTTP status of the error
+    :type status: int
+    :param message: Error message
+    :type message: str
+    :returns: VerbCallResult -- The error result
+    """
+    body = json_dumps({JSON_ERROR_KEY: message})
+
+    return VerbCallResult(status, JSON_MIME_TYPE, body)
+
+
+def error_response(status, message):
+    """
+    Create the HTTP response of an error
+
+    :param status: HTTP status of the error
+    :type status: int
+    :param message: Error message
+    :type message: str
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    return json_response({JSON_ERROR_KEY: message}, status=status)
+
+
+def find_verb(registry, method, path):
+    """
+    Find the verb to call. The method can be omitted when a single verb is \
+    declared on the path.
+
+    :param registry: Registry of the verbs of the API
+    :type registry: VerbRegistry
+    :param method: HTTP method of the verb (may be None)
+    :type method: str
+    :param path: URL path of the verb
+    :type path: str
+    :returns: tuple -- (verb, None) if found, else (None, error result)
+    """
+    if method is None:
+        verbs = registry.find_path(path)
+        if len(verbs) == 1:
+            return verbs[0], None
+        if not verbs:
+            return None, error_result(404, "Unknown verb " + path)
+        return None, error_result(400, "A method is needed to call " + path)
+
+    verb = registry.find(method, path)
+    if verb is not None:
+        return verb, None
+    if registry.find_path(path):
+        return None, error_result(405, "Method %s not allowed for %s" % (method, path))
+
+    return None, error_result(404, "Unknown verb " + path)
+
+
+async def call_verb(registry, parent, method, path, body=None):
+    """
+    Call a verb handler in-process and get its answer
+
+    :param registry: Registry of the verbs of the API
+    :type registry: VerbRegistry
+    :param parent: The HTTP request that triggered the verb call
+    :type parent: aiohttp.web.Request
+    :param method: HTTP method of the verb (may be None, see find_verb)
+    :type method: str
+    :param path: URL path of the verb
+    :type path: str
+    :param body: Decoded json body of the call (None when there is no body)
+    :returns: VerbCallResult -- The answer of the verb
+    """
+    verb, error = find_verb(registry, method, path)
+    if error is not None:
+        return error
+    if not verb.metadata.get("in_process", True):
+        return error_result(400, "Verb %s can't be called in-process" % path)
+
+    try:
+        answer = await verb.handler(VerbCallRequest(parent, verb.method, path, body))
+    except web.HTTPException as exc:
+        answer = exc
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("Error in the handler of %s %s", verb.method, path)
+        return error_result(500, "Internal error in " + path)
+
+    if not isinstance(answer, web.Response) or not isinstance(answer.body, (bytes, type(None))):
+        return error_result(500, "Verb %s has no answer usable in-process" % path)
+
+    return VerbCallResult(answer.status, answer.content_type, answer.body or b"")
+
+
+def parse_call(call):
+    """
+    Check a verb call description {"method": ..., "verb": ..., "body": ...}
+
+    :param call: Decoded json description of the call
+    :returns: tuple -- (method, path, body) if valid, else None
+    """
+    if not isinstance(call, dict):
+        return None
+
+    method = call.get(JSON_METHOD_KEY)
+    path = call.get(JSON_VERB_KEY)
+    if not isinstance(path, str) or not (method is None or isinstance(method, str)):
+        return None
+
+    return method, path, call.get(JSON_BODY_KEY)
+
+
+async def run_batch(registry, parent, calls, max_concurrency):
+    """
+    Run a list of verb calls concurrently and encode their results, in the \
+    order of the calls, as a json array
+
+    :param registry: Registry of the verbs of the API
+    :type registry: VerbRegistry
+    :param parent: The HTTP request of the batch
+    :type parent: aiohttp.web.Request
+    :param calls: Decoded json descriptions of the calls
+    :type calls: list
+    :param max_concurrency: Maximum number of calls running at the same time
+    :type max_concurrency: int
+    :returns: bytes -- The encoded json array of the results
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_call(call):
+        parsed_call = parse_call(call)
+        if parsed_call is None:
+            return error_result(400, "Invalid verb call").to_json()
+
+        async with semaphore:
+            result = await call_verb(registry, parent, *parsed_call)
+
+        return result.to_json()
+
+    results = await asyncio.gather(*[run_call(call) for call in calls])
+
+    return b"[" + b",".join(results) + b"]"
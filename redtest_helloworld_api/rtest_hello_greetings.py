@@ -0,0 +1,229 @@
+"""
+File containing the personalized greetings: the messages built from the names \
+given by the clients, in a pool of worker processes for the big lists.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import hdrs, web
+import asyncio
+
+# Import constants
+from redtest_helloworld_api.rtest_hello_shared_constants import JSON_MSG_KEY, JSON_NAMES_KEY, JSON_NAME_KEY
+from redtest_helloworld_api.rtest_hello_dispatch import VerbCallRequest, error_response
+from redtest_helloworld_api.rtest_hello_serializer import (JSON_MIME_TYPE, array_framing, encode_body,
+                                                            negotiated_response, read_body, request_media_type)
+
+
+def encode_greetings(template, names, media_type=JSON_MIME_TYPE):
+    """
+    Build and encode the greeting of each name (run in the worker processes \
+    for the big lists)
+
+    :param template: Message template, {name} being replaced by each name
+    :type template: str
+    :param names: The names to greet
+    :type names: list
+    :param media_type: Media type of the greetings
+    :type media_type: str
+    :returns: bytes -- The encoded objects {"message": ...}, separated by \
+    the separator of the arrays of the media type
+    """
+    separator = array_framing(media_type, len(names))[1]
+
+    return separator.join([encode_body({JSON_MSG_KEY: template.format(name=name)}, media_type)
+                           for name in names])
+
+
+async def read_names(request, max_names):
+    """
+    Coroutine reading the name ({"name": ...}) or the list of names \
+    ({"names": [...]}) given in the body of a request
+
+    :param request: The request
+    :type request: aiohttp.web.Request
+    :param max_names: Maximum number of names
+    :type max_names: int
+    :returns: tuple -- (name, names, error response): the name or the list \
+    of names, or the response to send if the body is not valid
+    """
+    try:
+        body = await read_body(request)
+    except ValueError:
+        body = None
+
+    if isinstance(body, dict) and isinstance(body.get(JSON_NAME_KEY), str):
+        return body[JSON_NAME_KEY], None, None
+
+    names = body.get(JSON_NAMES_KEY) if isinstance(body, dict) else None
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        return None, None, error_response(400, 'The body must be {"name": ...} or {"names": [...]}')
+    if len(names) > max_names:
+        return None, None, error_response(413, "Too many names (maximum %d)" % max_names)
+
+    return None, names, None
+
+
+class GreetingPool:
+    """
+    Bounded pool of worker processes greeting the big lists of names, chunk \
+    by chunk. A request has a single chunk in the pool at a time, so the \
+    chunks of the concurrent requests are interleaved and the big requests \
+    do not stall the small ones (which are greeted in the event loop).
+    """
+
+    def __init__(self, workers, chunk_names):
+        """
+        :param workers: Number of worker processes (0 to greet all the names \
+        in the event loop)
+        :type workers: int
+        :param chunk_names: Number of names greeted at once
+        :type chunk_names: int
+        """
+        self.workers = workers
+        self.chunk_names = chunk_names
+        # The worker processes are started on the first big list
+        self._executor = None
+        # Bound of the chunks waiting for a worker process
+        self._slots = None
+
+    async def encode(self, template, names, media_type=JSON_MIME_TYPE):
+        """
+        Coroutine greeting a chunk of names, in a worker process when the \
+        chunk is big
+
+        :param template: Message template
+        :type template: str
+        :param names: The names to greet (at most chunk_names)
+        :type names: list
+        :param media_type: Media type of the greetings
+        :type media_type: str
+        :returns: bytes -- The encoded greetings (see encode_greetings)
+        """
+        if self.workers <= 0 or len(names) < self.chunk_names:
+            return encode_greetings(template, names, media_type)
+
+        if self._executor is None:
+            # Imported on the first big list only, to start faster
+            import concurrent.futures
+            import multiprocessing
+
+            # The worker processes are not forked from the event loop process,
+            # which runs threads
+            try:
+                context = multiprocessing.get_context("forkserver")
+            except ValueError:
+                context = multiprocessing.get_context("spawn")
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=context)
+            self._slots = asyncio.Semaphore(2 * self.workers)
+
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            return await loop.run_in_executor(self._executor, encode_greetings, template, names, media_type)
+
+    def chunks(self, names):
+        """
+        Split a list of names in chunks
+
+        :param names: The names
+        :type names: list
+        :returns: generator -- The chunks
+        """
+        for start in range(0, len(names), self.chunk_names):
+            yield names[start:start + self.chunk_names]
+
+    def shutdown(self):
+        """
+        Stop the worker processes, without waiting for the chunks pending
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._slots = None
+
+
+def streams_greetings(request, names, pool):
+    """
+    Tell whether the greetings of a list of names are streamed: the lists \
+    bigger than a chunk are, except for the verbs called in-process
+
+    :param request: The request
+    :type request: aiohttp.web.Request
+    :param names: The names to greet
+    :type names: list
+    :param pool: Pool greeting the big lists
+    :type pool: GreetingPool
+    :returns: bool -- True if the greetings are streamed
+    """
+    return len(names) > pool.chunk_names and not isinstance(request, VerbCallRequest)
+
+
+async def greeting_response(request, template, pool, max_names, compression=False):
+    """
+    Coroutine greeting the name or the list of names given by a request.
+    A name gets a single greeting {"message": ...}, a list of names gets an \
+    array of greetings, in the media type accepted by the request. The \
+    arrays bigger than a chunk are streamed (chunked transfer encoding), \
+    except for the verbs called in-process.
+
+    :param request: The request, with a body in a supported media type
+    :type request: aiohttp.web.Request
+    :param template: Message template, {name} being replaced by each name
+    :type template: str
+    :param pool: Pool greeting the big lists
+    :type pool: GreetingPool
+    :param max_names: Maximum number of names
+    :type max_names: int
+    :param compression: Compress the streamed answers
+    :type compression: bool
+    :returns: aiohttp.web.StreamResponse -- The answer
+    """
+    name, names, error = await read_names(request, max_names)
+    if error is not None:
+        return error
+
+    if names is None:
+        return negotiated_response(request, {JSON_MSG_KEY: template.format(name=name)})
+
+    media_type = request_media_type(request)
+    start, separator, end = array_framing(media_type, len(names))
+    if not streams_greetings(request, names, pool):
+        encoded_chunks = [await pool.encode(template, chunk, media_type) for chunk in pool.chunks(names)]
+        response = web.Response(body=start + separator.join(encoded_chunks) + end, content_type=media_type)
+        response.headers[hdrs.VARY] = hdrs.ACCEPT
+        return response
+
+    # Send the greetings as soon as each chunk is encoded
+    response = web.StreamResponse(headers={hdrs.VARY: hdrs.ACCEPT})
+    response.content_type = media_type
+    if compression:
+        response.enable_compression()
+    await response.prepare(request)
+
+    for chunk in pool.chunks(names):
+        await response.write(start + await pool.encode(template, chunk, media_type))
+        start = separator
+    await response.write(end)
+    await response.write_eof()
+
+    return response
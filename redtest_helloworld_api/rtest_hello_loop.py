@@ -0,0 +1,188 @@
+"""
+File containing the choice and the tuning of the event loop and of the \
+connections of the server.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import web
+import asyncio
+import logging
+import socket
+
+logger = logging.getLogger(__name__)
+
+# Event loop implementations
+EVENT_LOOPS = ("auto", "uvloop", "asyncio")
+# Answer sent on the connections above the maximum number of connections
+REJECTED_CONNECTION_ANSWER = (b"HTTP/1.1 503 Service Unavailable\r\n"
+                              b"Retry-After: 1\r\n"
+                              b"Content-Length: 0\r\n"
+                              b"Connection: close\r\n\r\n")
+
+
+def new_event_loop(implementation="auto", slow_callback_duration=0.0):
+    """
+    Create an event loop
+
+    :param implementation: "auto" (uvloop when it is installed, else \
+    asyncio), "uvloop" or "asyncio"
+    :type implementation: str
+    :param slow_callback_duration: Duration (in seconds) above which a \
+    callback is logged as slow, 0 to disable the asyncio debug mode
+    :type slow_callback_duration: float
+    :returns: asyncio.AbstractEventLoop -- The event loop
+    """
+    if implementation not in EVENT_LOOPS:
+        raise ValueError("Unknown event loop %s" % implementation)
+
+    loop = None
+    if implementation != "asyncio":
+        try:
+            import uvloop
+            loop = uvloop.new_event_loop()
+        except ImportError:
+            if implementation == "uvloop":
+                logger.warning("uvloop is not installed, using the asyncio event loop")
+    if loop is None:
+        loop = asyncio.new_event_loop()
+
+    if slow_callback_duration > 0:
+        loop.set_debug(True)
+        loop.slow_callback_duration = slow_callback_duration
+
+    return loop
+
+
+class RejectedConnection(asyncio.Protocol):
+    """
+    Protocol of a connection above the maximum number of connections: it \
+    answers 503 and closes the connection
+    """
+
+    def connection_made(self, transport):
+        transport.write(REJECTED_CONNECTION_ANSWER)
+        transport.close()
+
+
+class ConnectionLimiter:
+    """
+    Protocol factory of the server limiting the number of connections open \
+    at the same time. It wraps the aiohttp server and gives access to all \
+    its attributes.
+
+    The limit is checked when a connection is accepted, against the \
+    connections already made: the connections accepted in the same loop \
+    iteration can go above it (at most the listen backlog).
+    """
+
+    def __init__(self, server, max_connections):
+        """
+        :param server: The aiohttp server (protocol factory)
+        :type server: aiohttp.web.Server
+        :param max_connections: Maximum number of connections
+        :type max_connections: int
+        """
+        self._server = server
+        self.max_connections = max_connections
+        # Number of connections rejected
+        self.rejected = 0
+
+    def __call__(self):
+        if len(self._server.connections) >= self.max_connections:
+            self.rejected += 1
+            return RejectedConnection()
+
+        return self._server()
+
+    def __getattr__(self, name):
+        return getattr(self._server, name)
+
+
+class LimitedSite(web.BaseSite):
+    """
+    Site of an application runner serving a listening socket, given or bound \
+    to host:port, and limiting the number of connections of the runner open \
+    at the same time (no limit when max_connections is 0). The aiohttp \
+    server of the runner is the protocol factory of the socket, wrapped in a \
+    ConnectionLimiter.
+    """
+
+    def __init__(self, runner, max_connections=0, sock=None, host=None, port=None, reuse_port=False,
+                 backlog=128):
+        """
+        :param runner: The application runner, set up
+        :type runner: aiohttp.web.AppRunner
+        :param max_connections: Maximum number of connections (0 for no limit)
+        :type max_connections: int
+        :param sock: Listening socket to serve (None to bind host:port)
+        :type sock: socket.socket
+        :param host: Host to bind (all the interfaces if None)
+        :type host: str
+        :param port: TCP port to bind
+        :type port: int
+        :param reuse_port: Set SO_REUSEPORT on the socket bound to host:port
+        :type reuse_port: bool
+        :param backlog: Length of the queue of the pending connections
+        :type backlog: int
+        """
+        super().__init__(runner, backlog=backlog)
+        self.runner = runner
+        self.max_connections = max_connections
+        self.sock = sock
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port
+        self.backlog = backlog
+        # The asyncio server accepting the connections, once started
+        self.listener = None
+
+    @property
+    def name(self):
+        if self.sock is None:
+            return "http://%s:%d" % (self.host or "0.0.0.0", self.port)
+        address = self.sock.getsockname()
+        if self.sock.family == socket.AF_UNIX:
+            return "http://unix:%s:" % address
+
+        return "http://%s:%d" % address[:2]
+
+    async def start(self):
+        await super().start()
+        protocol_factory = self.runner.server
+        if self.max_connections > 0:
+            protocol_factory = ConnectionLimiter(protocol_factory, self.max_connections)
+
+        loop = asyncio.get_running_loop()
+        if self.sock is not None:
+            self.listener = await loop.create_server(protocol_factory, sock=self.sock, backlog=self.backlog)
+        else:
+            self.listener = await loop.create_server(protocol_factory, self.host, self.port,
+                                                     reuse_port=self.reuse_port, backlog=self.backlog)
+
+    async def stop(self):
+        # Stop accepting connections, the runner closes the open ones
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        await super().stop()
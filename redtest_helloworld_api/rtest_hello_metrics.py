@@ -0,0 +1,185 @@
+"""
+File containing the metrics recorded for the verbs of the API and their \
+export in the Prometheus text format.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import web
+from bisect import bisect_left
+import os
+from time import perf_counter
+
+# Content type of the Prometheus text format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Label of the requests that do not match any verb
+OTHER_VERB = "other"
+# Number of status classes recorded (1xx to 5xx, index 0 is unused)
+STATUS_CLASSES = 6
+# Prefix of the metric names
+METRIC_PREFIX = "rtest_hello_"
+
+
+def process_prometheus_lines():
+    """
+    Get the metrics of the process (resident memory and open file \
+    descriptors) in the Prometheus text format, with the names used by the \
+    Prometheus clients, so that a soak run can watch them for leaks
+
+    :returns: list -- The lines of the metrics (empty when /proc is missing)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        open_fds = len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return []
+
+    return ["# HELP process_resident_memory_bytes Resident memory size in bytes.",
+            "# TYPE process_resident_memory_bytes gauge",
+            "process_resident_memory_bytes %d" % (resident_pages * os.sysconf("SC_PAGE_SIZE")),
+            "# HELP process_open_fds Number of open file descriptors.",
+            "# TYPE process_open_fds gauge",
+            "process_open_fds %d" % open_fds]
+
+
+class VerbMetrics:
+    """
+    Metrics of the verbs: request counts, status class counts, number of \
+    requests in flight and latency histograms.
+
+    All the counters are stored in lists allocated once and indexed by the \
+    verb index, so recording a request only updates list items.
+    """
+
+    def __init__(self, verbs, buckets):
+        """
+        :param verbs: Paths of the verbs to record
+        :type verbs: list
+        :param buckets: Upper bounds (in seconds) of the latency buckets, sorted
+        :type buckets: tuple
+        """
+        self.verbs = list(verbs) + [OTHER_VERB]
+        self.verb_index = {verb: index for index, verb in enumerate(verbs)}
+        self.other_index = len(verbs)
+        self.buckets = tuple(buckets)
+
+        nb_verbs = len(self.verbs)
+        # One more bucket for the latencies above the last bound (+Inf)
+        self.nb_buckets = len(self.buckets) + 1
+        self.requests = [0] * nb_verbs
+        self.status_counts = [0] * (nb_verbs * STATUS_CLASSES)
+        self.latency_counts = [0] * (nb_verbs * self.nb_buckets)
+        self.latency_sums = [0.0] * nb_verbs
+        self.in_flight = 0
+
+    def record(self, index, status, duration):
+        """
+        Record the end of a request
+
+        :param index: Index of the verb
+        :type index: int
+        :param status: HTTP status of the answer
+        :type status: int
+        :param duration: Duration (in seconds) of the request
+        :type duration: float
+        """
+        self.requests[index] += 1
+        self.status_counts[index * STATUS_CLASSES + min(status // 100, 5)] += 1
+        self.latency_counts[index * self.nb_buckets + bisect_left(self.buckets, duration)] += 1
+        self.latency_sums[index] += duration
+
+    def middleware(self):
+        """
+        Create the aiohttp middleware recording the metrics of each request
+
+        :returns: coroutine function -- The middleware
+        """
+        verb_index = self.verb_index
+        other_index = self.other_index
+
+        @web.middleware
+        async def metrics_middleware(request, handler):
+            index = verb_index.get(request.path, other_index)
+            status = 500
+            self.in_flight += 1
+            start = perf_counter()
+            try:
+                response = await handler(request)
+                status = response.status
+                return response
+            except web.HTTPException as exc:
+                status = exc.status
+                raise
+            finally:
+                self.in_flight -= 1
+                self.record(index, status, perf_counter() - start)
+
+        return metrics_middleware
+
+    def to_prometheus(self, extra_lines=()):
+        """
+        Export the metrics in the Prometheus text format
+
+        :param extra_lines: Additional lines to append to the export
+        :type extra_lines: iterable
+        :returns: str -- The metrics in the Prometheus text format
+        """
+        lines = []
+        requests_name = METRIC_PREFIX + "requests_total"
+        responses_name = METRIC_PREFIX + "responses_total"
+        in_flight_name = METRIC_PREFIX + "requests_in_flight"
+        duration_name = METRIC_PREFIX + "request_duration_seconds"
+        bounds = ["%g" % bound for bound in self.buckets] + ["+Inf"]
+
+        lines.append("# HELP %s Number of requests handled per verb." % requests_name)
+        lines.append("# TYPE %s counter" % requests_name)
+        for index, verb in enumerate(self.verbs):
+            lines.append('%s{verb="%s"} %d' % (requests_name, verb, self.requests[index]))
+
+        lines.append("# HELP %s Number of answers per verb and status class." % responses_name)
+        lines.append("# TYPE %s counter" % responses_name)
+        for index, verb in enumerate(self.verbs):
+            for status_class in range(1, STATUS_CLASSES):
+                lines.append('%s{verb="%s",code="%dxx"} %d'
+                             % (responses_name, verb, status_class,
+                                self.status_counts[index * STATUS_CLASSES + status_class]))
+
+        lines.append("# HELP %s Number of requests being handled." % in_flight_name)
+        lines.append("# TYPE %s gauge" % in_flight_name)
+        lines.append("%s %d" % (in_flight_name, self.in_flight))
+
+        lines.append("# HELP %s Latency of the requests per verb." % duration_name)
+        lines.append("# TYPE %s histogram" % duration_name)
+        for index, verb in enumerate(self.verbs):
+            cumulated = 0
+            first_bucket = index * self.nb_buckets
+            for bucket, bound in enumerate(bounds):
+                cumulated += self.latency_counts[first_bucket + bucket]
+                lines.append('%s_bucket{verb="%s",le="%s"} %d' % (duration_name, verb, bound, cumulated))
+            lines.append('%s_sum{verb="%s"} %.6f' % (duration_name, verb, self.latency_sums[index]))
+            lines.append('%s_count{verb="%s"} %d' % (duration_name, verb, self.requests[index]))
+
+        lines.extend(extra_lines)
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,255 @@
+"""
+File containing the cache of the pre-serialized answers of the static verbs.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import hdrs, web
+import hashlib
+
+from redtest_helloworld_api.rtest_hello_serializer import (JSON_MIME_TYPE, encode_body, media_types,
+                                                            negotiate_media_type)
+from redtest_helloworld_api.rtest_hello_compression import IDENTITY, compress, content_codings, negotiate_encoding
+
+# Content type of the json answers (same as web.json_response)
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+
+
+def cache_control_value(max_age):
+    """
+    Get the Cache-Control header value of the cached answers
+
+    :param max_age: Time (in seconds) the clients can use an answer without \
+    revalidating it, 0 to revalidate it each time (with its ETag)
+    :type max_age: int
+    :returns: str -- The Cache-Control header value
+    """
+    if max_age <= 0:
+        return "no-cache"
+
+    return "max-age=%d" % max_age
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Check if an If-None-Match header value matches an entity tag (weak \
+    comparison, as required for If-None-Match)
+
+    :param if_none_match: Value of the If-None-Match header
+    :type if_none_match: str
+    :param etag: Strong entity tag of the answer, with its quotes
+    :type etag: str
+    :returns: bool -- True if the client already has the answer
+    """
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate == etag or candidate == "W/" + etag:
+            return True
+
+    return False
+
+
+class CachedVariant:
+    """
+    One encoding of a cached answer: the body, its strong entity tag and the \
+    headers to send with it
+    """
+
+    __slots__ = ("body", "etag", "headers", "not_modified_headers")
+
+    def __init__(self, body, etag, headers):
+        """
+        :param body: Encoded body
+        :type body: bytes
+        :param etag: Strong entity tag of the body, with its quotes
+        :type etag: str
+        :param headers: Headers common to all the encodings of the answer
+        :type headers: dict
+        """
+        self.body = body
+        self.etag = etag
+        self.not_modified_headers = dict(headers)
+        self.not_modified_headers[hdrs.ETAG] = etag
+        self.headers = dict(self.not_modified_headers)
+        self.headers[hdrs.CONTENT_LENGTH] = str(len(body))
+
+
+class CachedResponse:
+    """
+    Pre-serialized answer of a static verb: the encoded body, its strong \
+    entity tag and the headers to send with it, plus its variants in the \
+    other media types and content codings
+    """
+
+    __slots__ = ("body", "content_type", "etag", "headers", "not_modified_headers", "variants",
+                 "media_variants")
+
+    def __init__(self, payload, cache_control, codings=(), media_types=(JSON_MIME_TYPE,)):
+        """
+        Serialize the payload once in each media type, compress it and \
+        prepare the headers of the answer
+
+        :param payload: Json payload of the answer
+        :type payload: dict
+        :param cache_control: Value of the Cache-Control header
+        :type cache_control: str
+        :param codings: Content codings in which the answer is pre-compressed
+        :type codings: iterable
+        :param media_types: Media types in which the answer is encoded, the \
+        first one being the default
+        :type media_types: iterable
+        """
+        vary = []
+        if len(media_types) > 1:
+            vary.append(hdrs.ACCEPT)
+        if codings:
+            vary.append(hdrs.ACCEPT_ENCODING)
+
+        # Variants of each media type, associated to their content coding
+        self.media_variants = {}
+        for media_type in media_types:
+            body = encode_body(payload, media_type)
+            common_headers = {
+                              hdrs.CONTENT_TYPE: JSON_CONTENT_TYPE if media_type == JSON_MIME_TYPE else media_type,
+                              hdrs.CACHE_CONTROL: cache_control
+                             }
+            if vary:
+                common_headers[hdrs.VARY] = ", ".join(vary)
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            identity = CachedVariant(body, etag, common_headers)
+
+            # Each coding gets its own entity tag, the representations differing.
+            # A compressed body bigger than the original one is not used.
+            variants = {IDENTITY: identity}
+            for coding in codings:
+                compressed_body = compress(body, coding)
+                if len(compressed_body) >= len(body):
+                    variants[coding] = identity
+                    continue
+                coding_headers = dict(common_headers)
+                coding_headers[hdrs.CONTENT_ENCODING] = coding
+                variants[coding] = CachedVariant(compressed_body, '"%s-%s"' % (etag[1:-1], coding),
+                                                 coding_headers)
+            self.media_variants[media_type] = variants
+
+        # The default media type
+        self.variants = self.media_variants[media_types[0]]
+        identity = self.variants[IDENTITY]
+        self.body = identity.body
+        self.content_type = identity.headers[hdrs.CONTENT_TYPE]
+        self.etag = identity.etag
+        self.headers = identity.headers
+        self.not_modified_headers = identity.not_modified_headers
+
+
+class ResponseCache:
+    """
+    Cache of the answers of the static verbs.
+
+    The payloads are given by a builder function, called once when the cache \
+    is built, and encoded in all the supported media types. The cache is \
+    rebuilt on the first request following a call to invalidate (for \
+    instance when the verb table changes).
+    """
+
+    def __init__(self, payloads_builder, max_age=0, compression=True):
+        """
+        :param payloads_builder: Function returning a dictionary associating \
+        a cache key to the json payload of the answer
+        :type payloads_builder: callable
+        :param max_age: Time (in seconds) the clients can use an answer \
+        without revalidating it
+        :type max_age: int
+        :param compression: Pre-compress the answers in all the supported \
+        content codings
+        :type compression: bool
+        """
+        self._payloads_builder = payloads_builder
+        self._cache_control = cache_control_value(max_age)
+        self._codings = tuple(content_codings()) if compression else ()
+        self._entries = None
+
+    def build(self):
+        """
+        Serialize all the payloads given by the builder function
+        """
+        payloads = self._payloads_builder()
+        supported_media_types = tuple(media_types())
+        self._entries = {key: CachedResponse(payload, self._cache_control, self._codings, supported_media_types)
+                         for key, payload in payloads.items()}
+
+    def invalidate(self):
+        """
+        Drop all the cached answers, they will be rebuilt on the next request
+        """
+        self._entries = None
+
+    def get(self, key):
+        """
+        Get the cached answer associated to a key
+
+        :param key: Key of the answer in the cache
+        :type key: str
+        :returns: CachedResponse -- The pre-serialized answer
+        """
+        if self._entries is None:
+            self.build()
+
+        return self._entries[key]
+
+    def response(self, key, request=None, status=200):
+        """
+        Create the HTTP response of a cached answer, without any serialization.
+        The body is sent in the best media type and content coding accepted \
+        by the request. \
+        When the request has an If-None-Match header matching the entity tag \
+        of this variant, a 304 Not Modified response without body is created.
+
+        :param key: Key of the answer in the cache
+        :type key: str
+        :param request: The request to answer (None to skip the conditional \
+        request check)
+        :type request: aiohttp.web.Request
+        :param status: HTTP status of the response
+        :type status: int
+        :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+        response by aiohttp
+        """
+        entry = self.get(key)
+        if request is None:
+            return web.Response(body=entry.body, status=status, headers=entry.headers)
+
+        headers = request.headers
+        accept = headers.get(hdrs.ACCEPT)
+        variants = entry.variants
+        if accept is not None:
+            variants = entry.media_variants.get(negotiate_media_type(accept), variants)
+        accept_encoding = headers.get(hdrs.ACCEPT_ENCODING)
+        variant = variants[IDENTITY]
+        if accept_encoding is not None:
+            variant = variants.get(negotiate_encoding(accept_encoding), variant)
+
+        if_none_match = headers.get(hdrs.IF_NONE_MATCH)
+        if if_none_match is not None and etag_matches(if_none_match, variant.etag):
+            return web.Response(status=304, headers=variant.not_modified_headers)
+
+        return web.Response(body=variant.body, status=status, headers=variant.headers)
@@ -0,0 +1,420 @@
+"""
+File containing the serializers of the answers of the API: json (the \
+default), and the binary encodings chosen through the Accept header.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import hdrs, web
+import collections.abc
+from functools import lru_cache
+import io
+import json
+
+# Media type of the json answers
+JSON_MIME_TYPE = "application/json"
+# Media type of the CBOR answers
+CBOR_MIME_TYPE = "application/cbor"
+# Maximum nesting of the arrays and maps decoded from CBOR
+CBOR_MAX_DEPTH = 256
+# Media type of the MessagePack answers, and the other names the clients use
+MSGPACK_MIME_TYPE = "application/msgpack"
+MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK_MIME_TYPE,
+    "application/vnd.msgpack": MSGPACK_MIME_TYPE,
+}
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def load_json_encoder(name):
+    """
+    Get the functions of a json encoder
+
+    :param name: Name of the encoder: "orjson", "json" or "auto" (orjson \
+    when it is installed, else json)
+    :type name: str
+    :returns: tuple -- (name, function encoding to bytes, function decoding \
+    str or bytes)
+    """
+    if name in ("auto", "orjson"):
+        try:
+            import orjson
+            return "orjson", orjson.dumps, orjson.loads
+        except ImportError:
+            if name == "orjson":
+                raise
+
+    if name not in ("auto", "json"):
+        raise ValueError("Unknown json encoder " + name)
+
+    return "json", _stdlib_dumps, json.loads
+
+
+def _auto_dumps(obj):
+    # First encoding without a selected encoder: select it now, so that
+    # orjson is imported only when the API encodes json
+    set_json_encoder("auto")
+    return _dumps(obj)
+
+
+def _auto_loads(data):
+    set_json_encoder("auto")
+    return _loads(data)
+
+
+# Encoder in use (None until it is selected, see set_json_encoder)
+encoder_name, _dumps, _loads = None, _auto_dumps, _auto_loads
+
+
+def set_json_encoder(name):
+    """
+    Select the json encoder used by json_dumps and json_loads
+
+    :param name: Name of the encoder (see load_json_encoder)
+    :type name: str
+    """
+    global encoder_name, _dumps, _loads
+
+    encoder_name, _dumps, _loads = load_json_encoder(name)
+
+
+def json_dumps(obj):
+    """
+    Encode a value in json, directly to bytes
+
+    :param obj: Value to encode
+    :returns: bytes -- The UTF-8 encoded json
+    """
+    return _dumps(obj)
+
+
+def json_loads(data):
+    """
+    Decode json
+
+    :param data: The json to decode
+    :type data: bytes or str
+    :returns: The decoded value
+    """
+    return _loads(data)
+
+
+def json_response(data, status=200, headers=None):
+    """
+    Create the HTTP response of a json answer, encoded with the selected encoder
+
+    :param data: Value to send
+    :param status: HTTP status of the response
+    :type status: int
+    :param headers: Additional headers
+    :type headers: dict
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    return web.Response(body=json_dumps(data), status=status, headers=headers,
+                        content_type=JSON_MIME_TYPE)
+
+
+def check_json_value(value):
+    """
+    Check that a value decoded from a binary media type holds only values \
+    that json can hold too (no bytes, no tags, no non-text map keys...), so \
+    that the verbs get the same values in every media type
+
+    :param value: The decoded value
+    :returns: The value
+    :raises ValueError: When the value holds other values
+    """
+    # Walk the value without recursion, its depth is only limited by the decoder
+    items = [value]
+    while items:
+        item = items.pop()
+        if isinstance(item, list):
+            items.extend(item)
+        elif isinstance(item, dict):
+            if not all(isinstance(key, str) for key in item):
+                raise ValueError("The keys of the maps must be text strings")
+            items.extend(item.values())
+        elif item is not None and not isinstance(item, (str, int, float)):
+            raise ValueError("Unsupported value of type %s" % type(item).__name__)
+
+    return value
+
+
+def _msgpack_array_head(length):
+    if length < 16:
+        return bytes((0x90 | length,))
+    if length < 0x10000:
+        return b"\xdc" + length.to_bytes(2, "big")
+
+    return b"\xdd" + length.to_bytes(4, "big")
+
+
+def _cbor_array_head(length):
+    # Major type 4, the length is in the initial byte up to 23, then on 1, 2
+    # or 4 bytes
+    if length < 24:
+        return bytes((0x80 | length,))
+    if length < 0x100:
+        return bytes((0x98, length))
+    if length < 0x10000:
+        return b"\x99" + length.to_bytes(2, "big")
+
+    return b"\x9a" + length.to_bytes(4, "big")
+
+
+class _RejectedTags(collections.abc.Mapping):
+    """
+    Decoders of all the CBOR tags, which reject them: the tags have no \
+    json equivalent, and some of them (regular expressions, decimals, \
+    MIME messages...) are costly to decode
+    """
+
+    def __getitem__(self, tag):
+        return _reject_tag
+
+    def __iter__(self):
+        return iter(())
+
+    def __len__(self):
+        return 0
+
+
+def _reject_tag(decoder, tag=None):
+    raise ValueError("The CBOR tags are not supported")
+
+
+def _load_cbor():
+    # CBOR is used only when cbor2 is installed
+    try:
+        import cbor2
+    except ImportError:
+        return None
+
+    def cbor_loads(data):
+        body = io.BytesIO(data)
+        try:
+            value = cbor2.CBORDecoder(body, tag_hook=_reject_tag, semantic_decoders=_RejectedTags(),
+                                      max_depth=CBOR_MAX_DEPTH).decode()
+        except (cbor2.CBORError, RecursionError) as error:
+            # The errors of cbor2 do not derive from ValueError
+            raise ValueError("Invalid CBOR data: %s" % error)
+        if body.tell() != len(data):
+            raise ValueError("Extra data after the CBOR data item")
+
+        return check_json_value(value)
+
+    return cbor2.dumps, cbor_loads, _cbor_array_head
+
+
+def _load_msgpack():
+    # MessagePack is used only when it is installed
+    try:
+        import msgpack
+    except ImportError:
+        return None
+
+    def msgpack_loads(data):
+        try:
+            value = msgpack.unpackb(data)
+        except Exception as error:
+            # The errors of msgpack do not all derive from ValueError
+            raise ValueError("Invalid MessagePack data: %s" % error)
+
+        return check_json_value(value)
+
+    return msgpack.packb, msgpack_loads, _msgpack_array_head
+
+
+# Table of the supported media types, built by media_types
+_media_types = None
+
+
+def media_types():
+    """
+    Get the supported media types with their encoding function, decoding \
+    function and function encoding the head of an array (None for json), by \
+    order of preference when the client accepts several of them with the same \
+    quality. The table is built on the first call, so that the optional \
+    encoders are not imported when the program starts.
+
+    :returns: dict -- The functions of the media types, by media type
+    """
+    global _media_types
+
+    if _media_types is None:
+        table = {JSON_MIME_TYPE: (json_dumps, json_loads, None)}
+        for media_type, load in ((CBOR_MIME_TYPE, _load_cbor), (MSGPACK_MIME_TYPE, _load_msgpack)):
+            functions = load()
+            if functions is not None:
+                table[media_type] = functions
+        _media_types = table
+
+    return _media_types
+
+
+def media_type_of(content_type):
+    """
+    Get the supported media type of a request body
+
+    :param content_type: Content type of the body, without its parameters
+    :type content_type: str
+    :returns: str -- The media type, JSON_MIME_TYPE when it is not supported
+    """
+    content_type = MEDIA_TYPE_ALIASES.get(content_type, content_type)
+
+    return content_type if content_type in media_types() else JSON_MIME_TYPE
+
+
+@lru_cache(maxsize=256)
+def negotiate_media_type(accept):
+    """
+    Choose the media type of an answer from the Accept header of the request. \
+    Json is chosen when the client accepts none of the supported media types. \
+    The clients send the same header values again and again, so the results \
+    are cached.
+
+    :param accept: Value of the Accept header (None when there is none)
+    :type accept: str
+    :returns: str -- The best supported media type
+    """
+    if not accept:
+        return JSON_MIME_TYPE
+
+    qualities = {}
+    for item in accept.lower().split(","):
+        media_range, *params = item.split(";")
+        media_range = media_range.strip()
+        quality = 1.0
+        for param in params:
+            param = param.strip()
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        qualities[MEDIA_TYPE_ALIASES.get(media_range, media_range)] = quality
+
+    best_media_type = JSON_MIME_TYPE
+    best_quality = 0.0
+    for media_type in media_types():
+        quality = qualities.get(media_type, qualities.get("application/*", qualities.get("*/*", 0.0)))
+        if quality > best_quality:
+            best_media_type = media_type
+            best_quality = quality
+
+    return best_media_type
+
+
+def request_media_type(request):
+    """
+    Get the media type of the answer to a request, from its Accept header
+
+    :param request: The request
+    :type request: aiohttp.web.Request
+    :returns: str -- The media type
+    """
+    return negotiate_media_type(request.headers.get(hdrs.ACCEPT))
+
+
+def encode_body(obj, media_type):
+    """
+    Encode a value in a supported media type
+
+    :param obj: Value to encode
+    :param media_type: Media type (one of media_types())
+    :type media_type: str
+    :returns: bytes -- The encoded value
+    """
+    return media_types()[media_type][0](obj)
+
+
+def decode_body(data, media_type):
+    """
+    Decode a body encoded in a supported media type
+
+    :param data: The body
+    :type data: bytes
+    :param media_type: Media type of the body (one of media_types())
+    :type media_type: str
+    :returns: The decoded value
+    :raises ValueError: When the body is not valid
+    """
+    return media_types()[media_type][1](data)
+
+
+async def read_body(request):
+    """
+    Coroutine reading and decoding the body of a request, in the media type \
+    given by its Content-Type header (json when it is not supported)
+
+    :param request: The request
+    :type request: aiohttp.web.Request
+    :returns: The decoded value
+    :raises ValueError: When the body is not valid
+    """
+    return decode_body(await request.read(), media_type_of(request.content_type))
+
+
+def array_framing(media_type, length):
+    """
+    Get the bytes to write around and between encoded items to build an array
+
+    :param media_type: Media type of the items (one of media_types())
+    :type media_type: str
+    :param length: Number of items of the array
+    :type length: int
+    :returns: tuple -- (start of the array, separator of the items, end of \
+    the array)
+    """
+    array_head = media_types()[media_type][2]
+    if array_head is None:
+        return b"[", b",", b"]"
+
+    return array_head(length), b"", b""
+
+
+def negotiated_response(request, data, status=200, headers=None):
+    """
+    Create the HTTP response of an answer, in the media type accepted by the \
+    request
+
+    :param request: The request to answer
+    :type request: aiohttp.web.Request
+    :param data: Value to send
+    :param status: HTTP status of the response
+    :type status: int
+    :param headers: Additional headers
+    :type headers: dict
+    :returns:  aiohttp.web.Response -- Response class used to send HTTP \
+    response by aiohttp
+    """
+    media_type = request_media_type(request)
+    response = web.Response(body=encode_body(data, media_type), status=status, headers=headers,
+                            content_type=media_type)
+    response.headers[hdrs.VARY] = hdrs.ACCEPT
+
+    return response
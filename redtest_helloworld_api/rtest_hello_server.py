@@ -0,0 +1,354 @@
+"""
+File containing the functions used to serve the Redtest Helloworld API, \
+either in the current process or in several worker processes sharing the \
+same port, on TCP, on Unix domain sockets or on the sockets passed by \
+systemd.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import web
+import asyncio
+import logging
+import os
+import signal
+import time
+import traceback
+
+# Import constants
+from redtest_helloworld_api.rtest_hello_shared_constants import DEFAULT_PORT, WORKER_RESTART_DELAY
+from redtest_helloworld_api.rtest_hello_access_log import QueueAccessLogger
+from redtest_helloworld_api.rtest_hello_api_main import ACCESS_LOG_KEY, STATE_KEY, main_init_app
+from redtest_helloworld_api.rtest_hello_settings import get_setting, setting_is_set
+from redtest_helloworld_api.rtest_hello_loop import LimitedSite, new_event_loop
+from redtest_helloworld_api.rtest_hello_systemd import (WorkerNotifications, listen_backlog, listen_sockets,
+                                                       sd_notify, unix_listen_socket, watchdog_interval)
+
+logger = logging.getLogger(__name__)
+
+# Signals stopping the workers, forwarded by the supervisor
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+async def start_RTest_hello_API(app, host, port, reuse_port=False, sockets=(), tcp=True):
+    """
+    Coroutine starting the HTTP server of the application.
+
+    :param app: The application returned by main_init_app
+    :type app: aiohttp.web.Application
+    :param host: Host to bind (all the interfaces if None)
+    :type host: str
+    :param port: TCP port to bind
+    :type port: int
+    :param reuse_port: Set SO_REUSEPORT on the listening socket, so that \
+    several processes can bind the same port
+    :type reuse_port: bool
+    :param sockets: Listening sockets already opened to serve too (Unix \
+    domain sockets, sockets passed by systemd)
+    :type sockets: list
+    :param tcp: Bind host:port (else only the given sockets are served)
+    :type tcp: bool
+    :returns: aiohttp.web.AppRunner -- The runner to clean up at the end
+    """
+    # The signals are handled by main_init_app (stop_handler1/stop_handler2).
+    # When the runner is cleaned up, it stops accepting connections and lets
+    # the requests in flight end for at most the drain timeout.
+    runner_args = {}
+    access_log_writer = app.get(ACCESS_LOG_KEY)
+    if access_log_writer is not None:
+        # Write the access log in batches, out of the event loop
+        runner_args["access_log_class"] = QueueAccessLogger
+        runner_args["access_log"] = access_log_writer
+    runner = web.AppRunner(app, handle_signals=False,
+                           shutdown_timeout=get_setting("SHUTDOWN_DRAIN_TIMEOUT"),
+                           keepalive_timeout=get_setting("KEEPALIVE_TIMEOUT"),
+                           **runner_args)
+    await runner.setup()
+
+    # The given sockets keep their backlog (the Backlog= of the socket unit
+    # for the sockets passed by systemd), unless the setting is set
+    max_connections = get_setting("MAX_CONNECTIONS")
+    backlog = get_setting("LISTEN_BACKLOG")
+    sites = [LimitedSite(runner, max_connections, sock=sock,
+                         backlog=backlog if setting_is_set("LISTEN_BACKLOG") else listen_backlog(sock, backlog))
+             for sock in sockets]
+    if tcp:
+        sites.append(LimitedSite(runner, max_connections, host=host, port=port, reuse_port=reuse_port,
+                                 backlog=backlog))
+
+    for site in sites:
+        await site.start()
+        logger.info("Process %d serving on %s", os.getpid(), site.name)
+
+    # Tell systemd that the API is ready (Type=notify)
+    sd_notify("READY=1")
+
+    return runner
+
+
+async def drain_RTest_hello_API(runner):
+    """
+    Coroutine draining the server: it stops accepting connections, waits for \
+    the end of the requests in flight (at most the drain timeout), then \
+    cancels the remaining ones and cleans up the application.
+
+    :param runner: The runner returned by start_RTest_hello_API
+    :type runner: aiohttp.web.AppRunner
+    """
+    server = runner.server
+    connections = len(server.connections) if server is not None else 0
+    start = time.monotonic()
+
+    await runner.cleanup()
+
+    # The shutdown time is counted from the stop request when there is one
+    stop_requested_at = runner.app[STATE_KEY].stop_requested_at
+    if stop_requested_at is None:
+        stop_requested_at = start
+    logger.info("Process %d stopped in %.1f ms (%d connections drained in %.1f ms)",
+                os.getpid(), (time.monotonic() - stop_requested_at) * 1000,
+                connections, (time.monotonic() - start) * 1000)
+
+
+def _cancel_remaining_tasks(loop):
+    """
+    Cancel the tasks still pending once the server is cleaned up and wait \
+    for their end.
+
+    :param loop: Event loop running the tasks
+    :type loop: asyncio.AbstractEventLoop
+    """
+    tasks = [task for task in asyncio.all_tasks(loop) if not task.done()]
+    for task in tasks:
+        task.cancel()
+
+    if tasks:
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+
+def run_RTest_hello_API(host=None, port=DEFAULT_PORT, reuse_port=False, sockets=(), tcp=True,
+                        startup_report=None):
+    """
+    Run the API in the current process until it is stopped by a signal.
+
+    The application is created in the event loop used to serve it (uvloop or \
+    asyncio, see the EVENT_LOOP setting), so that the signal handlers \
+    installed by main_init_app run the usual stop_handler1/stop_handler2 \
+    shutdown.
+
+    :param host: Host to bind (all the interfaces if None)
+    :type host: str
+    :param port: TCP port to bind
+    :type port: int
+    :param reuse_port: Set SO_REUSEPORT on the listening socket
+    :type reuse_port: bool
+    :param sockets: Listening sockets already opened to serve too
+    :type sockets: list
+    :param tcp: Bind host:port (else only the given sockets are served)
+    :type tcp: bool
+    :param startup_report: When given, the durations of the startup steps \
+    are recorded in it and printed once the sockets are bound, then the API \
+    stops
+    :type startup_report: StartupReport
+    """
+    loop = new_event_loop(get_setting("EVENT_LOOP"), get_setting("SLOW_CALLBACK_DURATION"))
+    asyncio.set_event_loop(loop)
+
+    redtest_hello_app = main_init_app()
+    if redtest_hello_app is None:
+        loop.close()
+        return
+    if startup_report is not None:
+        startup_report.mark("app build")
+
+    runner = None
+    try:
+        runner = loop.run_until_complete(
+            start_RTest_hello_API(redtest_hello_app, host, port, reuse_port, sockets, tcp))
+        if startup_report is not None:
+            startup_report.mark("bind")
+            print("\n".join(startup_report.lines()), flush=True)
+        else:
+            loop.run_forever()
+    except (web.GracefulExit, KeyboardInterrupt):
+        pass
+    finally:
+        if runner is not None:
+            loop.run_until_complete(drain_RTest_hello_API(runner))
+        _cancel_remaining_tasks(loop)
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def _spawn_worker(worker_main, notifications):
+    """
+    Fork a worker process running worker_main.
+
+    :param worker_main: Function run by the worker process
+    :type worker_main: callable
+    :param notifications: Relay of the notifications of the workers to systemd
+    :type notifications: WorkerNotifications
+    :returns: int -- PID of the worker process
+    """
+    pipe = os.pipe()
+    pid = os.fork()
+    if pid != 0:
+        notifications.add_worker(pid, pipe)
+        return pid
+
+    # In the worker: restore the default signal handlers, the event loop of
+    # the worker installs its own ones
+    exit_code = 0
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        # The stop signals blocked by the supervisor during the fork are
+        # delivered now, with the default handlers
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+        # The notifications to systemd go through the supervisor
+        notifications.start_worker(pipe)
+        worker_main()
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        logging.shutdown()
+        os._exit(exit_code)
+
+
+def supervise_workers(workers, worker_main, restart_delay=WORKER_RESTART_DELAY):
+    """
+    Fork the worker processes, restart the ones that die and forward \
+    SIGTERM/SIGINT to them. Returns once all the workers are stopped.
+
+    The supervisor alone notifies systemd: it is ready once all the workers \
+    are, and it pings the watchdog while all the workers ping it. A worker \
+    missing its pings is killed and restarted.
+
+    :param workers: Number of worker processes
+    :type workers: int
+    :param worker_main: Function run by each worker process
+    :type worker_main: callable
+    :param restart_delay: Delay (in seconds) before restarting a dead worker
+    :type restart_delay: float
+    """
+    # Workers running, associated to their slot number
+    children = {}
+    stopping = False
+    notifications = WorkerNotifications(workers, watchdog_interval())
+
+    def forward_signal(signum, frame):
+        nonlocal stopping
+        if not stopping:
+            sd_notify("STOPPING=1")
+        stopping = True
+        for child_pid in list(children):
+            try:
+                os.kill(child_pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def start_worker(slot):
+        # The stop signals wait until the worker is registered, so that they
+        # are forwarded to it too
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        try:
+            children[_spawn_worker(worker_main, notifications)] = slot
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+
+    signal.signal(signal.SIGTERM, forward_signal)
+    signal.signal(signal.SIGINT, forward_signal)
+
+    for slot in range(workers):
+        start_worker(slot)
+
+    while children:
+        # Relay the notifications of the workers until one of them exits
+        pid = notifications.wait()
+        if pid is None:
+            if not stopping:
+                notifications.ping()
+            continue
+
+        try:
+            pid, status = os.waitpid(pid, 0)
+        except ChildProcessError:
+            status = 0
+        notifications.remove_worker(pid)
+
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+
+        logger.warning("Worker %d (pid %d) exited with status %d, restarting it",
+                       slot, pid, status)
+        time.sleep(restart_delay)
+        if not stopping:
+            start_worker(slot)
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+
+def run_RTest_hello_API_workers(workers, host=None, port=DEFAULT_PORT, unix_path=None, tcp=True,
+                                startup_report=None):
+    """
+    Run the API, in the current process when a single worker is asked, or \
+    in several forked workers sharing the port with SO_REUSEPORT.
+
+    When systemd passes listening sockets (socket activation), they are \
+    served instead of binding host:port, so the connections arriving while \
+    the API restarts wait in the kernel queue. The sockets opened here are \
+    shared by all the workers.
+
+    :param workers: Number of worker processes
+    :type workers: int
+    :param host: Host to bind (all the interfaces if None)
+    :type host: str
+    :param port: TCP port to bind
+    :type port: int
+    :param unix_path: Path of a Unix domain socket to listen on too (None \
+    for no Unix domain socket)
+    :type unix_path: str
+    :param tcp: Bind host:port when systemd does not pass sockets
+    :type tcp: bool
+    :param startup_report: When given, the API runs in the current process, \
+    prints the durations of its startup steps and stops
+    :type startup_report: StartupReport
+    """
+    sockets = listen_sockets()
+    if sockets:
+        logger.info("Using %d sockets passed by systemd", len(sockets))
+        tcp = False
+    if unix_path is not None:
+        sockets.append(unix_listen_socket(unix_path, backlog=get_setting("LISTEN_BACKLOG")))
+
+    if workers <= 1 or startup_report is not None:
+        run_RTest_hello_API(host, port, sockets=sockets, tcp=tcp, startup_report=startup_report)
+        return
+
+    logger.info("Supervisor %d starting %d workers", os.getpid(), workers)
+    supervise_workers(workers,
+                      lambda: run_RTest_hello_API(host, port, reuse_port=True,
+                                                  sockets=sockets, tcp=tcp))
@@ -0,0 +1,77 @@
+"""
+File containing the functions reading the settings of the API.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+import os
+
+# Import constants
+from redtest_helloworld_api import rtest_hello_shared_constants
+from redtest_helloworld_api.rtest_hello_shared_constants import SETTINGS_ENV_PREFIX
+
+# Strings accepted as true for the boolean settings
+TRUE_STRINGS = ("1", "true", "yes", "on")
+
+
+def get_setting(name):
+    """
+    Get the value of a setting: the default value is the constant of the \
+    same name in rtest_hello_shared_constants, it can be overridden by the \
+    environment variable SETTINGS_ENV_PREFIX + name.
+
+    The value of the environment variable is converted to the type of the \
+    default value (a comma separated list for the tuple and list settings).
+
+    :param name: Name of the setting (for instance "BATCH_MAX_ITEMS")
+    :type name: str
+    :returns: The value of the setting
+    """
+    default = getattr(rtest_hello_shared_constants, name)
+    env_value = os.environ.get(SETTINGS_ENV_PREFIX + name)
+
+    if env_value is None:
+        return default
+    if isinstance(default, bool):
+        return env_value.strip().lower() in TRUE_STRINGS
+    if isinstance(default, (tuple, list)):
+        item_type = type(default[0]) if default else str
+        return type(default)(item_type(item.strip()) for item in env_value.split(",") if item.strip())
+    if default is None:
+        return env_value
+
+    try:
+        return type(default)(env_value)
+    except ValueError:
+        raise ValueError("Invalid value %r for the setting %s%s"
+                         % (env_value, SETTINGS_ENV_PREFIX, name))
+
+
+def setting_is_set(name):
+    """
+    Tell whether a setting is overridden by its environment variable.
+
+    :param name: Name of the setting (for instance "LISTEN_BACKLOG")
+    :type name: str
+    :returns: bool -- True if the environment variable of the setting is set
+    """
+    return SETTINGS_ENV_PREFIX + name in os.environ
@@ -27,9 +27,159 @@ VERSION = 'v1'
 
 HELLO_MSG = "Hello, I'm an API example to test the RedTests on RedPesk"
 GOODBYE_MSG = "Goodbye my friend"
+# Messages sent to the clients giving their name ({name} is replaced by it)
+HELLO_NAME_MSG = "Hello {name}, I'm an API example to test the RedTests on RedPesk"
+GOODBYE_NAME_MSG = "Goodbye {name}"
 
 # Dictionnary keys
 JSON_VERSION_KEY = "version"
 JSON_VERBS_LIST_KEY = "verbs_list"
 JSON_VERB_KEY = "verb"
 JSON_MSG_KEY = "message"
+JSON_METHOD_KEY = "method"
+JSON_BODY_KEY = "body"
+JSON_STATUS_KEY = "status"
+JSON_RESULT_KEY = "result"
+JSON_ERROR_KEY = "error"
+JSON_ID_KEY = "id"
+JSON_NAME_KEY = "name"
+JSON_NAMES_KEY = "names"
+
+# Default TCP port of the API
+DEFAULT_PORT = 8080
+# Delay (in seconds) before restarting a dead worker process
+WORKER_RESTART_DELAY = 1
+
+# Prefix of the environment variables overriding the settings below
+# (for instance RTEST_HELLO_BATCH_MAX_ITEMS=64)
+SETTINGS_ENV_PREFIX = "RTEST_HELLO_"
+
+# Maximum number of verb calls in a batch request
+BATCH_MAX_ITEMS = 32
+# Maximum number of verb calls of a batch request run at the same time
+BATCH_MAX_CONCURRENCY = 8
+
+# Maximum number of verb calls running at the same time on a websocket
+WS_MAX_PENDING_CALLS = 64
+# Interval (in seconds) of the websocket ping frames
+WS_HEARTBEAT = 30.0
+
+# Record the metrics of the verbs (exposed by the /metrics verb)
+METRICS_ENABLED = True
+# Upper bounds (in seconds) of the buckets of the verbs latency histograms
+METRICS_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Maximum time (in seconds) given to the requests in flight to end when the
+# API is stopped, the remaining ones are cancelled
+SHUTDOWN_DRAIN_TIMEOUT = 10.0
+
+# Json encoder used for all the answers: "orjson", "json" (python standard
+# library) or "auto" (orjson when it is installed, else json)
+JSON_ENCODER = "auto"
+
+# Time (in seconds) the clients can use a static answer without revalidating
+# it with its ETag (0: revalidate each time)
+CACHE_MAX_AGE = 0
+
+# Compress the answers according to the Accept-Encoding header of the requests
+COMPRESSION_ENABLED = True
+# Minimum size (in bytes) of the dynamic answers to compress (the static ones
+# are compressed once, when they are cached)
+COMPRESSION_MIN_SIZE = 1024
+
+# Reject the requests with 503 when the API is overloaded
+ADMISSION_ENABLED = True
+# Interval (in seconds) of the event loop lag measures
+ADMISSION_LAG_SAMPLE_INTERVAL = 0.1
+# Event loop lag (in seconds) above which the requests are rejected
+ADMISSION_MAX_LOOP_LAG = 0.5
+# Number of requests in flight above which the requests are rejected
+ADMISSION_MAX_IN_FLIGHT = 1000
+# Requests per second allowed per client (0: no rate limit) and burst size.
+# A client is an address, or a peer process on the Unix domain socket.
+ADMISSION_RATE_LIMIT = 0.0
+ADMISSION_RATE_BURST = 20
+# Maximum number of clients whose rate is tracked at the same time
+ADMISSION_MAX_CLIENTS = 10000
+# Value (in seconds) of the Retry-After header of the rejected requests
+ADMISSION_RETRY_AFTER = 1
+# Verbs never rejected (cheap ones, needed to observe the API, and the
+# event stream, whose connections are long-lived and limited by
+# SSE_MAX_STREAMS)
+ADMISSION_EXEMPT_VERBS = ("/version", "/metrics", "/healthz", "/readyz",
+                          "/api/" + VERSION + "/hello/stream")
+
+# Token to give (Authorization: Bearer <token>) to use the debug verbs, the
+# debug verbs are disabled when it is empty
+DEBUG_TOKEN = ""
+# Maximum duration (in seconds) of a CPU profile
+DEBUG_PROFILE_MAX_SECONDS = 60.0
+# Interval (in seconds) between two stack samples of the sampling profiler
+DEBUG_PROFILE_SAMPLE_INTERVAL = 0.005
+# Number of functions listed in the text reports of the profiler
+DEBUG_PROFILE_TOP = 50
+# Number of frames recorded per allocation by tracemalloc
+DEBUG_TRACEMALLOC_FRAMES = 1
+# Maximum number of memory snapshots kept (the oldest ones are dropped)
+DEBUG_MEMORY_MAX_SNAPSHOTS = 8
+# Number of allocation sites listed by default in the snapshot differences
+DEBUG_MEMORY_TOP = 20
+
+# Path of the access log written in batches by a background thread (empty:
+# the default aiohttp access logger is used)
+ACCESS_LOG_PATH = ""
+# Format of the access log lines: "text" (combined log format) or "json"
+ACCESS_LOG_FORMAT = "text"
+# Size (in bytes) above which the access log is rotated, and number of
+# rotated files kept
+ACCESS_LOG_MAX_BYTES = 10 * 1024 * 1024
+ACCESS_LOG_BACKUP_COUNT = 5
+# Number of records waiting to be written above which the records are
+# dropped, and maximum number of records written at once
+ACCESS_LOG_QUEUE_SIZE = 10000
+ACCESS_LOG_BATCH_SIZE = 256
+
+# Maximum number of names greeted by a single request
+GREETING_MAX_NAMES = 100000
+# Number of names greeted at once: the bigger lists are greeted chunk by
+# chunk in the worker processes, and streamed
+GREETING_CHUNK_NAMES = 1000
+# Number of worker processes greeting the big lists of names (0: the names
+# are greeted in the event loop)
+GREETING_POOL_WORKERS = 2
+
+# Interval (in seconds) between two events of the event streams: default
+# value, and bounds of the value chosen by the clients
+SSE_DEFAULT_INTERVAL = 1.0
+SSE_MIN_INTERVAL = 0.1
+SSE_MAX_INTERVAL = 3600.0
+# Interval (in seconds) of the heartbeat comments sent when there is no event
+SSE_HEARTBEAT = 15.0
+# Size (in bytes) of the data waiting to be sent to a client above which its
+# events are dropped (a slow client gets the next one instead)
+SSE_MAX_BUFFER = 65536
+# Maximum number of event streams open at the same time
+SSE_MAX_STREAMS = 10000
+
+# Event loop implementation: "auto" (uvloop when it is installed, else
+# asyncio), "uvloop" or "asyncio"
+EVENT_LOOP = "auto"
+# Length of the queue of the connections not yet accepted
+LISTEN_BACKLOG = 128
+# Time (in seconds) an idle keep-alive connection is kept open
+KEEPALIVE_TIMEOUT = 75.0
+# Maximum number of connections open at the same time per process, the next
+# ones get a 503 answer (0: no limit)
+MAX_CONNECTIONS = 0
+# Duration (in seconds) above which a callback of the event loop is logged
+# as slow (0: disabled, a positive value enables the asyncio debug mode)
+SLOW_CALLBACK_DURATION = 0.0
+
+# Maximum number of answers stored by the cache of the verb handlers that opt
+# in (0: no cache and no coalescing of the identical requests)
+VERB_CACHE_MAX_ENTRIES = 1024
+# Default time (in seconds) an answer is served from the verb cache
+VERB_CACHE_TTL = 1.0
+# Size (in bytes) of the biggest answer stored and of the biggest request
+# body cached (the bigger requests bypass the cache)
+VERB_CACHE_MAX_BODY = 65536
@@ -0,0 +1,222 @@
+"""
+File containing the Server-Sent Events streams pushing messages to the clients.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import hdrs, web
+import asyncio
+
+# Content type of the event streams
+EVENT_STREAM_CONTENT_TYPE = "text/event-stream"
+# Comment sent when there is no event for a while, so that the proxies and the
+# clients do not close the connection
+HEARTBEAT_COMMENT = b": heartbeat\n\n"
+# Event sent to the clients before closing the streams at shutdown
+CLOSE_EVENT = b"event: close\ndata: {}\n\n"
+# Maximum time (in seconds) given to the streams to send their close event at
+# shutdown
+CLOSE_TIMEOUT = 1.0
+
+# Key of the event streams currently open on an application (stored on the
+# application by main_init_app)
+OPEN_EVENT_STREAMS_KEY = web.AppKey("open_event_streams", set)
+
+
+def _wake_up(waiter):
+    # Timer callback of EventStream._wait
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def encode_event(event_id, event, data):
+    """
+    Encode a Server-Sent Event
+
+    :param event_id: Identifier of the event (the clients send the last one \
+    in Last-Event-ID when they reconnect)
+    :type event_id: int
+    :param event: Type of the event
+    :type event: str
+    :param data: Data of the event, on a single line
+    :type data: bytes
+    :returns: bytes -- The encoded event
+    """
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event.encode(), data)
+
+
+class EventStream:
+    """
+    Server-Sent Events stream sending the same event at a fixed interval, \
+    with heartbeat comments when the interval is longer than the heartbeat \
+    one.
+
+    The events are never buffered without limit: when the data not yet sent \
+    to a slow client is above a maximum size, its event is dropped, the \
+    client getting the next one (the identifiers of the events show the gap).
+    """
+
+    def __init__(self, request, event, data, interval, heartbeat, max_buffer):
+        """
+        :param request: The HTTP request opening the stream
+        :type request: aiohttp.web.Request
+        :param event: Type of the events
+        :type event: str
+        :param data: Data of the events, on a single line
+        :type data: bytes
+        :param interval: Interval (in seconds) between two events
+        :type interval: float
+        :param heartbeat: Interval (in seconds) of the heartbeat comments
+        :type heartbeat: float
+        :param max_buffer: Size (in bytes) of the data waiting to be sent \
+        above which the events are dropped
+        :type max_buffer: int
+        """
+        self.request = request
+        self.event = event
+        self.data = data
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.max_buffer = max_buffer
+        self.response = web.StreamResponse(headers={
+                                                    hdrs.CONTENT_TYPE: EVENT_STREAM_CONTENT_TYPE,
+                                                    hdrs.CACHE_CONTROL: "no-cache",
+                                                    "X-Accel-Buffering": "no"
+                                                   })
+        # Number of events sent and dropped
+        self.sent = 0
+        self.dropped = 0
+        self._closing = False
+        # Future of the current wait (see _wait) and future done once the
+        # stream has ended
+        self._waiter = None
+        self.ended = None
+
+    def _can_send(self):
+        """
+        Check if the client reads the stream fast enough to get more data
+
+        :returns: bool -- False if the data waiting to be sent is too big
+        """
+        transport = self.request.transport
+        if transport is None or transport.is_closing():
+            raise ConnectionResetError("The client closed the stream")
+
+        return transport.get_write_buffer_size() <= self.max_buffer
+
+    async def _wait(self, delay):
+        """
+        Coroutine waiting for a given time, or for the stream to be closed. \
+        It only needs a future and a timer, no task: the streams can be many.
+
+        :param delay: Time to wait (in seconds)
+        :type delay: float
+        """
+        loop = asyncio.get_running_loop()
+        self._waiter = loop.create_future()
+        timer = loop.call_later(max(delay, 0), _wake_up, self._waiter)
+        try:
+            await self._waiter
+        finally:
+            timer.cancel()
+            self._waiter = None
+
+    async def serve(self):
+        """
+        Coroutine sending the events until the client leaves or the stream \
+        is closed
+
+        :returns: aiohttp.web.StreamResponse -- The ended stream
+        """
+        await self.response.prepare(self.request)
+
+        loop = asyncio.get_running_loop()
+        self.ended = loop.create_future()
+        open_event_streams = self.request.app[OPEN_EVENT_STREAMS_KEY]
+        open_event_streams.add(self)
+        try:
+            # The clients reconnect after the interval when the stream ends
+            await self.response.write(b"retry: %d\n\n" % int(self.interval * 1000))
+            next_event = loop.time()
+            last_write = next_event
+            last_event_id = self.request.headers.get("Last-Event-ID", "")
+            event_id = int(last_event_id) if last_event_id.isdigit() else 0
+            while not self._closing:
+                now = loop.time()
+                if now >= next_event:
+                    event_id += 1
+                    next_event += self.interval
+                    if next_event < now:
+                        # Coalesce the events missed while the loop was late
+                        next_event = now + self.interval
+                    if self._can_send():
+                        await self.response.write(encode_event(event_id, self.event, self.data))
+                        self.sent += 1
+                        last_write = now
+                    else:
+                        self.dropped += 1
+                elif now - last_write >= self.heartbeat:
+                    if self._can_send():
+                        await self.response.write(HEARTBEAT_COMMENT)
+                    last_write = now
+
+                await self._wait(min(next_event, last_write + self.heartbeat) - loop.time())
+
+            await self.response.write(CLOSE_EVENT)
+            await self.response.write_eof()
+        except ConnectionResetError:
+            # The client left
+            pass
+        finally:
+            open_event_streams.discard(self)
+            self.ended.set_result(None)
+
+        return self.response
+
+    def close(self):
+        """
+        Ask the stream to send its last event and to end
+        """
+        self._closing = True
+        if self._waiter is not None:
+            _wake_up(self._waiter)
+
+
+async def close_event_streams(app, timeout=CLOSE_TIMEOUT):
+    """
+    Close all the event streams open on an application: each one sends a \
+    close event to its client and ends. Returns once they have all ended, \
+    or after the timeout (a client not reading its stream cannot delay the \
+    shutdown further).
+
+    :param app: The application
+    :type app: aiohttp.web.Application
+    :param timeout: Maximum time (in seconds) to wait for the streams
+    :type timeout: float
+    """
+    streams = list(app[OPEN_EVENT_STREAMS_KEY])
+    for stream in streams:
+        stream.close()
+
+    if streams:
+        await asyncio.wait([stream.ended for stream in streams], timeout=timeout)
@@ -0,0 +1,94 @@
+"""
+File containing the measure of the startup of the daemon, from the start of \
+its process to the binding of its sockets.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+import os
+import time
+
+
+def process_age():
+    """
+    Get the time elapsed since the start of the current process, from \
+    /proc/self/stat (with the resolution of the clock ticks)
+
+    :returns: float -- The time in seconds, None if it is unknown
+    """
+    try:
+        with open("/proc/self/stat") as stat:
+            # The fields following the command name, which may contain spaces
+            fields = stat.read().rpartition(")")[2].split()
+        with open("/proc/uptime") as uptime:
+            uptime_seconds = float(uptime.read().split()[0])
+        start_seconds = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+    return max(0.0, uptime_seconds - start_seconds)
+
+
+class StartupReport:
+    """
+    Durations of the steps of the startup of the daemon: interpreter \
+    startup, imports, application build and binding of the sockets
+    """
+
+    def __init__(self, script_start):
+        """
+        Record the interpreter startup and the imports, once the daemon \
+        script has imported its modules
+
+        :param script_start: Time (time.perf_counter) at which the daemon \
+        script started, before its imports
+        :type script_start: float
+        """
+        now = time.perf_counter()
+        self.steps = []
+        age = process_age()
+        if age is not None:
+            self.steps.append(("interpreter", max(0.0, age - (now - script_start))))
+        self.steps.append(("imports", now - script_start))
+        self._last = now
+
+    def mark(self, step):
+        """
+        Record the end of a startup step
+
+        :param step: Name of the step
+        :type step: str
+        """
+        now = time.perf_counter()
+        self.steps.append((step, now - self._last))
+        self._last = now
+
+    def lines(self):
+        """
+        Get the report, one line per step followed by the total
+
+        :returns: list -- The lines of the report
+        """
+        lines = ["%-12s %8.1f ms" % (step, duration * 1000) for step, duration in self.steps]
+        lines.append("%-12s %8.1f ms" % ("total", sum(duration for _, duration in self.steps) * 1000))
+
+        return lines
@@ -0,0 +1,351 @@
+"""
+File containing the integration with systemd: socket activation, readiness \
+and watchdog notifications.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+import asyncio
+import logging
+import os
+import select
+import signal
+import socket
+import stat
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+# First file descriptor passed by systemd (see sd_listen_fds(3))
+SD_LISTEN_FDS_START = 3
+# Length and layout of the beginning of struct tcp_info (see tcp(7)), up to
+# tcpi_sacked which holds the backlog of a listening socket
+TCP_INFO_LENGTH = 32
+TCP_INFO_FORMAT = "8B6I"
+# Separator of the notifications relayed by a worker process to its supervisor
+NOTIFICATION_END = b"\0"
+
+# Write end of the pipe relaying the notifications of a worker process to its
+# supervisor, which alone talks to systemd (None out of the worker processes)
+notify_pipe = None
+
+
+def listen_sockets(unset_environment=True):
+    """
+    Get the listening sockets passed by systemd with socket activation \
+    (LISTEN_FDS/LISTEN_PID environment variables, see sd_listen_fds(3)).
+
+    :param unset_environment: Remove the variables from the environment, so \
+    that they are not passed to the child processes
+    :type unset_environment: bool
+    :returns: list -- The sockets passed by systemd (empty without socket \
+    activation)
+    """
+    listen_pid = os.environ.get("LISTEN_PID")
+    listen_fds = os.environ.get("LISTEN_FDS")
+
+    if unset_environment:
+        for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+            os.environ.pop(name, None)
+
+    if not listen_fds or (listen_pid and int(listen_pid) != os.getpid()):
+        return []
+
+    return [socket.socket(fileno=fd)
+            for fd in range(SD_LISTEN_FDS_START, SD_LISTEN_FDS_START + int(listen_fds))]
+
+
+def listen_backlog(sock, default):
+    """
+    Get the length of the queue of the pending connections of a listening \
+    socket, for instance the Backlog= of the socket unit for a socket passed \
+    by systemd. The event loop listens again on the sockets it serves, with \
+    the backlog given to it.
+
+    :param sock: The listening socket
+    :type sock: socket.socket
+    :param default: Backlog returned when it cannot be read (non TCP sockets)
+    :type default: int
+    :returns: int -- The backlog of the socket
+    """
+    if sock.family not in (socket.AF_INET, socket.AF_INET6) or not hasattr(socket, "TCP_INFO"):
+        return default
+
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_LENGTH)
+        return struct.unpack_from(TCP_INFO_FORMAT, info)[-1] or default
+    except (OSError, struct.error):
+        return default
+
+
+def unix_listen_socket(path, mode=0o660, backlog=128):
+    """
+    Create a listening Unix domain socket, replacing the stale socket file \
+    left by a previous run if any
+
+    :param path: Path of the socket file
+    :type path: str
+    :param mode: Permissions of the socket file
+    :type mode: int
+    :param backlog: Length of the queue of the pending connections
+    :type backlog: int
+    :returns: socket.socket -- The listening socket
+    """
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, mode)
+    sock.listen(backlog)
+
+    return sock
+
+
+def sd_notify(state):
+    """
+    Send a state notification to systemd (READY=1, WATCHDOG=1, STOPPING=1, \
+    ...) on the NOTIFY_SOCKET datagram socket, see sd_notify(3)
+
+    :param state: The notification, lines "VARIABLE=value"
+    :type state: str
+    :returns: bool -- True if the notification was sent, False when the \
+    process is not run by systemd with Type=notify or when sending failed
+    """
+    if notify_pipe is not None:
+        # In a worker process: the supervisor relays the notification
+        try:
+            os.write(notify_pipe, state.encode() + NOTIFICATION_END)
+        except OSError:
+            return False
+        return True
+
+    address = os.environ.get("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address[0] == "@":
+        # Abstract namespace socket
+        address = "\0" + address[1:]
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as sock:
+            sock.connect(address)
+            sock.sendall(state.encode())
+    except OSError:
+        return False
+
+    return True
+
+
+def watchdog_interval():
+    """
+    Get the interval of the watchdog pings asked by systemd (WATCHDOG_USEC \
+    and WATCHDOG_PID environment variables, see sd_watchdog_enabled(3)). The \
+    pings are sent twice per watchdog period. The pings of a worker process \
+    go to its supervisor, which pings systemd while all its workers do.
+
+    :returns: float -- Interval (in seconds) between two pings, None if the \
+    watchdog is disabled
+    """
+    watchdog_usec = os.environ.get("WATCHDOG_USEC")
+    watchdog_pid = os.environ.get("WATCHDOG_PID")
+    if not watchdog_usec or not watchdog_usec.isdigit() or int(watchdog_usec) == 0:
+        return None
+    # The watchdog is the one of the supervisor in a worker process
+    main_pid = os.getpid() if notify_pipe is None else os.getppid()
+    if watchdog_pid and int(watchdog_pid) != main_pid:
+        return None
+
+    return int(watchdog_usec) / 2000000
+
+
+async def watchdog_pings(interval):
+    """
+    Coroutine sending the watchdog pings to systemd while the event loop is \
+    responsive (run as a background task). No ping is sent when the loop \
+    wakes up more than an interval late, so systemd restarts a daemon whose \
+    loop is blocked or keeps lagging.
+
+    :param interval: Interval (in seconds) between two pings
+    :type interval: float
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        wakeup = loop.time() + interval
+        await asyncio.sleep(interval)
+        if loop.time() - wakeup < interval:
+            sd_notify("WATCHDOG=1")
+
+
+class WorkerNotifications:
+    """
+    Relay of the notifications of the worker processes to systemd, run by \
+    their supervisor (NotifyAccess=main). Each worker writes its \
+    notifications on its own pipe, which is closed when the worker exits:
+
+    * READY=1 is sent once all the workers are ready
+    * WATCHDOG=1 is sent while all the workers ping, the workers which miss \
+    their pings for a watchdog period are killed (and restarted by the \
+    supervisor)
+    * the other notifications (STOPPING=1, ...) are sent by the supervisor \
+    itself
+    """
+
+    def __init__(self, workers, interval=None):
+        """
+        :param workers: Number of worker processes
+        :type workers: int
+        :param interval: Interval (in seconds) between two watchdog pings, \
+        None if the watchdog is disabled
+        :type interval: float
+        """
+        self.workers = workers
+        self.interval = interval
+        # Read end of the pipe of each worker, by PID of the worker
+        self.pipes = {}
+        self.buffers = {}
+        # Time of the last watchdog ping of each worker (or of its start)
+        self.last_pings = {}
+        # Workers which notified that they are ready
+        self.ready = set()
+        self.ready_sent = False
+        self.next_ping = None if interval is None else time.monotonic() + interval
+
+    def add_worker(self, pid, pipe):
+        """
+        Watch the notifications of a forked worker process (in the supervisor).
+
+        :param pid: PID of the worker process
+        :type pid: int
+        :param pipe: Read end and write end of the pipe of the worker, \
+        created before the fork
+        :type pipe: tuple
+        """
+        read_fd, write_fd = pipe
+        os.close(write_fd)
+        self.pipes[pid] = read_fd
+        self.buffers[pid] = b""
+        self.last_pings[pid] = time.monotonic()
+
+    def remove_worker(self, pid):
+        """
+        Stop watching the notifications of an exited worker process.
+
+        :param pid: PID of the worker process
+        :type pid: int
+        """
+        read_fd = self.pipes.pop(pid, None)
+        if read_fd is not None:
+            os.close(read_fd)
+        self.buffers.pop(pid, None)
+        self.last_pings.pop(pid, None)
+        self.ready.discard(pid)
+
+    def start_worker(self, pipe):
+        """
+        Send the notifications of the current worker process to the \
+        supervisor (in the forked worker).
+
+        :param pipe: Read end and write end of the pipe of the worker, \
+        created before the fork
+        :type pipe: tuple
+        """
+        global notify_pipe
+
+        read_fd, write_fd = pipe
+        for fd in [read_fd] + list(self.pipes.values()):
+            os.close(fd)
+        self.pipes.clear()
+        # A worker never waits for its supervisor
+        os.set_blocking(write_fd, False)
+        notify_pipe = write_fd
+
+    def wait(self):
+        """
+        Relay the notifications of the workers until the next watchdog ping \
+        or until a worker exits.
+
+        :returns: int -- PID of the worker whose pipe is closed (the worker \
+        exits), None when it is time to ping the watchdog
+        """
+        while True:
+            timeout = None
+            if self.next_ping is not None:
+                timeout = max(0, self.next_ping - time.monotonic())
+            readable, _, _ = select.select(list(self.pipes.values()), [], [], timeout)
+            if not readable:
+                self.next_ping = time.monotonic() + self.interval
+                return None
+
+            for pid, read_fd in list(self.pipes.items()):
+                if read_fd not in readable:
+                    continue
+                data = os.read(read_fd, 4096)
+                if not data:
+                    return pid
+                *states, self.buffers[pid] = (self.buffers[pid] + data).split(NOTIFICATION_END)
+                for state in states:
+                    self._notified(pid, state.decode())
+
+    def _notified(self, pid, state):
+        """
+        Handle a notification of a worker process.
+
+        :param pid: PID of the worker process
+        :type pid: int
+        :param state: The notification
+        :type state: str
+        """
+        if state == "WATCHDOG=1":
+            self.last_pings[pid] = time.monotonic()
+        elif state == "READY=1":
+            self.ready.add(pid)
+            if not self.ready_sent and len(self.ready) >= self.workers:
+                sd_notify("READY=1")
+                self.ready_sent = True
+
+    def ping(self):
+        """
+        Ping the watchdog of systemd if all the workers pinged during the \
+        last watchdog period, and kill the workers which did not.
+
+        :returns: list -- PIDs of the killed workers
+        """
+        deadline = time.monotonic() - 2 * self.interval
+        stale = [pid for pid, last_ping in self.last_pings.items() if last_ping < deadline]
+        for pid in stale:
+            logger.warning("Worker pid %d missed its watchdog pings, killing it", pid)
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            # Killed once: it is restarted when it exits
+            self.last_pings.pop(pid)
+
+        if not stale and len(self.last_pings) == len(self.pipes):
+            sd_notify("WATCHDOG=1")
+
+        return stale
@@ -0,0 +1,68 @@
+"""
+File containing the registry of the background tasks of the API, stopped \
+when the API is stopped.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import web
+import asyncio
+
+# Key of the background tasks running for an application (stored on the
+# application by main_init_app)
+BACKGROUND_TASKS_KEY = web.AppKey("background_tasks", set)
+
+
+def start_background_task(app, coro):
+    """
+    Start a background task of an application, registered so that it is \
+    cancelled when the application is stopped
+
+    :param app: The application
+    :type app: aiohttp.web.Application
+    :param coro: Coroutine run by the task
+    :type coro: coroutine
+    :returns: asyncio.Task -- The task
+    """
+    background_tasks = app[BACKGROUND_TASKS_KEY]
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+    return task
+
+
+async def cancel_background_tasks(app):
+    """
+    Cancel all the registered background tasks of an application and wait \
+    for their end
+
+    :param app: The application
+    :type app: aiohttp.web.Application
+    """
+    tasks = list(app[BACKGROUND_TASKS_KEY])
+    for task in tasks:
+        task.cancel()
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+
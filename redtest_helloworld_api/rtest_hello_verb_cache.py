@@ -0,0 +1,387 @@
+"""
+File containing the cache of the answers of the verb handlers, with the \
+coalescing of the concurrent identical requests.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import web
+import asyncio
+from collections import OrderedDict
+import functools
+import json
+from time import monotonic
+
+from redtest_helloworld_api.rtest_hello_serializer import decode_body, media_type_of, request_media_type
+from redtest_helloworld_api.rtest_hello_metrics import METRIC_PREFIX
+
+
+def decode_request_body(request, body):
+    """
+    Decode the body of a request, in the media type given by its \
+    Content-Type header
+
+    :param request: The request (aiohttp.web.Request or VerbCallRequest)
+    :type request: aiohttp.web.Request
+    :param body: Body of the request
+    :type body: bytes
+    :returns: The decoded body, None when it is empty or not valid
+    """
+    if not body:
+        return None
+    try:
+        return decode_body(body, media_type_of(request.content_type))
+    except ValueError:
+        return None
+
+
+def verb_cache_key(request, body, value=None):
+    """
+    Build the cache key of a request: its method, its path, its query \
+    parameters, its body and the media type of its answer. A body in a \
+    supported media type is normalized (json with the keys sorted and no \
+    spaces) so that the same call always gets the same key.
+
+    :param request: The request (aiohttp.web.Request or VerbCallRequest)
+    :type request: aiohttp.web.Request
+    :param body: Body of the request
+    :type body: bytes
+    :param value: The decoded body, if already decoded
+    :returns: tuple -- The cache key
+    """
+    if value is None:
+        value = decode_request_body(request, body)
+    if value is not None:
+        try:
+            body = json.dumps(value, sort_keys=True, separators=(",", ":"))
+        except (ValueError, TypeError):
+            # Not json serializable: the raw body is the key
+            pass
+
+    return (request.method, request.path, tuple(sorted(request.query.items())), body,
+            request_media_type(request))
+
+
+async def _run_handler(handler, request):
+    # Run a handler and copy its answer for the coalesced requests and the cache
+    response = await handler(request)
+    return response, CachedAnswer.from_response(response)
+
+
+class CachedAnswer:
+    """
+    Copy of the answer of a verb handler, from which a new response is \
+    created for each request served from the cache
+    """
+
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status, headers, body):
+        """
+        :param status: HTTP status of the answer
+        :type status: int
+        :param headers: Headers of the answer
+        :type headers: dict
+        :param body: Body of the answer
+        :type body: bytes
+        """
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @classmethod
+    def from_response(cls, response):
+        """
+        Copy the answer of a verb handler, when it can be sent again
+
+        :param response: The answer of the handler
+        :type response: aiohttp.web.StreamResponse
+        :returns: CachedAnswer -- The copy, None for the streamed answers \
+        (already sent) and the answers without bytes body
+        """
+        if type(response) is not web.Response or not isinstance(response.body, bytes):
+            return None
+
+        return cls(response.status, dict(response.headers), response.body)
+
+    def response(self):
+        """
+        Create a new response sending the answer
+
+        :returns: aiohttp.web.Response -- The response
+        """
+        return web.Response(body=self.body, status=self.status, headers=self.headers)
+
+
+class VerbCache:
+    """
+    Bounded LRU cache of the answers of the verb handlers, each answer \
+    expiring after a time to live. The concurrent requests missing the same \
+    key are coalesced: the handler runs once and its answer is shared by all \
+    of them (single-flight).
+
+    A handler opts in with the cached decorator, placed under the verb \
+    declaration:
+
+    .. code-block:: python
+
+        @api_verbs.verb("GET", "/api/v1/device/state")
+        @verb_cache.cached(ttl=5)
+        async def device_state(request):
+            ...
+
+    or with app_cached, to use the cache stored on the application of the \
+    request.
+
+    Only the successful answers (status below 400) up to max_body bytes are \
+    stored, and the requests with a body bigger than max_body bypass the \
+    cache. The handlers whose answers are streamed for some requests give a \
+    bypass predicate, so that these requests are not coalesced: the \
+    coalesced requests would wait for the end of the stream before running \
+    the handler themselves. The answers depending on anything else than the method, the \
+    path, the query parameters, the body and the Accept header of the \
+    request must not be cached.
+    """
+
+    def __init__(self, max_entries, ttl, max_body):
+        """
+        :param max_entries: Maximum number of answers stored, the least \
+        recently used ones being dropped (0 disables the cache and the \
+        coalescing)
+        :type max_entries: int
+        :param ttl: Default time (in seconds) an answer is served from the cache
+        :type ttl: float
+        :param max_body: Size (in bytes) of the biggest answer stored and \
+        of the biggest request body cached
+        :type max_body: int
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_body = max_body
+        # Answers stored, associated to (expiry time, answer), least recently
+        # used first
+        self._entries = OrderedDict()
+        # Handlers running for a key, shared by the coalesced requests
+        self._in_flight = {}
+        # Number of requests served from the cache, handled, and coalesced
+        # with a request being handled
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def configure(self, max_entries, ttl, max_body):
+        """
+        Change the settings of the cache and drop all the stored answers
+
+        :param max_entries: Maximum number of answers stored (0 disables the cache)
+        :type max_entries: int
+        :param ttl: Default time (in seconds) an answer is served from the cache
+        :type ttl: float
+        :param max_body: Size (in bytes) of the biggest answer stored
+        :type max_body: int
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_body = max_body
+        self.clear()
+
+    def clear(self):
+        """
+        Drop all the stored answers and reset the counters
+        """
+        self._entries.clear()
+        self.hits = self.misses = self.coalesced = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Get a stored answer, if it has not expired
+
+        :param key: Cache key of the request
+        :type key: tuple
+        :returns: CachedAnswer -- The answer, None when it is not stored
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+
+        return entry[1]
+
+    def put(self, key, answer, ttl):
+        """
+        Store an answer, dropping the least recently used ones above the \
+        maximum number of answers
+
+        :param key: Cache key of the request
+        :type key: tuple
+        :param answer: The answer to store
+        :type answer: CachedAnswer
+        :param ttl: Time (in seconds) the answer is served from the cache
+        :type ttl: float
+        """
+        self._entries[key] = (monotonic() + ttl, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _handled(self, key, ttl, task):
+        """
+        Store the answer of a handler once it has run (done callback of its task)
+        """
+        self._in_flight.pop(key, None)
+        # exception() also marks the error as retrieved when no request waits
+        # for the task anymore
+        if task.cancelled() or task.exception() is not None:
+            return
+
+        answer = task.result()[1]
+        if answer is not None and answer.status < 400 and len(answer.body) <= self.max_body:
+            self.put(key, answer, ttl)
+
+    def cached(self, ttl=None, bypass=None):
+        """
+        Decorator caching the answers of a verb handler
+
+        :param ttl: Time (in seconds) the answers are served from the cache \
+        (default: the ttl of the cache)
+        :type ttl: float
+        :param bypass: Function called with the request and its decoded \
+        body (None when empty or not valid), returning True when the request \
+        must bypass the cache and the coalescing (for instance because its \
+        answer is streamed)
+        :type bypass: callable
+        :returns: callable -- The decorator, returning the caching handler
+        """
+        def decorator(handler):
+            @functools.wraps(handler)
+            async def caching_handler(request):
+                return await self.handle(request, handler, ttl, bypass)
+
+            return caching_handler
+
+        return decorator
+
+    async def handle(self, request, handler, ttl=None, bypass=None):
+        """
+        Coroutine answering a request from the cache, or running the handler \
+        (once for the coalesced requests) and storing its answer
+
+        :param request: The request (aiohttp.web.Request or VerbCallRequest)
+        :type request: aiohttp.web.Request
+        :param handler: The verb handler
+        :type handler: coroutine function
+        :param ttl: Time (in seconds) the answer is served from the cache \
+        (default: the ttl of the cache)
+        :type ttl: float
+        :param bypass: Bypass predicate (see cached)
+        :type bypass: callable
+        :returns: aiohttp.web.StreamResponse -- The answer
+        """
+        if self.max_entries <= 0:
+            return await handler(request)
+
+        body = await request.read()
+        if len(body) > self.max_body:
+            return await handler(request)
+
+        value = decode_request_body(request, body)
+        if bypass is not None and bypass(request, value):
+            return await handler(request)
+
+        key = verb_cache_key(request, body, value)
+        answer = self.get(key)
+        if answer is not None:
+            self.hits += 1
+            return answer.response()
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            # Wait for the answer of the request being handled
+            self.coalesced += 1
+            answer = (await asyncio.shield(task))[1]
+            if answer is None:
+                # Answer that cannot be shared, not announced by the bypass
+                # predicate
+                return await handler(request)
+            return answer.response()
+
+        # The handler runs in its own task, so that the coalesced requests
+        # get the answer even if this request is cancelled
+        self.misses += 1
+        task = asyncio.create_task(_run_handler(handler, request))
+        self._in_flight[key] = task
+        task.add_done_callback(functools.partial(self._handled, key, self.ttl if ttl is None else ttl))
+
+        return (await asyncio.shield(task))[0]
+
+    def to_prometheus_lines(self):
+        """
+        Export the counters of the cache in the Prometheus text format
+
+        :returns: list -- The lines to append to the metrics export
+        """
+        requests_name = METRIC_PREFIX + "verb_cache_requests_total"
+        entries_name = METRIC_PREFIX + "verb_cache_entries"
+
+        return [
+                "# HELP %s Number of requests of the cached verbs per result." % requests_name,
+                "# TYPE %s counter" % requests_name,
+                '%s{result="hit"} %d' % (requests_name, self.hits),
+                '%s{result="miss"} %d' % (requests_name, self.misses),
+                '%s{result="coalesced"} %d' % (requests_name, self.coalesced),
+                "# HELP %s Number of answers stored in the verb cache." % entries_name,
+                "# TYPE %s gauge" % entries_name,
+                "%s %d" % (entries_name, len(self._entries))
+               ]
+
+
+def app_cached(cache_key, ttl=None, bypass=None):
+    """
+    Decorator caching the answers of a verb handler in the VerbCache stored \
+    on the application of each request, so that each application has its \
+    own cache and settings
+
+    :param cache_key: Key of the VerbCache in the application
+    :type cache_key: aiohttp.web.AppKey
+    :param ttl: Time (in seconds) the answers are served from the cache \
+    (default: the ttl of the cache)
+    :type ttl: float
+    :param bypass: Bypass predicate (see VerbCache.cached)
+    :type bypass: callable
+    :returns: callable -- The decorator, returning the caching handler
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def caching_handler(request):
+            return await request.app[cache_key].handle(request, handler, ttl, bypass)
+
+        return caching_handler
+
+    return decorator
@@ -0,0 +1,208 @@
+"""
+File containing the registry where the verbs of the API are declared.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import web
+
+
+class Verb:
+    """
+    Declaration of a verb of the API: its HTTP method, its path, its handler \
+    and free metadata
+    """
+
+    __slots__ = ("method", "path", "handler", "metadata")
+
+    def __init__(self, method, path, handler, metadata):
+        """
+        :param method: HTTP method of the verb ("GET", "POST", ...)
+        :type method: str
+        :param path: URL path of the verb
+        :type path: str
+        :param handler: Coroutine handling the requests of the verb
+        :type handler: coroutine function
+        :param metadata: Free metadata associated to the verb
+        :type metadata: dict
+        """
+        self.method = method
+        self.path = path
+        self.handler = handler
+        self.metadata = metadata
+
+
+class VerbRegistry:
+    """
+    Registry where each verb of the API is declared once. The routes of the \
+    application and the list of the verbs are built from it.
+
+    A verb is declared with the verb decorator:
+
+    .. code-block:: python
+
+        @api_verbs.verb("GET", "/version")
+        async def version(request):
+            ...
+    """
+
+    def __init__(self):
+        # Verbs in declaration order
+        self._verbs = []
+        # Verbs indexed by (method, path)
+        self._verbs_by_key = {}
+        # Verbs indexed by path
+        self._verbs_by_path = {}
+        # Functions called when the verb table changes
+        self._listeners = []
+
+    def verb(self, method, path, **metadata):
+        """
+        Decorator declaring a verb handled by the decorated coroutine. It can \
+        be stacked to handle several verbs with the same coroutine.
+
+        :param method: HTTP method of the verb
+        :type method: str
+        :param path: URL path of the verb
+        :type path: str
+        :param metadata: Free metadata associated to the verb
+        :returns: callable -- The decorator, returning the handler unchanged
+        """
+        def decorator(handler):
+            self.add(method, path, handler, **metadata)
+            return handler
+
+        return decorator
+
+    def add(self, method, path, handler, **metadata):
+        """
+        Declare a verb
+
+        :param method: HTTP method of the verb
+        :type method: str
+        :param path: URL path of the verb
+        :type path: str
+        :param handler: Coroutine handling the requests of the verb
+        :type handler: coroutine function
+        :param metadata: Free metadata associated to the verb
+        :returns: Verb -- The declared verb
+        """
+        key = (method.upper(), path)
+        if key in self._verbs_by_key:
+            raise ValueError("Verb %s %s is already declared" % key)
+
+        verb = Verb(key[0], path, handler, metadata)
+        self._verbs.append(verb)
+        self._verbs_by_key[key] = verb
+        self._verbs_by_path.setdefault(path, []).append(verb)
+        self._notify()
+
+        return verb
+
+    def remove(self, method, path):
+        """
+        Remove a declared verb
+
+        :param method: HTTP method of the verb
+        :type method: str
+        :param path: URL path of the verb
+        :type path: str
+        """
+        verb = self._verbs_by_key.pop((method.upper(), path))
+        self._verbs.remove(verb)
+        self._verbs_by_path[path].remove(verb)
+        if not self._verbs_by_path[path]:
+            del self._verbs_by_path[path]
+        self._notify()
+
+    def add_listener(self, listener):
+        """
+        Register a function called (without argument) each time the verb \
+        table changes
+
+        :param listener: The function to call
+        :type listener: callable
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Unregister a function registered with add_listener
+
+        :param listener: The function to remove
+        :type listener: callable
+        """
+        self._listeners.remove(listener)
+
+    def _notify(self):
+        """
+        Call all the listeners after a change of the verb table
+        """
+        for listener in self._listeners:
+            listener()
+
+    def find(self, method, path):
+        """
+        Find a verb from its method and its path
+
+        :param method: HTTP method of the verb
+        :type method: str
+        :param path: URL path of the verb
+        :type path: str
+        :returns: Verb -- The verb, None if it is not declared
+        """
+        return self._verbs_by_key.get((method.upper(), path))
+
+    def find_path(self, path):
+        """
+        Find all the verbs declared on a path
+
+        :param path: URL path of the verbs
+        :type path: str
+        :returns: list -- The verbs declared on the path (may be empty)
+        """
+        return self._verbs_by_path.get(path, [])
+
+    def paths(self):
+        """
+        Get the path of all the verbs, in declaration order and without \
+        duplicates
+
+        :returns: list -- The paths of the verbs
+        """
+        return list(self._verbs_by_path)
+
+    def routes(self):
+        """
+        Get the route definitions of all the verbs, to give to \
+        aiohttp.web.Application.add_routes
+
+        :returns: list -- The route definitions
+        """
+        return [web.route(verb.method, verb.path, verb.handler)
+                for verb in self._verbs]
+
+    def __iter__(self):
+        return iter(self._verbs)
+
+    def __len__(self):
+        return len(self._verbs)
@@ -0,0 +1,118 @@
+"""
+File containing the websocket transport of the verb calls.
+
+.. moduleauthor:: Armand BENETEAU <armand.beneteau@iot.bzh>
+
+*Date: 18/10/2026*
+
+*License:*
+    *Copyright (C) 2026 IoT.bzh Company*
+
+    *Licensed under the Apache License, Version 2.0 (the "License");\
+    you may not use this file except in compliance with the License.\
+    You may obtain a copy of the License at:*
+
+    *http://www.apache.org/licenses/LICENSE-2.0*
+
+    *Unless required by applicable law or agreed to in writing, software\
+    distributed under the License is distributed on an "AS IS" BASIS,\
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or\
+    implied.*
+    *See the License for the specific language governing permissions and\
+    limitations under the License.*
+"""
+
+
+# Import web utilities from the Asynchrone IO HTTP
+from aiohttp import web, WSCloseCode, WSMsgType
+import asyncio
+
+# Import constants
+from redtest_helloworld_api.rtest_hello_shared_constants import JSON_ID_KEY
+from redtest_helloworld_api.rtest_hello_dispatch import call_verb, error_result, parse_call
+from redtest_helloworld_api.rtest_hello_serializer import json_loads
+
+# Key of the websockets currently open on an application (stored on the
+# application by main_init_app)
+OPEN_WEBSOCKETS_KEY = web.AppKey("open_websockets", set)
+
+
+async def serve_websocket(request, registry, max_pending_calls, heartbeat):
+    """
+    Serve a websocket on which the client sends json frames \
+    {"id": ..., "method": ..., "verb": ..., "body": ...}. Each call is run \
+    as soon as it is received and its answer {"id": ..., "status": ..., \
+    "result": ...} is sent as soon as it is available, so the answers can \
+    come out of order.
+
+    :param request: The HTTP request opening the websocket
+    :type request: aiohttp.web.Request
+    :param registry: Registry of the verbs of the API
+    :type registry: VerbRegistry
+    :param max_pending_calls: Maximum number of calls running at the same \
+    time, the next frames are not read until a call ends
+    :type max_pending_calls: int
+    :param heartbeat: Interval (in seconds) of the ping frames
+    :type heartbeat: float
+    :returns:  aiohttp.web.WebSocketResponse -- The closed websocket
+    """
+    ws = web.WebSocketResponse(heartbeat=heartbeat)
+    await ws.prepare(request)
+
+    semaphore = asyncio.Semaphore(max_pending_calls)
+    pending_calls = set()
+
+    async def run_call(call_id, parsed_call):
+        try:
+            if parsed_call is None:
+                result = error_result(400, "Invalid verb call")
+            else:
+                result = await call_verb(registry, request, *parsed_call)
+
+            if not ws.closed:
+                await ws.send_str(result.to_json(call_id).decode("utf-8"))
+        except ConnectionResetError:
+            # The client left between the check and the send (the
+            # ClientConnectionResetError of aiohttp derives from it): drop
+            # the answer, nobody waits for this task to get the error
+            pass
+        finally:
+            semaphore.release()
+
+    open_websockets = request.app[OPEN_WEBSOCKETS_KEY]
+    open_websockets.add(ws)
+    try:
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+
+            try:
+                call = json_loads(msg.data)
+            except ValueError:
+                call = None
+            call_id = call.get(JSON_ID_KEY) if isinstance(call, dict) else None
+
+            # Wait for a free slot before reading the next frames
+            await semaphore.acquire()
+            task = asyncio.create_task(run_call(call_id, parse_call(call)))
+            pending_calls.add(task)
+            task.add_done_callback(pending_calls.discard)
+    finally:
+        open_websockets.discard(ws)
+        for task in pending_calls:
+            task.cancel()
+
+    return ws
+
+
+async def close_websockets(app):
+    """
+    Close all the websockets open on an application, telling the clients \
+    that the server is going away
+
+    :param app: The application
+    :type app: aiohttp.web.Application
+    """
+    await asyncio.gather(*[ws.close(code=WSCloseCode.GOING_AWAY, message=b"Server shutdown")
+                           for ws in list(app[OPEN_WEBSOCKETS_KEY])],
+                         return_exceptions=True)
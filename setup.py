@@ -30,7 +30,12 @@ setup(name='redtest_helloworld_api',
       classifiers=[
         'Development Status :: 3 - Alpha',
         'License :: OSI Approved :: Apache Software License',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
         'Topic :: Internet :: WWW/HTTP :: WSGI :: Server',
       ],
       url='http://git.ovh.iot/redpesk/redtest-helloword-api',
@@ -38,9 +43,15 @@ setup(name='redtest_helloworld_api',
       author_email='armand.beneteau@iot.bzh',
       license='Apache 2.0',
       packages=['redtest_helloworld_api'],
-      python_requires='>=3.6',
+      python_requires='>=3.9',
       install_requires=[
-         'aiohttp',
+         'aiohttp>=3.9,<4',
       ],
+      extras_require={
+         'fast': ['orjson', 'brotli'],
+         'cbor': ['cbor2>=6.1'],
+         'msgpack': ['msgpack'],
+         'uvloop': ['uvloop'],
+      },
       scripts=['redtesthelloworldd'],
       zip_safe=False)